@@ -0,0 +1,215 @@
+# auth_service.py
+import os
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+import bcrypt
+
+from .registration import Database, DB_ERRORS, DUPLICATE_ERRORS
+
+BCRYPT_ROUNDS = 12
+MAX_FAILED_ATTEMPTS = 5   # Неудачных попыток входа одного пользователя за окно
+THROTTLE_WINDOW = 60      # Окно подсчета неудачных попыток, секунд
+MAX_TRACKED_USERS = 10000  # Пользователей с неудачными попытками, которых помнит ограничитель
+QUEUE_TIMEOUT = 5         # Сколько запрос ждет места в очереди, прежде чем получить отказ
+LATENCY_SAMPLES = 1000    # Последних замеров на операцию для перцентилей
+
+
+def _hash_password(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password: bytes, password_hash: bytes) -> bool:
+    return bcrypt.checkpw(password, password_hash)
+
+
+def hash_rounds(password_hash: str) -> int:
+    """Стоимость bcrypt из хеша вида $2b$12$..."""
+    try:
+        return int(password_hash.split("$")[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+class LatencyStats:
+    """Задержки операций за последние LATENCY_SAMPLES вызовов: количество, p50, p99"""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.samples = samples
+        self._values = defaultdict(lambda: deque(maxlen=self.samples))
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add(self, operation, seconds):
+        with self._lock:
+            self._values[operation].append(seconds)
+            self._counts[operation] += 1
+
+    @staticmethod
+    def _percentile(ordered, fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def report(self):
+        """{операция: {"count", "p50_ms", "p99_ms"}}"""
+        with self._lock:
+            snapshot = {operation: sorted(values) for operation, values in self._values.items()}
+            counts = dict(self._counts)
+        return {
+            operation: {
+                "count": counts[operation],
+                "p50_ms": round(self._percentile(values, 0.50) * 1000, 1),
+                "p99_ms": round(self._percentile(values, 0.99) * 1000, 1),
+            }
+            for operation, values in snapshot.items() if values
+        }
+
+
+class AuthService:
+    """
+    Регистрация и вход поверх Database: bcrypt выполняется в ограниченном пуле процессов,
+    поэтому одновременные входы не выстраиваются в очередь за одним ядром.
+    Очередь ограничена max_pending запросами - при переполнении запрос ждет не дольше queue_timeout
+    и получает отказ. Пользователь после max_failed неудачных попыток за throttle_window секунд
+    получает отказ без проверки пароля. Хеши с другой стоимостью, чем rounds,
+    пересчитываются при следующем успешном входе
+    """
+
+    def __init__(self, database=None, workers=None, max_pending=None, rounds=BCRYPT_ROUNDS,
+                 max_failed=MAX_FAILED_ATTEMPTS, throttle_window=THROTTLE_WINDOW, queue_timeout=QUEUE_TIMEOUT):
+        self.database = database or Database()
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.rounds = rounds
+        self.max_failed = max_failed
+        self.throttle_window = throttle_window
+        self.queue_timeout = queue_timeout
+        self.latency = LatencyStats()
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._pending = threading.BoundedSemaphore(max_pending or self.workers * 4)
+        # пользователь -> время последних неудачных попыток; порядок - по последней неудаче,
+        # поэтому устаревшие записи (в том числе несуществующих имен) вытесняются с начала
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.database.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # ---------- Очередь и ограничения ----------
+
+    def _run(self, func, *args):
+        """Выполняет func в пуле процессов; None, если очередь переполнена дольше queue_timeout"""
+        if not self._pending.acquire(timeout=self.queue_timeout):
+            return None
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._pending.release()
+
+    def _throttled(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.get(username)
+            if not failures:
+                return False
+            while failures and now - failures[0] > self.throttle_window:
+                failures.popleft()
+            if not failures:
+                del self._failures[username]
+                return False
+            return len(failures) >= self.max_failed
+
+    def _record_failure(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures = self._failures.pop(username, None)
+            if failures is None:
+                failures = deque(maxlen=max(1, self.max_failed))
+            failures.append(now)
+            self._failures[username] = failures
+            # Перебор случайных имен не раздувает словарь: устаревшие записи удаляются при каждой
+            # вставке, а сверх MAX_TRACKED_USERS вытесняются давние
+            while self._failures:
+                oldest = next(iter(self._failures.values()))
+                if now - oldest[-1] <= self.throttle_window and len(self._failures) <= MAX_TRACKED_USERS:
+                    break
+                self._failures.popitem(last=False)
+
+    def _record_success(self, username):
+        with self._lock:
+            self._failures.pop(username, None)
+
+    # ---------- Операции ----------
+
+    def register_user(self, username: str, password: str) -> Tuple[bool, str]:
+        """Регистрирует нового пользователя (bcrypt - в пуле процессов)"""
+        started = time.perf_counter()
+        try:
+            if len(password) < 8:
+                return False, "Пароль должен содержать минимум 8 символов"
+            try:
+                if self.database.user_exists(username):
+                    return False, "Пользователь уже существует"
+                password_hash = self._run(_hash_password, password.encode('utf-8'), self.rounds)
+                if password_hash is None:
+                    return False, "Сервер перегружен, повторите попытку позже"
+                self.database.add_user(username, password_hash)
+                return True, "Пользователь успешно зарегистрирован"
+            except DUPLICATE_ERRORS:
+                return False, "Пользователь уже существует"
+            except DB_ERRORS as e:
+                return False, f"Ошибка регистрации: {str(e)}"
+        finally:
+            self.latency.add("register", time.perf_counter() - started)
+
+    def check_credentials(self, username: str, password: str) -> Tuple[bool, str, bool]:
+        """Проверяет учетные данные (bcrypt - в пуле процессов), при смене стоимости пересчитывает хеш"""
+        started = time.perf_counter()
+        try:
+            if self._throttled(username):
+                return False, "Слишком много неудачных попыток, повторите позже", False
+            try:
+                user = self.database.get_credentials(username)
+            except DB_ERRORS as e:
+                return False, f"Ошибка аутентификации: {str(e)}", False
+            if not user:
+                self._record_failure(username)
+                return False, "Пользователь не найден", False
+
+            password_hash, is_admin = user
+            valid = self._run(_check_password, password.encode('utf-8'), password_hash.encode('utf-8'))
+            if valid is None:
+                return False, "Сервер перегружен, повторите попытку позже", False
+            if not valid:
+                self._record_failure(username)
+                return False, "Неверный пароль", False
+
+            self._record_success(username)
+            if hash_rounds(password_hash) != self.rounds:
+                self._rehash(username, password)
+            return True, "Аутентификация успешна", is_admin
+        finally:
+            self.latency.add("login", time.perf_counter() - started)
+
+    def _rehash(self, username, password):
+        """Пересчет хеша с текущей стоимостью; ошибка не мешает входу"""
+        try:
+            password_hash = self._run(_hash_password, password.encode('utf-8'), self.rounds)
+            if password_hash is not None:
+                self.database.update_password_hash(username, password_hash)
+        except DB_ERRORS:
+            pass
+
+    def stats(self):
+        """Задержки операций (p50/p99) и состояние пула соединений"""
+        return {"latency": self.latency.report(), "pool": dict(self.database.pool.stats)}
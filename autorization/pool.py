@@ -0,0 +1,179 @@
+# pool.py
+import time
+import queue
+import threading
+from contextlib import contextmanager
+
+POOL_SIZE = 5
+MAX_LIFETIME = 3600  # Соединение старше часа закрывается и открывается заново
+PING_INTERVAL = 30   # Соединение, простоявшее дольше, проверяется перед выдачей
+ACQUIRE_TIMEOUT = 10
+
+
+class PoolTimeout(Exception):
+    """Все соединения пула заняты дольше времени ожидания"""
+
+
+class _Slot:
+    """Соединение пула и его подготовленные запросы"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.statements = {}  # SQL -> курсор подготовленного запроса
+
+
+class PooledConnection:
+    """Соединение, выданное пулом; execute выполняет подготовленные запросы, переиспользуя их"""
+
+    def __init__(self, slot):
+        self._slot = slot
+        self.conn = slot.conn
+
+    def prepared(self, sql):
+        """Курсор подготовленного запроса sql (параметры - "?"), создается один раз на соединение"""
+        cursor = self._slot.statements.get(sql)
+        if cursor is None:
+            try:
+                cursor = self.conn.cursor(prepared=True)  # mysql.connector: запрос готовится на сервере
+            except TypeError:
+                cursor = self.conn.cursor()  # sqlite3 кэширует подготовленные запросы сам
+            self._slot.statements[sql] = cursor
+        return cursor
+
+    def execute(self, sql, params=()):
+        """Выполняет подготовленный запрос; возвращает курсор с результатом"""
+        cursor = self.prepared(sql)
+        cursor.execute(sql, params)
+        return cursor
+
+    def fetchone(self, sql, params=()):
+        return self.execute(sql, params).fetchone()
+
+
+class ConnectionPool:
+    """
+    Пул соединений DB-API: не больше size соединений, выдача с ожиданием до timeout.
+    Соединение, простоявшее дольше ping_interval, проверяется перед выдачей,
+    соединения старше max_lifetime и сломанные закрываются и открываются заново.
+    connect - функция без аргументов, открывающая новое соединение (MySQL, SQLite)
+    """
+
+    def __init__(self, connect, size=POOL_SIZE, max_lifetime=MAX_LIFETIME, ping_interval=PING_INTERVAL,
+                 timeout=ACQUIRE_TIMEOUT):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue()  # Последнее возвращенное соединение - самое "теплое"
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "broken": 0, "waits": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _ping(conn):
+        """Проверка соединения: ping у MySQL, иначе простой запрос"""
+        if hasattr(conn, "ping"):
+            conn.ping(reconnect=False)
+        else:
+            conn.execute("SELECT 1")
+
+    @staticmethod
+    def _close(slot):
+        for cursor in slot.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            slot.conn.close()
+        except Exception:
+            pass
+
+    def _take(self):
+        """Свободное исправное соединение или новое"""
+        while True:
+            try:
+                slot = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            now = time.monotonic()
+            if now - slot.created > self.max_lifetime:
+                self._close(slot)
+                self._count("recycled")
+                continue
+            if now - slot.last_used > self.ping_interval:
+                try:
+                    self._ping(slot.conn)
+                except Exception:
+                    self._close(slot)
+                    self._count("broken")
+                    continue
+            self._count("reused")
+            return slot
+        slot = _Slot(self.connect())
+        self._count("created")
+        return slot
+
+    def acquire(self, timeout=None):
+        """Берет соединение из пула; PoolTimeout, если все заняты дольше timeout"""
+        if self._closed:
+            raise RuntimeError("Пул соединений закрыт")
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self.timeout if timeout is None else timeout):
+                raise PoolTimeout(f"Нет свободных соединений (размер пула {self.size})")
+        try:
+            return PooledConnection(self._take())
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        """Возвращает соединение в пул; сломанное закрывается"""
+        slot = connection._slot
+        if broken or self._closed:
+            self._close(slot)
+            if broken:
+                self._count("broken")
+        else:
+            slot.last_used = time.monotonic()
+            self._idle.put(slot)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Соединение на время блока: при успехе - commit, при ошибке - rollback.
+        Соединение, на котором не удался и rollback, в пул не возвращается
+        """
+        connection = self.acquire(timeout)
+        broken = False
+        try:
+            yield connection
+            connection.conn.commit()
+        except BaseException:
+            try:
+                connection.conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(connection, broken)
+
+    def close(self):
+        """Закрывает свободные соединения; выданные закрываются при возврате"""
+        self._closed = True
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
@@ -1,44 +1,84 @@
 # registration.py
-import mysql.connector
-from mysql.connector import Error
+import asyncio
+import sqlite3
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple, Optional, Dict
 from contextlib import contextmanager
 
+from .pool import ConnectionPool, PoolTimeout, POOL_SIZE
+
+try:
+    import mysql.connector
+    from mysql.connector import Error, IntegrityError
+except ImportError:
+    mysql = None
+    Error, IntegrityError = sqlite3.Error, sqlite3.IntegrityError
+
+# Ошибки, при которых операция возвращает сообщение, а не исключение (MySQL, SQLite, пул)
+DB_ERRORS = (Error, sqlite3.Error, PoolTimeout)
+DUPLICATE_ERRORS = (IntegrityError, sqlite3.IntegrityError)
+
+# Запросы поиска пользователя выполняются подготовленными ("?" понимают и MySQL, и SQLite)
+SQL_FIND_USER = "SELECT username FROM users WHERE username = ?"
+SQL_GET_CREDENTIALS = "SELECT password_hash, is_admin FROM users WHERE username = ?"
+SQL_INSERT_USER = "INSERT INTO users (username, password_hash) VALUES (?, ?)"
+SQL_UPDATE_HASH = "UPDATE users SET password_hash = ? WHERE username = ?"
+
+
+def sqlite_connect(path):
+    """
+    Соединение SQLite для Database(connect=lambda: sqlite_connect(path)) вместо сервера MySQL.
+    Пул выдает соединение то одному, то другому потоку (AsyncDatabase, AuthService),
+    поэтому проверка потока sqlite3 отключена - соединением в каждый момент владеет один поток
+    """
+    return sqlite3.connect(path, check_same_thread=False)
+
 
 class Database:
-    def __init__(self):
-        self.config = {
+    """
+    Пользователи в MySQL через пул соединений (autorization.pool) с подготовленными запросами.
+    connect - своя функция открытия соединения, например sqlite_connect для проверки без сервера MySQL
+    (таблица users должна существовать; sqlite3.connect без check_same_thread=False
+    не подходит - соединения пула переходят между потоками); остальные параметры передаются пулу
+    """
+
+    def __init__(self, config=None, pool_size=POOL_SIZE, connect=None, **pool_options):
+        self.config = config or {
             "host": "127.0.0.1",
             "port": 3306,
             "user": "myuser",
             "password": "mypassword",
             "database": "registration"
         }
-        self.connection = None
+        self.pool = ConnectionPool(connect or self._connect, size=pool_size, **pool_options)
+
+    def _connect(self):
+        if mysql is None:
+            raise RuntimeError("Пакет mysql-connector-python не установлен")
+        return mysql.connector.connect(**self.config)
+
+    def close(self):
+        self.pool.close()
 
     @contextmanager
     def get_cursor(self):
-        """Контекстный менеджер для работы с курсором"""
-        conn = None
-        cursor = None
-        try:
-            conn = mysql.connector.connect(**self.config)
-            cursor = conn.cursor(dictionary=True)
-            yield cursor
-            conn.commit()
-        except Error as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if cursor:
+        """Контекстный менеджер для работы с курсором (соединение берется из пула)"""
+        with self.pool.connection() as connection:
+            try:
+                cursor = connection.conn.cursor(dictionary=True)
+            except TypeError:
+                cursor = connection.conn.cursor()
+            try:
+                yield cursor
+            finally:
                 cursor.close()
-            if conn and conn.is_connected():
-                conn.close()
 
     def create_database(self):
         """Создает базу данных и таблицы"""
+        if mysql is None:
+            print("Ошибка создания базы данных: пакет mysql-connector-python не установлен")
+            return False
         try:
             # Подключаемся без указания базы данных
             with mysql.connector.connect(
@@ -75,47 +115,96 @@ class Database:
             print(f"Ошибка создания базы данных: {e}")
             return False
 
+    # ---------- Операции без bcrypt (для autorization.auth_service) ----------
+
+    def get_credentials(self, username: str) -> Optional[Tuple[str, bool]]:
+        """(хеш пароля, администратор ли) или None, если пользователя нет"""
+        with self.pool.connection() as connection:
+            user = connection.fetchone(SQL_GET_CREDENTIALS, (username,))
+        if not user:
+            return None
+        password_hash, is_admin = user
+        if isinstance(password_hash, (bytes, bytearray)):
+            password_hash = password_hash.decode('utf-8')
+        return password_hash, bool(is_admin)
+
+    def user_exists(self, username: str) -> bool:
+        with self.pool.connection() as connection:
+            return connection.fetchone(SQL_FIND_USER, (username,)) is not None
+
+    def add_user(self, username: str, password_hash: str):
+        """Добавляет пользователя с готовым хешем; при занятом имени - IntegrityError драйвера"""
+        with self.pool.connection() as connection:
+            connection.execute(SQL_INSERT_USER, (username, password_hash))
+
+    def update_password_hash(self, username: str, password_hash: str):
+        with self.pool.connection() as connection:
+            connection.execute(SQL_UPDATE_HASH, (password_hash, username))
+
+    # ---------- Регистрация и вход ----------
+
     def register_user(self, username: str, password: str) -> Tuple[bool, str]:
         """Регистрирует нового пользователя"""
         if len(password) < 8:
             return False, "Пароль должен содержать минимум 8 символов"
 
         try:
-            with self.get_cursor() as cursor:
-                # Проверяем существование пользователя
-                cursor.execute("SELECT username FROM users WHERE username = %s", (username,))
-                if cursor.fetchone():
-                    return False, "Пользователь уже существует"
-
-                # Хешируем пароль и добавляем пользователя
-                password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-                cursor.execute(
-                    "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
-                    (username, password_hash)
-                )
+            # Проверяем существование пользователя
+            if self.user_exists(username):
+                return False, "Пользователь уже существует"
+
+            # Хешируем пароль вне соединения, чтобы не держать его занятым на время bcrypt
+            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            self.add_user(username, password_hash)
             return True, "Пользователь успешно зарегистрирован"
-        except Error as e:
+        except DUPLICATE_ERRORS:
+            # Пользователя с тем же именем успели добавить между проверкой и вставкой
+            return False, "Пользователь уже существует"
+        except DB_ERRORS as e:
             return False, f"Ошибка регистрации: {str(e)}"
 
     def check_credentials(self, username: str, password: str) -> Tuple[bool, str, bool]:
         """Проверяет учетные данные пользователя"""
         try:
-            with self.get_cursor() as cursor:
-                cursor.execute(
-                    "SELECT password_hash, is_admin FROM users WHERE username = %s",
-                    (username,)
-                )
-                user = cursor.fetchone()
-
-                if not user:
-                    return False, "Пользователь не найден", False
-
-                if bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-                    return True, "Аутентификация успешна", user['is_admin']
-                return False, "Неверный пароль", False
-        except Error as e:
+            user = self.get_credentials(username)
+        except DB_ERRORS as e:
             return False, f"Ошибка аутентификации: {str(e)}", False
 
+        if not user:
+            return False, "Пользователь не найден", False
+
+        # bcrypt проверяется после возврата соединения в пул
+        password_hash, is_admin = user
+        if bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
+            return True, "Аутентификация успешна", is_admin
+        return False, "Неверный пароль", False
+
+
+class AsyncDatabase:
+    """
+    Асинхронный вариант Database для серверного фронтенда: вызовы выполняются
+    в пуле потоков размером с пул соединений, цикл событий не блокируется ни запросами, ни bcrypt
+    """
+
+    def __init__(self, database=None, **options):
+        self.database = database or Database(**options)
+        self._executor = ThreadPoolExecutor(max_workers=self.database.pool.size,
+                                            thread_name_prefix="auth-db")
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def register_user(self, username: str, password: str) -> Tuple[bool, str]:
+        return await self._run(self.database.register_user, username, password)
+
+    async def check_credentials(self, username: str, password: str) -> Tuple[bool, str, bool]:
+        return await self._run(self.database.check_credentials, username, password)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.database.close()
+
 
 if __name__ == "__main__":
     db = Database()
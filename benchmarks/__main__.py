@@ -0,0 +1,7 @@
+import sys
+
+from .runner import main
+
+# Дочерние процессы замеров (spawn) импортируют этот модуль повторно - запуск только в главном
+if __name__ == "__main__":
+    sys.exit(main())
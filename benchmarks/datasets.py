@@ -0,0 +1,102 @@
+# datasets.py
+"""
+Синтетические деревья для замеров. Содержимое определяется seed, поэтому
+деревья одного масштаба совпадают между запусками и машинами
+"""
+import os
+import random
+
+MB = 1024 * 1024
+
+# Наборы данных (размеры - при scale=1 в generate)
+DATASETS = {
+    "tiny": "много маленьких файлов (100 Б - 4 КБ)",
+    "huge": "несколько больших файлов со смешанной сжимаемостью",
+    "deep": "глубокая вложенность каталогов",
+    "mixed": "файлы средних размеров: текст, повторы, случайные данные",
+}
+
+_WORDS = ("backup restore snapshot chunk catalog index stream cipher segment pack "
+          "резервная копия файл каталог ключ пароль журнал").split()
+
+
+def _text(rng, size):
+    """Хорошо сжимаемый текст"""
+    parts, total = [], 0
+    while total < size:
+        word = rng.choice(_WORDS)
+        parts.append(word)
+        total += len(word.encode("utf-8")) + 1
+    return " ".join(parts).encode("utf-8")[:size]
+
+
+def _payload(rng, size, kind):
+    if kind == "text":
+        return _text(rng, size)
+    if kind == "repeat":
+        block = rng.randbytes(4096)
+        return (block * (size // len(block) + 1))[:size]
+    return rng.randbytes(size)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _write_large(path, rng, size):
+    """Большой файл блоками по 1 МБ: четверть текста, четверть повторов, половина случайных данных"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    kinds = ("text", "repeat", "random", "random")
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            block = min(MB, size - written)
+            f.write(_payload(rng, block, kinds[(written // MB) % len(kinds)]))
+            written += block
+
+
+def generate(name, root, scale=1.0, seed=0):
+    """Создает набор данных name в root; возвращает (файлов, байт)"""
+    if name not in DATASETS:
+        raise ValueError(f"Неизвестный набор данных: {name}")
+    rng = random.Random(f"{name}:{seed}")
+    files = total = 0
+
+    if name == "tiny":
+        count = max(1, int(5000 * scale))
+        for i in range(count):
+            data = _payload(rng, rng.randint(100, 4096), rng.choice(("text", "random")))
+            _write(os.path.join(root, f"d{i // 500:03d}", f"f{i:06d}.dat"), data)
+            files += 1
+            total += len(data)
+
+    elif name == "huge":
+        for i in range(3):
+            size = max(MB, int(48 * MB * scale))
+            _write_large(os.path.join(root, f"large{i}.bin"), rng, size)
+            files += 1
+            total += size
+
+    elif name == "deep":
+        depth, per_level = 25, max(1, int(40 * scale))
+        path = root
+        for level in range(depth):
+            path = os.path.join(path, f"level{level:02d}")
+            for i in range(per_level):
+                data = _payload(rng, rng.randint(1024, 32 * 1024), rng.choice(("text", "repeat", "random")))
+                _write(os.path.join(path, f"f{i:04d}.dat"), data)
+                files += 1
+                total += len(data)
+
+    else:
+        count = max(1, int(400 * scale))
+        for i in range(count):
+            kind = ("text", "repeat", "random")[i % 3]
+            data = _payload(rng, rng.randint(16 * 1024, 512 * 1024), kind)
+            _write(os.path.join(root, kind, f"f{i:05d}.{'txt' if kind == 'text' else 'bin'}"), data)
+            files += 1
+            total += len(data)
+
+    return files, total
@@ -0,0 +1,231 @@
+# runner.py
+"""
+Замеры горячих путей резервного копирования:
+
+    python -m benchmarks run [--datasets tiny,huge] [--scale 0.5] [--repeat 3] [--out baseline.json]
+    python -m benchmarks compare baseline.json current.json [--threshold 10]
+
+Для каждого набора данных (benchmarks.datasets) выполняются фазы: полная копия, повторная копия
+без изменений, проверка изменений и полное восстановление. Каждая фаза запускается в отдельном
+процессе, чтобы пиковая память (RSS) относилась только к ней. Результаты - JSON, который
+можно сохранить как базовый и сравнивать с ним последующие запуски
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .datasets import DATASETS, generate
+
+BASELINE_VERSION = 1
+PHASES = ("full_backup", "noop_incremental", "check_changes", "full_restore")
+PASSWORD = "benchmark-password"
+MB = 1024 * 1024
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux сообщает килобайты, macOS - байты
+    return round(peak / (MB if sys.platform == "darwin" else 1024), 1)
+
+
+def _run_phase(phase, source, backup_dir, restore_dir, log_dir, workers):
+    """Одна фаза в дочернем процессе; возвращает время, счетчики и пиковую память процесса"""
+    from graph.logger import AppLogger
+    from engine.service import BackupService
+
+    logger = AppLogger(os.path.join(log_dir, "app.log"), console=False)
+    service = BackupService(logger=logger)
+    started = time.perf_counter()
+    if phase in ("full_backup", "noop_incremental"):
+        result = service.backup(source, backup_dir, PASSWORD, workers=workers)
+    elif phase == "check_changes":
+        result = {"changed": len(service.check_changes(source, backup_dir) or [])}
+    else:
+        result = service.restore(backup_dir, restore_dir, PASSWORD, workers=workers, resume=False)
+    seconds = time.perf_counter() - started
+    logger.close()
+    return {
+        "seconds": seconds,
+        "files": result.get("files", 0),
+        "failed": result.get("failed", 0),
+        "changed": result.get("changed"),
+        "stages": result.get("stages"),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _summarize(runs, files, size):
+    """Медиана по повторам; пропускная способность - по объему набора данных"""
+    seconds = statistics.median(run["seconds"] for run in runs)
+    rss = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+    summary = {
+        "seconds": round(seconds, 4),
+        "seconds_min": round(min(run["seconds"] for run in runs), 4),
+        "files_per_sec": round(files / seconds, 1) if seconds else None,
+        "mb_per_sec": round(size / seconds / MB, 2) if seconds else None,
+        "peak_rss_mb": max(rss) if rss else None,
+        "processed_files": runs[-1]["files"],
+        "failed": runs[-1]["failed"],
+    }
+    if runs[-1]["changed"] is not None:
+        summary["changed"] = runs[-1]["changed"]
+    if runs[-1]["stages"]:
+        summary["stages"] = runs[-1]["stages"]
+    return summary
+
+
+def run_dataset(name, workdir, scale=1.0, seed=0, repeat=1, workers=None, report=print):
+    """Замер всех фаз на наборе данных name; возвращает {"files", "bytes", "phases"}"""
+    source = os.path.join(workdir, "source", name)
+    if os.path.exists(source):
+        shutil.rmtree(source)
+    files, size = generate(name, source, scale, seed)
+    report(f"{name}: {files} файлов, {size / MB:.1f} МБ")
+
+    runs = {phase: [] for phase in PHASES}
+    context = multiprocessing.get_context("spawn")
+    for attempt in range(repeat):
+        backup_dir = os.path.join(workdir, "backup", name)
+        restore_dir = os.path.join(workdir, "restore", name)
+        log_dir = os.path.join(workdir, "logs", name)
+        for path in (backup_dir, restore_dir, log_dir):
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+        for phase in PHASES:
+            # Новый процесс на фазу: пиковая память не накапливается между фазами
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                run = executor.submit(_run_phase, phase, source, backup_dir, restore_dir, log_dir, workers).result()
+            runs[phase].append(run)
+            report(f"  {phase} #{attempt + 1}: {run['seconds']:.3f} с, RSS {run['peak_rss_mb']} МБ")
+
+    return {
+        "files": files,
+        "bytes": size,
+        "phases": {phase: _summarize(phase_runs, files, size) for phase, phase_runs in runs.items()},
+    }
+
+
+def run(datasets=None, scale=1.0, seed=0, repeat=1, workers=None, workdir=None, keep=False, report=print):
+    """Полный прогон; возвращает результаты в формате базового файла"""
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="backup-bench-")
+    try:
+        results = {name: run_dataset(name, workdir, scale, seed, repeat, workers, report)
+                   for name in (datasets or DATASETS)}
+    finally:
+        if own_workdir and not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "version": BASELINE_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": {"scale": scale, "seed": seed, "repeat": repeat, "workers": workers},
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=10.0):
+    """
+    Сравнение двух прогонов по времени и памяти фаз.
+    Возвращает [(набор, фаза, метрика, было, стало, изменение в %, регрессия)]
+    """
+    rows = []
+    for name, data in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        for phase, metrics in data["phases"].items():
+            base_metrics = base["phases"].get(phase)
+            if base_metrics is None:
+                continue
+            for metric in ("seconds", "peak_rss_mb"):
+                before, after = base_metrics.get(metric), metrics.get(metric)
+                if not before or after is None:
+                    continue
+                change = (after - before) / before * 100
+                rows.append((name, phase, metric, before, after, round(change, 1), change > threshold))
+    return rows
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="Замеры резервного копирования и восстановления")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="выполнить замеры")
+    run_parser.add_argument("--datasets", default=",".join(DATASETS),
+                            help=f"наборы данных через запятую ({', '.join(DATASETS)})")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="множитель размера наборов данных")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=1, help="повторов каждой фазы (берется медиана)")
+    run_parser.add_argument("--workers", type=int, help="потоков шифрования/восстановления")
+    run_parser.add_argument("--workdir", help="рабочая директория (по умолчанию - временная)")
+    run_parser.add_argument("--keep", action="store_true", help="не удалять временную рабочую директорию")
+    run_parser.add_argument("--out", help="файл для результатов JSON (по умолчанию - stdout)")
+    run_parser.add_argument("--compare", help="базовый файл для сравнения после прогона")
+    run_parser.add_argument("--threshold", type=float, default=10.0,
+                            help="рост времени/памяти в процентах, считающийся регрессией")
+
+    compare_parser = commands.add_parser("compare", help="сравнить два файла результатов")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0)
+    return parser
+
+
+def _print_comparison(rows):
+    for name, phase, metric, before, after, change, regression in rows:
+        mark = "  РЕГРЕССИЯ" if regression else ""
+        print(f"{name:6} {phase:17} {metric:12} {before:>10} -> {after:>10} ({change:+.1f}%){mark}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+def main(argv=None):
+    """Код выхода: 0 - успешно, 1 - есть регрессии сверх порога"""
+    args = _build_parser().parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        return _print_comparison(compare(baseline, current, args.threshold))
+
+    datasets = [name.strip() for name in args.datasets.split(",") if name.strip()]
+    unknown = [name for name in datasets if name not in DATASETS]
+    if unknown:
+        print(f"Неизвестные наборы данных: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    results = run(datasets, args.scale, args.seed, args.repeat, args.workers, args.workdir, args.keep,
+                  report=lambda line: print(line, file=sys.stderr))
+
+    payload = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            return _print_comparison(compare(json.load(f), results, args.threshold))
+    return 0
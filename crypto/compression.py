@@ -0,0 +1,136 @@
+# compression.py
+import zlib
+import lzma
+import math
+import threading
+from collections import Counter
+
+# zstd необязателен: без него по умолчанию используется zlib
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODEC_ZSTD = 3
+
+CODECS = {"none": CODEC_NONE, "zlib": CODEC_ZLIB, "lzma": CODEC_LZMA, "zstd": CODEC_ZSTD}
+AUTO = "auto"
+
+ZLIB_LEVEL = 3
+LZMA_PRESET = 1
+ZSTD_LEVEL = 3
+
+SAMPLE_SIZE = 64 * 1024
+ENTROPY_THRESHOLD = 7.5  # бит на байт: выше - данные уже сжаты или зашифрованы
+
+# Сигнатуры форматов, которые уже сжаты (архивы, изображения, видео, офисные zip-контейнеры)
+COMPRESSED_SIGNATURES = (
+    b"PK\x03\x04",  # zip, docx, xlsx, odt, jar
+    b"\x1f\x8b",  # gzip
+    b"BZh",  # bzip2
+    b"\xfd7zXZ\x00",  # xz
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"7z\xbc\xaf\x27\x1c",  # 7z
+    b"Rar!",  # rar
+    b"\xff\xd8\xff",  # jpeg
+    b"\x89PNG",  # png
+    b"GIF8",  # gif
+    b"RIFF",  # webp, avi
+    b"OggS",  # ogg
+    b"ID3",  # mp3
+    b"BKPS",  # наши зашифрованные файлы
+)
+
+_local = threading.local()
+
+
+def available_codecs():
+    """Кодеки, доступные в текущем окружении"""
+    names = ["none", "zlib", "lzma"]
+    if zstandard is not None:
+        names.append("zstd")
+    return names
+
+
+def default_codec():
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+def _zstd_compressor():
+    # Объекты zstandard не потокобезопасны - свой экземпляр на поток
+    compressor = getattr(_local, "zstd_compressor", None)
+    if compressor is None:
+        compressor = _local.zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return compressor
+
+
+def compress(codec, data):
+    """Сжимает блок выбранным кодеком"""
+    if codec == CODEC_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    if codec == CODEC_LZMA:
+        return lzma.compress(data, preset=LZMA_PRESET)
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Кодек zstd недоступен: установите пакет zstandard")
+        return _zstd_compressor().compress(data)
+    raise ValueError(f"Неизвестный кодек сжатия: {codec}")
+
+
+def decompress(codec, data, max_size):
+    """Распаковывает блок, не позволяя ему превысить max_size"""
+    # Лимит на байт больше допустимого: так превышение отличимо от блока ровно max_size
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj()
+        result = decompressor.decompress(data, max_size + 1)
+        if len(result) > max_size or not decompressor.eof:
+            raise ValueError("Распакованный блок превышает допустимый размер")
+        return result
+    if codec == CODEC_LZMA:
+        decompressor = lzma.LZMADecompressor()
+        result = decompressor.decompress(data, max_size + 1)
+        if len(result) > max_size or not decompressor.eof:
+            raise ValueError("Распакованный блок превышает допустимый размер")
+        return result
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ValueError("Кодек zstd недоступен: установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=max_size)
+    raise ValueError(f"Неизвестный кодек сжатия: {codec}")
+
+
+def entropy(sample):
+    """Энтропия Шеннона выборки в битах на байт"""
+    if not sample:
+        return 0.0
+    total = len(sample)
+    return -sum(count / total * math.log2(count / total) for count in Counter(sample).values())
+
+
+def looks_compressed(sample):
+    """Данные уже сжаты: известная сигнатура формата или высокая энтропия"""
+    if sample.startswith(COMPRESSED_SIGNATURES):
+        return True
+    # mp4/mov: сигнатура ftyp со смещением 4
+    if sample[4:8] == b"ftyp":
+        return True
+    return entropy(sample) > ENTROPY_THRESHOLD
+
+
+def codec_from_sample(sample, preferred=AUTO):
+    """
+    Выбирает кодек по началу данных.
+    AUTO - кодек по умолчанию, если данные не похожи на сжатые;
+    явно заданный кодек используется как есть (кроме уже сжатых данных).
+    """
+    if preferred == "none" or not sample or looks_compressed(sample):
+        return CODEC_NONE
+    if preferred == AUTO:
+        return default_codec()
+    try:
+        return CODECS[preferred]
+    except KeyError:
+        raise ValueError(f"Неизвестный кодек сжатия: {preferred}")
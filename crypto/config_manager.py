@@ -1,17 +1,117 @@
 # config_manager.py
 import os
+import hmac
 import json
+import time
+import hashlib
+import threading
+from typing import Optional
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 
+SESSION_IDLE_TIMEOUT = 300  # Сессия без обращений дольше этого времени (секунд) затирается
+
+
+def _file_stamp(path):
+    """(mtime, размер) файла - признак того, что файл изменился на диске"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+class ConfigSession:
+    """
+    Разблокированный конфигурационный файл: ключ и расшифрованный конфиг в памяти.
+    Пароль конфига хранится только как HMAC со случайным ключом сессии.
+    Сессия недействительна после idle_timeout секунд без обращений или изменения файла на диске;
+    ключ и конфиг затираются в close() (в том числе по таймеру простоя)
+    """
+
+    def __init__(self, config_password: str, key: bytes, config_data: bytes, stamp, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self._secret = os.urandom(32)
+        self._verifier = self._digest(config_password)
+        self._key = bytearray(key)
+        self._config = bytearray(config_data)
+        self.stamp = stamp
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._timer = None
+        self._schedule(idle_timeout)
+
+    def _digest(self, config_password: str) -> bytes:
+        return hmac.new(self._secret, config_password.encode(), hashlib.sha256).digest()
+
+    def _schedule(self, delay):
+        self._timer = threading.Timer(delay, self._expire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _expire(self):
+        """Таймер простоя: затирает сессию или переносит проверку, если к ней обращались"""
+        with self._lock:
+            if self.closed:
+                return
+            remaining = self.last_used + self.idle_timeout - time.monotonic()
+            if remaining > 0:
+                self._schedule(remaining)
+                return
+        self.close()
+
+    def valid(self, config_path: str) -> bool:
+        """Сессия открыта, не простаивала и файл конфига не менялся"""
+        if self.closed or time.monotonic() - self.last_used > self.idle_timeout:
+            return False
+        try:
+            return _file_stamp(config_path) == self.stamp
+        except OSError:
+            return False
+
+    def matches(self, config_password: str) -> bool:
+        return hmac.compare_digest(self._digest(config_password), self._verifier)
+
+    def read(self, config_path: str, config_password: str) -> Optional[dict]:
+        """
+        Конфиг, если сессия действительна для config_path и пароля конфига, иначе None.
+        Проверка, продление и чтение выполняются под одной блокировкой,
+        поэтому таймер простоя не закроет сессию между ними
+        """
+        with self._lock:
+            if not self.valid(config_path) or not self.matches(config_password):
+                return None
+            self.last_used = time.monotonic()
+            return json.loads(bytes(self._config))
+
+    def config(self) -> dict:
+        """Расшифрованный конфиг; продлевает сессию"""
+        with self._lock:
+            if self.closed:
+                raise ValueError("Сессия конфигурации закрыта")
+            self.last_used = time.monotonic()
+            return json.loads(bytes(self._config))
+
+    def close(self):
+        """Затирает ключ и конфиг"""
+        with self._lock:
+            if self.closed:
+                return
+            self._key[:] = bytes(len(self._key))
+            self._config[:] = bytes(len(self._config))
+            self._verifier = self._secret = b""
+            self.closed = True
+            if self._timer is not None and self._timer is not threading.current_thread():
+                self._timer.cancel()
+
 
 class ConfigManager:
-    def __init__(self, config_file="config.enc", key_file="key.key"):
+    def __init__(self, config_file="config.enc", key_file="key.key", session_timeout=SESSION_IDLE_TIMEOUT):
         self.config_file = config_file
         self.key_file = key_file
-        self.credentials = None
+        self.credentials = None  # ConfigSession после первой успешной проверки
+        self.session_timeout = session_timeout
+        self._lock = threading.Lock()
 
     def generate_key(self, password: str, salt: bytes = None) -> tuple:
         """Генерирует ключ из пароля"""
@@ -60,6 +160,7 @@ class ConfigManager:
 
         with open(self.config_file, 'wb') as f:
             f.write(encrypted_data)
+        self.lock()
 
         print("Конфигурационный файл создан успешно!")
 
@@ -74,12 +175,58 @@ class ConfigManager:
         decrypted_data = self.decrypt_data(encrypted_data, config_password)
         return json.loads(decrypted_data)
 
+    def unlock(self, config_password: str) -> ConfigSession:
+        """
+        Сессия с расшифрованным конфигом. PBKDF2 и расшифровка выполняются, только если
+        действующей сессии нет, она истекла, файл изменился или пароль конфига другой
+        """
+        return self._unlock(config_password)[0]
+
+    def read_config(self, config_password: str) -> dict:
+        """Расшифрованный конфиг из действующей сессии (или новой, см. unlock)"""
+        return self._unlock(config_password)[1]
+
+    def _unlock(self, config_password: str):
+        """(сессия, конфиг); конфиг прочитан в той же проверке, что и действительность сессии"""
+        with self._lock:
+            session = self.credentials
+            config = session.read(self.config_file, config_password) if session is not None else None
+            if config is not None:
+                return session, config
+            if session is not None:
+                session.close()
+                self.credentials = None
+
+            if not os.path.exists(self.config_file):
+                raise FileNotFoundError("Конфигурационный файл не найден")
+            with open(self.config_file, 'rb') as f:
+                stamp = _file_stamp(self.config_file)
+                encrypted_data = f.read()
+
+            key, _ = self.generate_key(config_password, encrypted_data[:16])
+            try:
+                decrypted = Fernet(key).decrypt(encrypted_data[16:])
+            except Exception:
+                raise ValueError("Неверный пароль для расшифровки")
+            config = json.loads(decrypted)  # Поврежденный конфиг не кешируется
+
+            self.credentials = ConfigSession(config_password, key, decrypted, stamp, self.session_timeout)
+            return self.credentials, config
+
+    def lock(self):
+        """Закрывает сессию и затирает ключ и конфиг в памяти"""
+        with self._lock:
+            if self.credentials is not None:
+                self.credentials.close()
+                self.credentials = None
+
     def check_credentials(self, input_username: str, input_password: str, config_password: str) -> bool:
-        """Проверяет введенные учетные данные"""
+        """Проверяет введенные учетные данные; повторные проверки в сессии не читают файл и не выполняют PBKDF2"""
         try:
-            config = self.load_config(config_password)
-            return config["username"] == input_username and config["password"] == input_password
-        except (FileNotFoundError, ValueError, json.JSONDecodeError):
+            config = self.read_config(config_password)
+            return (hmac.compare_digest(config["username"].encode(), input_username.encode())
+                    and hmac.compare_digest(config["password"].encode(), input_password.encode()))
+        except (FileNotFoundError, ValueError, json.JSONDecodeError, KeyError):
             return False
 
     def config_exists(self) -> bool:
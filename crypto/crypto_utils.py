@@ -1,15 +1,55 @@
 import os
+import io
+import hmac
+import struct
+import hashlib
+import itertools
 from Crypto.Cipher import AES
 from Crypto.Random import get_random_bytes
-from Crypto.Util.Padding import pad, unpad
+from Crypto.Util.Padding import unpad
 import base64
+import threading
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from cryptography.exceptions import InvalidTag
+from .key_session import KeySession
+from .compression import CODEC_NONE, SAMPLE_SIZE, codec_from_sample, compress, decompress
 
 # Файл, где хранится ключ
 KEY_FILE = "key.bin"
 
+# Потоковый формат: MAGIC | версия | режим ключа | кодек | [шифр] | размер блока | [salt] | nonce | блоки
+# Версия 1 не содержит байта кодека, версии 1-2 - AES-256-CTR + HMAC-SHA256 (читаются по-прежнему),
+# версия 3 - AEAD (AES-256-GCM или ChaCha20-Poly1305), шифр указан в заголовке
+MAGIC = b"BKPS"
+STREAM_VERSION = 3
+STREAM_VERSIONS = (1, 2, 3)
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1 МБ
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+KEY_MODE_KEYFILE = 0
+KEY_MODE_PASSWORD = 1  # salt на каждый файл, PBKDF2 для каждого файла
+KEY_MODE_SESSION = 2  # salt сессии + nonce файла, ключ файла через HKDF
+
+# Флаги записи блока
+FLAG_FINAL = 0x01
+FLAG_COMPRESSED = 0x02
+
+# Шифры версии 3
+CIPHER_AES_GCM = 1
+CIPHER_CHACHA20 = 2
+CIPHERS = {
+    "aes-gcm": CIPHER_AES_GCM,
+    "chacha20": CIPHER_CHACHA20,
+}
+_AEAD_CLASSES = {
+    CIPHER_AES_GCM: AESGCM,
+    CIPHER_CHACHA20: ChaCha20Poly1305,
+}
+AEAD_TAG_SIZE = 16
+MAX_CHUNKS = 2 ** 32  # Номер блока занимает 4 байта nonce
+
 
 def generate_key_from_password(password: str, salt: bytes = None) -> tuple:
     """Генерирует ключ из пароля (совместимость с ConfigManager)"""
@@ -48,70 +88,382 @@ def load_or_generate_key():
 SECRET_KEY = load_or_generate_key()
 
 
-def encrypt_file(file_path, output_path, password=None):
-    """
-    Шифрует файл AES-256 (CBC).
-    Если указан пароль - использует Fernet шифрование (совместимость с ConfigManager)
-    """
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"Файл не найден: {file_path}")
+def _derive_stream_keys(master_key: bytes) -> tuple:
+    """Получает ключ шифрования и ключ MAC для потокового формата"""
+    enc_key = hmac.new(master_key, b"stream-enc", hashlib.sha256).digest()
+    mac_key = hmac.new(master_key, b"stream-mac", hashlib.sha256).digest()
+    return enc_key, mac_key
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-    if password:
-        # Используем Fernet шифрование с паролем
-        key, salt = generate_key_from_password(password)
-        fernet = Fernet(key)
+def _password_master_key(password: str, salt: bytes, session: KeySession = None) -> bytes:
+    """Мастер-ключ (32 байта) из пароля, тот же PBKDF2, что и для Fernet"""
+    if session is not None:
+        return session.master_key(salt)
+    key, _ = generate_key_from_password(password, salt)
+    return base64.urlsafe_b64decode(key)
+
+
+def _chunk_tag(mac_base, index: int, flags: int, ciphertext) -> bytes:
+    """HMAC блока: заголовок + номер блока + флаги (последний, сжат) + шифротекст"""
+    mac = mac_base.copy()
+    mac.update(struct.pack(">QB", index, flags))
+    mac.update(ciphertext)
+    return mac.digest()
+
+
+def _has_aes_instructions():
+    """Есть ли у процессора аппаратный AES (по /proc/cpuinfo; на других системах предполагается, что есть)"""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return "aes" in line.split(":", 1)[1].split()
+    except OSError:
+        return True
+    return True
+
+
+_default_cipher = None
+
+
+def default_cipher():
+    """AES-256-GCM при аппаратном AES, иначе ChaCha20-Poly1305 (быстрее программно)"""
+    global _default_cipher
+    if _default_cipher is None:
+        _default_cipher = CIPHER_AES_GCM if _has_aes_instructions() else CIPHER_CHACHA20
+    return _default_cipher
+
+
+def _aead(cipher, master_key):
+    """Объект AEAD для шифра из заголовка; ключ отделен от ключей версий 1-2"""
+    aead_class = _AEAD_CLASSES.get(cipher)
+    if aead_class is None:
+        raise ValueError(f"Неизвестный шифр: {cipher}")
+    return aead_class(hmac.new(master_key, b"stream-aead", hashlib.sha256).digest())
+
+
+def _chunk_nonce(prefix: bytes, index: int) -> bytes:
+    """Nonce блока: 8 случайных байт файла + номер блока"""
+    if index >= MAX_CHUNKS:
+        raise ValueError("Слишком много блоков в одном файле")
+    return prefix + struct.pack(">I", index)
 
-        with open(file_path, "rb") as f:
-            plaintext = f.read()
 
-        encrypted = fernet.encrypt(plaintext)
+def _read_exact(f, size: int) -> bytes:
+    """Читает ровно size байт либо выбрасывает ошибку усеченного файла"""
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Зашифрованный файл поврежден или усечен")
+    return data
 
-        # Сохраняем salt + зашифрованные данные
-        with open(output_path, "wb") as f:
-            f.write(salt + encrypted)
+
+def _read_full(f, view) -> int:
+    """Заполняет буфер целиком (короче только в конце файла)"""
+    total = 0
+    while total < len(view):
+        n = f.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+_local = threading.local()
+
+
+def _stream_buffers(chunk_size):
+    """
+    Буферы шифрования текущего потока: два для чтения (следующий блок читается заранее)
+    и один для шифротекста с тегом AEAD. Буферы до STREAM_CHUNK_SIZE переиспользуются между файлами
+    """
+    sizes = (chunk_size, chunk_size, chunk_size + AEAD_TAG_SIZE)
+    if chunk_size > STREAM_CHUNK_SIZE:
+        return [memoryview(bytearray(size)) for size in sizes]
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = [memoryview(bytearray(STREAM_CHUNK_SIZE + AEAD_TAG_SIZE)) for _ in sizes]
+    return [buffer[:size] for buffer, size in zip(buffers, sizes)]
+
+
+def _file_blocks(src, read_buffers):
+    """
+    Блоки потока через readinto в два чередующихся буфера.
+    Выдает (срез буфера, последний ли блок); срез действителен до следующего шага
+    """
+    chunk_size = len(read_buffers[0])
+    current = 0
+    size = _read_full(src, read_buffers[current])
+    while True:
+        next_size = _read_full(src, read_buffers[1 - current]) if size == chunk_size else 0
+        yield read_buffers[current][:size], next_size == 0
+        if next_size == 0:
+            return
+        current = 1 - current
+        size = next_size
+
+
+def _view_blocks(view, chunk_size):
+    """Блоки данных в памяти срезами memoryview без копирования"""
+    if not len(view):
+        yield view, True
+        return
+    for offset in range(0, len(view), chunk_size):
+        yield view[offset:offset + chunk_size], offset + chunk_size >= len(view)
+
+
+def _write_parts(dst, parts):
+    """
+    Пишет части записи без склейки: в файл без буферизации - одним writev,
+    в остальные потоки - writelines
+    """
+    if isinstance(dst, io.FileIO) and hasattr(os, "writev"):
+        fd = dst.fileno()
+        while parts:
+            written = os.writev(fd, parts)
+            # Частичная запись: пропускаем записанные части и дописываем остаток
+            while parts and written >= len(parts[0]):
+                written -= len(parts[0])
+                parts = parts[1:]
+            if parts and written:
+                parts = [memoryview(parts[0])[written:]] + list(parts[1:])
     else:
-        # Используем AES шифрование с фиксированным ключом
-        cipher = AES.new(SECRET_KEY, AES.MODE_CBC)
-        iv = cipher.iv
+        dst.writelines(parts)
 
-        with open(file_path, "rb") as f:
-            plaintext = f.read()
 
-        ciphertext = cipher.encrypt(pad(plaintext, AES.block_size))
+def _encrypt_stream(src, dst, password=None, session=None, chunk_size=STREAM_CHUNK_SIZE, salt=None,
+                    codec=CODEC_NONE, hasher=None, blocks=None, cipher=None, compression=None):
+    """
+    Шифрует поток src в поток dst (заголовок + блоки) шифром AEAD, при необходимости сжимая блоки.
+    Заголовок и номер блока с флагами входят в дополнительные данные AEAD,
+    поэтому перестановка, подмена заголовка и усечение файла обнаруживаются.
+    blocks - готовые блоки (memoryview, последний ли) вместо чтения src.
+    compression - предпочтение кодека (crypto.compression): кодек выбирается по первому
+    уже прочитанному блоку вместо codec, без отдельного чтения начала файла.
+    hasher получает исходные данные по мере шифрования - файл читается один раз
+    """
+    cipher = cipher or default_cipher()
+    buffers = _stream_buffers(chunk_size)
+    out_view = buffers[2]
+    if blocks is None:
+        blocks = _file_blocks(src, buffers[:2])
+    # Первый блок читается до заголовка: по нему выбирается кодек, записываемый в заголовок
+    first = next(blocks)
+    if compression is not None:
+        codec = codec_from_sample(bytes(first[0][:SAMPLE_SIZE]), compression)
+
+    fields = struct.pack(">BBI", codec, cipher, chunk_size)
+    if session is not None:
+        salt = salt if salt is not None else session.salt
+        file_nonce = os.urandom(16)
+        header = MAGIC + struct.pack(">BB", STREAM_VERSION, KEY_MODE_SESSION) + fields + salt + file_nonce
+        master_key = session.file_key(file_nonce, salt)
+    elif password:
+        salt = os.urandom(16)
+        header = MAGIC + struct.pack(">BB", STREAM_VERSION, KEY_MODE_PASSWORD) + fields + salt
+        master_key = _password_master_key(password, salt)
+    else:
+        header = MAGIC + struct.pack(">BB", STREAM_VERSION, KEY_MODE_KEYFILE) + fields
+        master_key = SECRET_KEY
+
+    nonce_prefix = os.urandom(8)
+    header += nonce_prefix
+    aead = _aead(cipher, master_key)
+    encrypt_into = getattr(aead, "encrypt_into", None)  # cryptography < 44 - только encrypt
+
+    dst.write(header)
+    for index, (plaintext, final) in enumerate(itertools.chain((first,), blocks)):
+        if hasher is not None:
+            hasher.update(plaintext)
+        flags = FLAG_FINAL if final else 0
+        if codec != CODEC_NONE and len(plaintext):
+            # Сжатый блок сохраняется, только если он действительно меньше исходного
+            compressed = compress(codec, plaintext)
+            if len(compressed) < len(plaintext):
+                plaintext = compressed
+                flags |= FLAG_COMPRESSED
+
+        nonce = _chunk_nonce(nonce_prefix, index)
+        aad = header + struct.pack(">QB", index, flags)
+        if encrypt_into is not None:
+            sealed = out_view[:len(plaintext) + AEAD_TAG_SIZE]
+            encrypt_into(nonce, plaintext, aad, sealed)
+        else:
+            sealed = aead.encrypt(nonce, bytes(plaintext), aad)
+        _write_parts(dst, [struct.pack(">BI", flags, len(plaintext)), sealed])
+
+
+def encrypt_file(file_path, output_path, password=None, session=None, chunk_size=STREAM_CHUNK_SIZE,
+                 codec=CODEC_NONE, hasher=None, compression=None):
+    """
+    Шифрует файл потоково: AES-256-GCM или ChaCha20-Poly1305 для каждого блока (default_cipher).
+    Если передана сессия ключей - ключ файла получается из ее мастер-ключа через HKDF,
+    если указан пароль - из пароля (PBKDF2), иначе используется key.bin.
+    codec - кодек сжатия блоков перед шифрованием (записывается в заголовок);
+    compression - предпочтение кодека (AUTO, имя, "none"): кодек выбирается по первому блоку файла.
+    hasher (объект hashlib) считает хеш исходного файла за тот же проход чтения.
+    Файл читается через readinto в переиспользуемые буферы потока;
+    записи блоков уходят в файл одним writev без склейки буферов.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Файл не найден: {file_path}")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        with open(output_path, "wb") as f:
-            f.write(iv + ciphertext)
+    tmp_path = output_path + ".part"
+    try:
+        with open(file_path, "rb") as src, open(tmp_path, "wb", buffering=0) as dst:
+            _encrypt_stream(src, dst, password, session, chunk_size, codec=codec, hasher=hasher,
+                            compression=compression)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
     return output_path
 
 
-def decrypt_file(enc_path, output_path, password=None):
+def encrypt_bytes(data, password=None, session=None, salt=None, codec=CODEC_NONE) -> bytes:
     """
-    Расшифровывает файл.
-    Если указан пароль - использует Fernet дешифрование
+    Шифрует данные в памяти (bytes или memoryview) в том же потоковом формате без копирования входа.
+    salt позволяет привязать ключ к постоянной соли (например, хранилища блоков)
+    вместо соли текущей сессии
     """
-    if not os.path.exists(enc_path):
-        raise FileNotFoundError(f"Файл не найден: {enc_path}")
+    chunk_size = min(max(len(data), 1), STREAM_CHUNK_SIZE)
+    dst = io.BytesIO()
+    _encrypt_stream(None, dst, password, session, chunk_size, salt, codec,
+                    blocks=_view_blocks(memoryview(data), chunk_size))
+    return dst.getvalue()
+
+
+def _decrypt_stream(src, dst, password, session):
+    """Потоковое расшифрование файла в формате MAGIC"""
+    version, key_mode = struct.unpack(">BB", _read_exact(src, 2))
+    if version not in STREAM_VERSIONS:
+        raise ValueError(f"Неподдерживаемая версия формата: {version}")
+    cipher = None
+    if version == 1:
+        codec = CODEC_NONE
+        chunk_size, = struct.unpack(">I", _read_exact(src, 4))
+        header = MAGIC + struct.pack(">BBI", version, key_mode, chunk_size)
+    elif version == 2:
+        codec, chunk_size = struct.unpack(">BI", _read_exact(src, 5))
+        header = MAGIC + struct.pack(">BBBI", version, key_mode, codec, chunk_size)
+    else:
+        codec, cipher, chunk_size = struct.unpack(">BBI", _read_exact(src, 6))
+        header = MAGIC + struct.pack(">BBBBI", version, key_mode, codec, cipher, chunk_size)
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError("Зашифрованный файл поврежден или усечен")
+
+    if key_mode == KEY_MODE_PASSWORD:
+        if not password and session is None:
+            raise ValueError("Для расшифровки файла требуется пароль")
+        salt = _read_exact(src, 16)
+        header += salt
+        master_key = _password_master_key(password, salt, session)
+    elif key_mode == KEY_MODE_SESSION:
+        if not password and session is None:
+            raise ValueError("Для расшифровки файла требуется пароль")
+        salt = _read_exact(src, 16)
+        file_nonce = _read_exact(src, 16)
+        header += salt + file_nonce
+        if session is not None:
+            master_key = session.file_key(file_nonce, salt)
+        else:
+            with KeySession(password, salt) as temp_session:
+                master_key = temp_session.file_key(file_nonce)
+    elif key_mode == KEY_MODE_KEYFILE:
+        master_key = SECRET_KEY
+    else:
+        raise ValueError(f"Неизвестный режим ключа: {key_mode}")
+
+    nonce = _read_exact(src, 8)
+    header += nonce
+    if cipher is not None:
+        _decrypt_aead_chunks(src, dst, _aead(cipher, master_key), header, nonce, codec, chunk_size)
+        return
+
+    enc_key, mac_key = _derive_stream_keys(master_key)
+    cipher = AES.new(enc_key, AES.MODE_CTR, nonce=nonce)
+    mac_base = hmac.new(mac_key, header, hashlib.sha256)
+
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    index = 0
+    while True:
+        flags, size = struct.unpack(">BI", _read_exact(src, 5))
+        if size > chunk_size:
+            raise ValueError("Зашифрованный файл поврежден или усечен")
+        ciphertext = view[:size]
+        if _read_full(src, ciphertext) != size:
+            raise ValueError("Зашифрованный файл поврежден или усечен")
+        tag = _read_exact(src, 32)
+        if not hmac.compare_digest(tag, _chunk_tag(mac_base, index, flags, ciphertext)):
+            raise ValueError("Неверный пароль для расшифровки")
 
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cipher.decrypt(ciphertext, output=ciphertext)
+        if flags & FLAG_COMPRESSED:
+            dst.write(decompress(codec, ciphertext, chunk_size))
+        else:
+            dst.write(ciphertext)
+
+        if flags & FLAG_FINAL:
+            break
+        index += 1
+
+
+def _decrypt_aead_chunks(src, dst, aead, header, nonce_prefix, codec, chunk_size):
+    """Блоки версии 3: проверка тега AEAD и расшифровка в переиспользуемый буфер"""
+    sealed_buffer = memoryview(bytearray(chunk_size + AEAD_TAG_SIZE))
+    plain_buffer = memoryview(bytearray(chunk_size))
+    decrypt_into = getattr(aead, "decrypt_into", None)
+
+    index = 0
+    while True:
+        flags, size = struct.unpack(">BI", _read_exact(src, 5))
+        if size > chunk_size:
+            raise ValueError("Зашифрованный файл поврежден или усечен")
+        sealed = sealed_buffer[:size + AEAD_TAG_SIZE]
+        if _read_full(src, sealed) != len(sealed):
+            raise ValueError("Зашифрованный файл поврежден или усечен")
+
+        nonce = _chunk_nonce(nonce_prefix, index)
+        aad = header + struct.pack(">QB", index, flags)
+        try:
+            if decrypt_into is not None:
+                plaintext = plain_buffer[:size]
+                decrypt_into(nonce, sealed, aad, plaintext)
+            else:
+                plaintext = aead.decrypt(nonce, bytes(sealed), aad)
+        except InvalidTag:
+            raise ValueError("Неверный пароль для расшифровки")
 
-    with open(enc_path, "rb") as f:
-        data = f.read()
+        if flags & FLAG_COMPRESSED:
+            dst.write(decompress(codec, plaintext, chunk_size))
+        else:
+            dst.write(plaintext)
+
+        if flags & FLAG_FINAL:
+            break
+        index += 1
 
-    if password:
+
+def _decrypt_legacy(data, password, session) -> bytes:
+    """Расшифровка старых форматов: salt + Fernet или IV + AES-CBC"""
+    if password or session is not None:
         # Fernet дешифрование
         salt = data[:16]
         encrypted = data[16:]
 
-        key, _ = generate_key_from_password(password, salt)
+        if session is not None:
+            key = session.fernet_key(salt)
+        else:
+            key, _ = generate_key_from_password(password, salt)
         fernet = Fernet(key)
 
         try:
-            decrypted = fernet.decrypt(encrypted)
-            with open(output_path, "wb") as f:
-                f.write(decrypted)
+            return fernet.decrypt(encrypted)
         except Exception:
             raise ValueError("Неверный пароль для расшифровки")
     else:
@@ -120,14 +472,75 @@ def decrypt_file(enc_path, output_path, password=None):
         ciphertext = data[16:]
 
         cipher = AES.new(SECRET_KEY, AES.MODE_CBC, iv=iv)
-        plaintext = unpad(cipher.decrypt(ciphertext), AES.block_size)
+        return unpad(cipher.decrypt(ciphertext), AES.block_size)
+
+
+def decrypt_file(enc_path, output_path, password=None, session=None):
+    """
+    Расшифровывает файл.
+    Потоковый формат определяется по сигнатуре, остальные файлы
+    читаются как старые форматы (Fernet с паролем или AES-CBC).
+    Сессия ключей избавляет от повторного PBKDF2 для каждого файла
+    """
+    if not os.path.exists(enc_path):
+        raise FileNotFoundError(f"Файл не найден: {enc_path}")
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        with open(output_path, "wb") as f:
-            f.write(plaintext)
+    with open(enc_path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            tmp_path = output_path + ".part"
+            try:
+                with open(tmp_path, "wb") as dst:
+                    _decrypt_stream(f, dst, password, session)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        else:
+            f.seek(0)
+            plaintext = _decrypt_legacy(f.read(), password, session)
+            with open(output_path, "wb") as out:
+                out.write(plaintext)
 
     return output_path
 
 
+class _CountingSink:
+    """Приемник расшифрованных данных при проверке: только считает байты"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def verify_file(enc_path, password=None, session=None) -> int:
+    """
+    Проверяет, что файл расшифровывается и проходит проверку подлинности,
+    ничего не записывая на диск. Возвращает размер исходных данных
+    """
+    with open(enc_path, "rb") as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            sink = _CountingSink()
+            _decrypt_stream(f, sink, password, session)
+            return sink.size
+        f.seek(0)
+        return len(_decrypt_legacy(f.read(), password, session))
+
+
+def decrypt_bytes(data, password=None, session=None) -> bytes:
+    """Расшифровывает данные, зашифрованные encrypt_bytes"""
+    src = io.BytesIO(data)
+    if src.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Неизвестный формат зашифрованных данных")
+    dst = io.BytesIO()
+    _decrypt_stream(src, dst, password, session)
+    return dst.getvalue()
+
+
 def is_encrypted(file_path):
     """
     Проверяет, имеет ли файл расширение .enc
@@ -137,7 +550,10 @@ def is_encrypted(file_path):
 
 def detect_encryption_type(file_path):
     """
-    Определяет тип шифрования файла
+    Определяет тип шифрования файла по заголовку:
+    "aead" - потоковый формат версии 3, "stream" - потоковый формат версий 1-2 (AES-CTR + HMAC),
+    "fernet" - старый формат salt + токен Fernet, "aes-cbc" - старый формат IV + AES-CBC,
+    "none" - файл без расширения .enc
     """
     if not is_encrypted(file_path):
         return "none"
@@ -145,7 +561,10 @@ def detect_encryption_type(file_path):
     with open(file_path, "rb") as f:
         data = f.read(32)  # Читаем первые 32 байта для анализа
 
-    # Fernet файлы начинаются с salt (16 байт)
-    # AES файлы начинаются с IV (16 байт)
-    # Пока не можем точно определить, возвращаем оба варианта
-    return "fernet_or_aes"
\ No newline at end of file
+    if data.startswith(MAGIC):
+        return "aead" if data[len(MAGIC):len(MAGIC) + 1] == bytes([3]) else "stream"
+
+    # Токен Fernet после 16 байт salt - base64 от байта версии 0x80 и времени: начинается с "gAAAAA"
+    if data[16:22] == b"gAAAAA":
+        return "fernet"
+    return "aes-cbc"
@@ -0,0 +1,83 @@
+# key_session.py
+import os
+import time
+import base64
+import threading
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+PBKDF2_ITERATIONS = 100000
+FILE_KEY_INFO = b"backup-file-key"
+
+
+class KeySession:
+    """
+    Сессия ключей для одной операции резервного копирования или восстановления.
+    Мастер-ключ получается из пароля один раз (PBKDF2), ключи файлов - дешевым
+    шагом HKDF с nonce файла. Ключи хранятся в памяти до закрытия сессии
+    и затираются в close().
+    on_derive(секунды) вызывается после каждого PBKDF2 (для метрик)
+    """
+
+    def __init__(self, password: str, salt: bytes = None, on_derive=None):
+        self.salt = salt if salt is not None else os.urandom(16)
+        self.on_derive = on_derive
+        self._password = bytearray(password.encode())
+        self._master_keys = {}  # salt -> bytearray
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def master_key(self, salt: bytes = None) -> bytes:
+        """Мастер-ключ для salt (по умолчанию - salt сессии), PBKDF2 выполняется один раз"""
+        if salt is None:
+            salt = self.salt
+
+        with self._lock:
+            if self.closed:
+                raise ValueError("Сессия ключей закрыта")
+
+            key = self._master_keys.get(salt)
+            if key is None:
+                kdf = PBKDF2HMAC(
+                    algorithm=hashes.SHA256(),
+                    length=32,
+                    salt=salt,
+                    iterations=PBKDF2_ITERATIONS,
+                )
+                started = time.perf_counter()
+                key = bytearray(kdf.derive(bytes(self._password)))
+                self._master_keys[salt] = key
+                if self.on_derive is not None:
+                    self.on_derive(time.perf_counter() - started)
+            return bytes(key)
+
+    def fernet_key(self, salt: bytes) -> bytes:
+        """Ключ в формате Fernet для старых файлов salt + Fernet"""
+        return base64.urlsafe_b64encode(self.master_key(salt))
+
+    def file_key(self, nonce: bytes, salt: bytes = None) -> bytes:
+        """Ключ отдельного файла: HKDF(мастер-ключ, nonce файла)"""
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=nonce,
+            info=FILE_KEY_INFO,
+        )
+        return hkdf.derive(self.master_key(salt))
+
+    def close(self):
+        """Затирает пароль и все кешированные ключи"""
+        with self._lock:
+            for key in self._master_keys.values():
+                key[:] = bytes(len(key))
+            self._master_keys.clear()
+            self._password[:] = bytes(len(self._password))
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
@@ -0,0 +1,346 @@
+# catalog.py
+import os
+import struct
+import sqlite3
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from crypto.crypto_utils import encrypt_bytes, decrypt_bytes
+from crypto.compression import default_codec
+
+CATALOG_DIRNAME = ".catalogs"
+CATALOG_SUFFIX = ".catalog"
+CATALOG_VERSION = 2
+
+_CHUNK_REF = struct.Struct(">32sI")  # Идентификатор блока и его размер в столбце chunks
+_SQL_DUMP_MAGIC = b"-- catalog sql dump\n"  # Формат сохранения без sqlite3.serialize (Python < 3.11)
+
+# path - относительный путь (он же путь восстановления), location - путь зашифрованного файла
+# относительно резервной директории или None, chunks - [[идентификатор, размер], ...] блоков хранилища или None,
+# version - версия данных файла в индексе снимков (engine.snapshots) или None
+CatalogEntry = namedtuple("CatalogEntry",
+                          ["path", "size", "mtime_ns", "hash", "algorithm", "location", "chunks", "version"])
+
+_ENTRY_COLUMNS = "path, size, mtime_ns, hash, algorithm, location, chunks, version"
+
+
+def pack_chunks(chunks):
+    return b"".join(_CHUNK_REF.pack(bytes.fromhex(chunk_id), size) for chunk_id, size in chunks)
+
+
+def unpack_chunks(blob):
+    return [[chunk_id.hex(), size] for chunk_id, size in _CHUNK_REF.iter_unpack(blob)]
+
+
+def catalog_dir(backup_dir):
+    return os.path.join(backup_dir, CATALOG_DIRNAME)
+
+
+def list_catalogs(backup_dir):
+    """Идентификаторы сохраненных каталогов по возрастанию (идентификатор начинается со времени создания)"""
+    directory = catalog_dir(backup_dir)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(CATALOG_SUFFIX)] for name in os.listdir(directory) if name.endswith(CATALOG_SUFFIX))
+
+
+def catalog_path(backup_dir, snapshot_id):
+    return os.path.join(catalog_dir(backup_dir), snapshot_id + CATALOG_SUFFIX)
+
+
+def _format_snapshot_id(moment):
+    return moment.strftime("%Y%m%dT%H%M%S-%f")
+
+
+def _snapshot_id_moment(snapshot_id):
+    """Время из идентификатора; у прежних идентификаторов (секунда + случайный суффикс) - конец секунды"""
+    moment = datetime.strptime(snapshot_id[:15], "%Y%m%dT%H%M%S")
+    suffix = snapshot_id[16:]
+    if len(suffix) == 6 and suffix.isdigit():
+        return moment + timedelta(microseconds=int(suffix))
+    return moment + timedelta(seconds=1, microseconds=-1)
+
+
+def new_snapshot_id(backup_dir=None):
+    """
+    Идентификатор нового снимка: время с микросекундами. Порядок идентификаторов - порядок создания
+    (на нем основаны последний снимок и политика хранения), поэтому идентификатор, не больше
+    последнего каталога backup_dir (тот же момент, перевод часов), сдвигается сразу за него
+    """
+    snapshot_id = _format_snapshot_id(datetime.now())
+    existing = list_catalogs(backup_dir) if backup_dir is not None else []
+    if existing and snapshot_id <= existing[-1]:
+        snapshot_id = _format_snapshot_id(_snapshot_id_moment(existing[-1]) + timedelta(microseconds=1))
+    return snapshot_id
+
+
+def find_catalog_root(path):
+    """Ищет резервную директорию с каталогами, поднимаясь от path вверх"""
+    current = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path))
+    while True:
+        if list_catalogs(current):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+class Catalog:
+    """
+    Каталог резервной копии: все файлы с размером, mtime, хешем и местом хранения
+    в одной базе SQLite. База живет в памяти, на диск сохраняется целиком в зашифрованном
+    и сжатом виде, поэтому просмотр, поиск и восстановление отдельных файлов
+    не обращаются к файлам данных. Просмотр папки идет по индексам (parent, name)
+    файлов и папок.
+    """
+
+    def __init__(self, conn=None):
+        self.conn = conn or sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                algorithm TEXT,
+                location TEXT,
+                chunks BLOB,
+                source INTEGER,
+                version INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS files_parent ON files (parent, name);
+            CREATE INDEX IF NOT EXISTS files_name ON files (name);
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent, name);
+            CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+            CREATE TEMP TABLE IF NOT EXISTS seen (path TEXT PRIMARY KEY);
+        """)
+        # Каталоги версии 1 не знают источника и версии данных файлов
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(files)")]
+        for column in ("source", "version"):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+        self._known_dirs = set()
+        self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('version', ?)", (str(CATALOG_VERSION),))
+
+    # ---------- Сохранение ----------
+
+    @classmethod
+    def load(cls, path, session):
+        """Расшифровывает каталог с диска в память"""
+        with open(path, "rb") as f:
+            data = decrypt_bytes(f.read(), session=session)
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        if data.startswith(_SQL_DUMP_MAGIC):
+            conn.executescript(data[len(_SQL_DUMP_MAGIC):].decode("utf-8"))
+        else:
+            conn.deserialize(data)
+        version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is not None and int(version[0]) > CATALOG_VERSION:
+            raise ValueError(f"Неподдерживаемая версия каталога: {version[0]}")
+        catalog = cls(conn)
+        catalog.set_meta("version", CATALOG_VERSION)
+        return catalog
+
+    def save(self, path, session, salt=None):
+        """Шифрует каталог целиком и атомарно записывает на диск"""
+        with self._lock:
+            self.conn.commit()
+            if hasattr(self.conn, "serialize"):
+                data = self.conn.serialize()
+            else:
+                data = _SQL_DUMP_MAGIC + "\n".join(self.conn.iterdump()).encode("utf-8")
+        payload = encrypt_bytes(data, session=session, salt=salt, codec=default_codec())
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".part"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # ---------- Запись ----------
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _normalize(path):
+        return path.replace(os.sep, "/").strip("/")
+
+    def source_id(self, source_path):
+        """Номер исходного пути (файла или папки), из которого сохраняются записи"""
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO sources (path) VALUES (?)", (source_path,))
+            return self.conn.execute("SELECT id FROM sources WHERE path = ?", (source_path,)).fetchone()[0]
+
+    def add(self, path, size, mtime_ns, file_hash=None, algorithm=None, location=None, chunks=None,
+            source=None, version=None):
+        """Добавляет или заменяет запись файла"""
+        path = self._normalize(path)
+        parent, _, name = path.rpartition("/")
+        blob = pack_chunks(chunks) if chunks is not None else None
+        if location is not None:
+            location = self._normalize(location)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, parent, name, size, mtime_ns, hash, algorithm, location, "
+                "chunks, source, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, parent, name, size, mtime_ns, file_hash, algorithm, location, blob, source, version)
+            )
+            self._add_dirs(parent)
+
+    def _add_dirs(self, directory):
+        """Регистрирует папку и всех ее предков (известные пропускаются без запроса)"""
+        while directory and directory not in self._known_dirs:
+            self._known_dirs.add(directory)
+            parent, _, name = directory.rpartition("/")
+            self.conn.execute("INSERT OR IGNORE INTO dirs VALUES (?, ?, ?)", (directory, parent, name))
+            directory = parent
+
+    def update_stat(self, path, size, mtime_ns):
+        with self._lock:
+            self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?",
+                              (size, mtime_ns, self._normalize(path)))
+
+    def update_entry(self, path, source=None, version=None):
+        """Привязывает существующую запись к источнику и версии данных"""
+        with self._lock:
+            self.conn.execute("UPDATE files SET source = COALESCE(?, source), version = COALESCE(?, version) "
+                              "WHERE path = ?", (source, version, self._normalize(path)))
+
+    def mark_seen(self, path):
+        """Файл встречен в текущем проходе резервного копирования"""
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO temp.seen VALUES (?)", (self._normalize(path),))
+
+    def remove_unseen(self, source):
+        """
+        Удаляет записи источника, не встреченные в текущем проходе (исходные файлы удалены).
+        Возвращает версии данных удаленных записей
+        """
+        with self._lock:
+            condition = "FROM files WHERE source = ? AND path NOT IN (SELECT path FROM temp.seen)"
+            versions = [row[0] for row in self.conn.execute(f"SELECT version {condition}", (source,))
+                        if row[0] is not None]
+            removed = self.conn.execute(f"DELETE {condition}", (source,)).rowcount
+            if removed:
+                # Папки без файлов пересобираются по оставшимся записям
+                self.conn.execute("DELETE FROM dirs")
+                self._known_dirs.clear()
+                for parent, in self.conn.execute("SELECT DISTINCT parent FROM files").fetchall():
+                    self._add_dirs(parent)
+            self.conn.execute("DELETE FROM temp.seen")
+        return versions
+
+    # ---------- Чтение ----------
+
+    @staticmethod
+    def _entry(row):
+        path, size, mtime_ns, file_hash, algorithm, location, blob, version = row
+        return CatalogEntry(path, size, mtime_ns, file_hash, algorithm, location,
+                            unpack_chunks(blob) if blob is not None else None, version)
+
+    def get(self, path):
+        """Запись файла или None"""
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM files WHERE path = ?",
+                (self._normalize(path),)
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def total_size(self):
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+
+    def list_dir(self, directory="", limit=None, offset=0):
+        """Содержимое папки каталога: [(имя, это папка, размер, mtime_ns)], сначала папки"""
+        directory = self._normalize(directory)
+        with self._lock:
+            subdirs = self.conn.execute(
+                "SELECT name FROM dirs WHERE parent = ? ORDER BY name", (directory,)
+            ).fetchall()
+            files = self.conn.execute(
+                "SELECT name, size, mtime_ns FROM files WHERE parent = ? ORDER BY name LIMIT ? OFFSET ?",
+                (directory, -1 if limit is None else limit, offset)
+            ).fetchall()
+        return [(name, True, None, None) for name, in subdirs] + \
+               [(name, False, size, mtime_ns) for name, size, mtime_ns in files]
+
+    def iter_entries(self, patterns=None):
+        """
+        Записи каталога по порядку путей; patterns - шаблоны GLOB относительных путей,
+        шаблон-папка выбирает все ее содержимое. Шаблон с постоянным началом выбирается по индексу
+        """
+        query = f"SELECT {_ENTRY_COLUMNS} FROM files"
+        params = []
+        if patterns:
+            conditions = []
+            for pattern in patterns:
+                pattern = self._normalize(pattern)
+                conditions.append("path GLOB ? OR path GLOB ?")
+                params += [pattern, pattern + "/*"]
+            query += " WHERE " + " OR ".join(conditions)
+        query += " ORDER BY path"
+
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for row in rows:
+            yield self._entry(row)
+
+    def search(self, pattern, limit=None):
+        """Поиск по имени файла (шаблон GLOB, например *.docx); без шаблона папки - по всему каталогу"""
+        column = "path" if "/" in pattern else "name"
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {_ENTRY_COLUMNS} FROM files "
+                f"WHERE {column} GLOB ? ORDER BY path LIMIT ?",
+                (pattern, -1 if limit is None else limit)
+            ).fetchall()
+        return [self._entry(row) for row in rows]
+
+
+def load_catalog(backup_dir, snapshot_id, session):
+    """Каталог снимка; FileNotFoundError, если снимка нет"""
+    path = catalog_path(backup_dir, snapshot_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Снимок не найден: {snapshot_id}")
+    return Catalog.load(path, session)
+
+
+def load_latest_catalog(backup_dir, session):
+    """Последний каталог резервной директории или None"""
+    snapshots = list_catalogs(backup_dir)
+    if not snapshots:
+        return None
+    return Catalog.load(catalog_path(backup_dir, snapshots[-1]), session)
@@ -0,0 +1,306 @@
+# chunk_store.py
+import os
+import json
+import hmac
+import hashlib
+import threading
+
+from crypto.crypto_utils import encrypt_bytes, decrypt_bytes
+from crypto.compression import AUTO, SAMPLE_SIZE, CODEC_NONE, codec_from_sample
+from .chunking import FastCDC
+from .packs import PackIndex, PackReader, PackWriter, PACK_INDEX_FILENAME
+
+STORE_DIRNAME = ".chunks"
+CONFIG_FILENAME = "config"
+MANIFEST_SUFFIX = ".manifest"
+STORE_VERSION = 2  # Версия 2: новые блоки пишутся в сегменты (engine.packs), блоки версии 1 - отдельными файлами
+
+_local = threading.local()
+
+
+def find_store_root(path):
+    """Ищет резервную директорию с хранилищем блоков, поднимаясь от path вверх"""
+    current = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path))
+    while True:
+        if os.path.isdir(os.path.join(current, STORE_DIRNAME)):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+def chunk_object_path(backup_dir, chunk_id):
+    """Путь объекта блока в хранилище резервной директории (без ключей и открытия хранилища)"""
+    return os.path.join(backup_dir, STORE_DIRNAME, "objects", chunk_id[:2], chunk_id)
+
+
+def delete_chunks(backup_dir, chunk_ids):
+    """
+    Удаляет блоки хранилища резервной директории (без ключей): отдельные файлы блоков - сразу,
+    блоки сегментов - из индекса, после чего сегменты с большой долей удаленных данных переписываются.
+    Вызывается под блокировкой директории (engine.locking), чтобы не освободить блок идущего копирования.
+    Возвращает (удалено блоков, освобождено байт)
+    """
+    root = os.path.join(backup_dir, STORE_DIRNAME)
+    removed = freed = 0
+    packed = []
+    for chunk_id in chunk_ids:
+        path = chunk_object_path(backup_dir, chunk_id)
+        if os.path.exists(path):
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+        else:
+            packed.append(bytes.fromhex(chunk_id))
+    if packed and os.path.exists(os.path.join(root, PACK_INDEX_FILENAME)):
+        with PackIndex(root) as index:
+            removed += len(packed)
+            index.remove(packed)
+            freed += index.compact()
+    return removed, freed
+
+
+class ChunkStore:
+    """
+    Хранилище блоков с дедупликацией.
+    Файлы режутся на блоки по содержимому (FastCDC), каждый блок адресуется
+    ключевым хешем BLAKE2b и шифруется один раз. Файл в резервной копии -
+    зашифрованный манифест со списком блоков.
+    Блоки сжимаются перед шифрованием кодеком, выбранным для файла по его началу.
+    Новые блоки дописываются в большие файлы-сегменты (engine.packs) пачками, а не отдельными файлами:
+    на миллионах мелких файлов это убирает создание файла, каталога и inode на каждый блок.
+    Записанные, но еще не сброшенные блоки попадают на диск в flush() или close()
+    """
+
+    def __init__(self, backup_dir, session, chunker=None, compression=AUTO, segment_size=None, metrics=None):
+        self.root = os.path.join(backup_dir, STORE_DIRNAME)
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.segment_size = segment_size
+        self.metrics = metrics
+        self.session = session
+        self.chunker = chunker or FastCDC()
+        self.compression = compression
+
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self.reused_chunks = 0
+        self.reused_bytes = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}  # chunk_id -> Event: блок сейчас записывается другим потоком
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load_or_create_config()
+        self.packs = PackIndex(self.root)
+        self._reader = PackReader(self.packs)
+        self._writer = None
+
+    def _load_or_create_config(self):
+        """Соль хранилища постоянна: от нее зависят идентификаторы блоков"""
+        config_path = os.path.join(self.root, CONFIG_FILENAME)
+        config = None
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            self.salt = bytes.fromhex(config["salt"])
+            if config.get("version", 1) > STORE_VERSION:
+                raise ValueError(f"Неподдерживаемая версия хранилища блоков: {config['version']}")
+        else:
+            self.salt = os.urandom(16)
+
+        master_key = self.session.master_key(self.salt)
+        self.id_key = hmac.new(master_key, b"chunk-id", hashlib.sha256).digest()
+        verifier = hmac.new(self.id_key, b"verify", hashlib.sha256).hexdigest()
+
+        if config is None:
+            config = {"version": STORE_VERSION, "salt": self.salt.hex(), "verifier": verifier}
+            self._write_atomic(config_path, json.dumps(config).encode("utf-8"))
+        elif not hmac.compare_digest(config["verifier"], verifier):
+            raise ValueError("Неверный пароль для хранилища блоков")
+        elif config.get("version", 1) < STORE_VERSION:
+            config["version"] = STORE_VERSION
+            self._write_atomic(config_path, json.dumps(config).encode("utf-8"))
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def chunk_id(self, data):
+        """Идентификатор блока: ключевой BLAKE2b, не раскрывает содержимое"""
+        return hashlib.blake2b(data, key=self.id_key, digest_size=32).hexdigest()
+
+    def _object_path(self, chunk_id):
+        return os.path.join(self.objects_dir, chunk_id[:2], chunk_id)
+
+    def _writer_for_put(self):
+        with self._lock:
+            if self._writer is None:
+                kwargs = {"segment_size": self.segment_size} if self.segment_size else {}
+                self._writer = PackWriter(self.packs, metrics=self.metrics, **kwargs)
+            return self._writer
+
+    def has_chunk(self, chunk_id):
+        # Сначала буфер записи: сброшенный блок к этому моменту уже в индексе
+        chunk = bytes.fromhex(chunk_id)
+        if self._writer is not None and self._writer.pending(chunk) is not None:
+            return True
+        return self.packs.lookup(chunk) is not None or os.path.exists(self._object_path(chunk_id))
+
+    def put_chunk(self, data, codec=CODEC_NONE):
+        """Сохраняет блок, если его еще нет в хранилище; возвращает идентификатор"""
+        chunk_id = self.chunk_id(data)
+        while True:
+            with self._lock:
+                pending = self._in_flight.get(chunk_id)
+                if pending is None:
+                    if self.has_chunk(chunk_id):
+                        self.reused_chunks += 1
+                        self.reused_bytes += len(data)
+                        return chunk_id
+                    pending = self._in_flight[chunk_id] = threading.Event()
+                    break
+            # Тот же блок пишет другой поток: ждем и проверяем снова
+            pending.wait()
+
+        try:
+            blob = encrypt_bytes(data, session=self.session, salt=self.salt, codec=codec)
+            self._writer_for_put().append(bytes.fromhex(chunk_id), blob)
+            with self._lock:
+                self.new_chunks += 1
+                self.new_bytes += len(data)
+        finally:
+            with self._lock:
+                del self._in_flight[chunk_id]
+            pending.set()
+        return chunk_id
+
+    def get_chunk(self, chunk_id):
+        """Читает и расшифровывает блок, проверяя соответствие идентификатору"""
+        data = decrypt_bytes(self._read_blob(chunk_id), session=self.session)
+        if not hmac.compare_digest(self.chunk_id(data), chunk_id):
+            raise ValueError(f"Блок поврежден: {chunk_id}")
+        return data
+
+    def _read_blob(self, chunk_id):
+        """Зашифрованный блок: из сегмента по смещению из индекса или из отдельного файла (версия 1)"""
+        chunk = bytes.fromhex(chunk_id)
+        location = self.packs.lookup(chunk)
+        if location is not None:
+            return self._reader.read(*location)
+        if self._writer is not None:
+            blob = self._writer.pending(chunk)
+            if blob is not None:
+                return blob
+        with open(self._object_path(chunk_id), "rb") as f:
+            return f.read()
+
+    def flush(self):
+        """Сбрасывает накопленные блоки в сегмент; после этого на них можно ссылаться из каталога"""
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._reader.close()
+        self.packs.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def _read_buffer(self):
+        """Переиспользуемый буфер чтения текущего потока на два максимальных блока"""
+        size = 2 * self.chunker.max_size
+        buffer = getattr(_local, "buffer", None)
+        if buffer is None or len(buffer) != size:
+            buffer = _local.buffer = bytearray(size)
+        return buffer
+
+    def store_file(self, source_file, hasher=None):
+        """
+        Разбивает файл на блоки и сохраняет новые; возвращает манифест без записи на диск.
+        Файл читается один раз через readinto в буфер потока, блоки передаются
+        в хеширование и шифрование срезами memoryview.
+        hasher (объект hashlib) получает содержимое файла за тот же проход
+        """
+        chunks = []
+        size = 0
+        codec = None
+        with open(source_file, "rb") as f:
+            for chunk in self.chunker.iter_readinto(f, self._read_buffer()):
+                if hasher is not None:
+                    hasher.update(chunk)
+                if codec is None:
+                    codec = codec_from_sample(bytes(chunk[:SAMPLE_SIZE]), self.compression)
+                chunks.append([self.put_chunk(chunk, codec), len(chunk)])
+                size += len(chunk)
+        return {"version": STORE_VERSION, "size": size, "chunks": chunks}
+
+    def backup_file(self, source_file, manifest_path):
+        """Сохраняет файл блоками и записывает зашифрованный манифест рядом с копией"""
+        manifest = self.store_file(source_file)
+        self.flush()
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        payload = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+        self._write_atomic(manifest_path, encrypt_bytes(payload, session=self.session, salt=self.salt))
+        return manifest
+
+    def read_manifest(self, manifest_path):
+        with open(manifest_path, "rb") as f:
+            return json.loads(decrypt_bytes(f.read(), session=self.session))
+
+    def restore_file(self, manifest_path, output_path):
+        """Собирает файл из блоков манифеста"""
+        return self.restore_chunks(self.read_manifest(manifest_path)["chunks"], output_path)
+
+    def restore_chunks(self, chunks, output_path):
+        """Собирает файл из списка [идентификатор, размер] блоков"""
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+        tmp_path = output_path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk_id, _ in chunks:
+                    f.write(self.get_chunk(chunk_id))
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return output_path
+
+    def verify_file(self, manifest_path):
+        """Проверяет, что все блоки манифеста на месте и не повреждены; возвращает размер файла"""
+        manifest = self.read_manifest(manifest_path)
+        size = self.verify_chunks(manifest["chunks"])
+        if size != manifest["size"]:
+            raise ValueError(f"Размер файла не совпадает с манифестом: {manifest_path}")
+        return size
+
+    def verify_chunks(self, chunks):
+        """Проверяет блоки из списка [идентификатор, размер]; возвращает общий размер"""
+        size = 0
+        for chunk_id, chunk_size in chunks:
+            data = self.get_chunk(chunk_id)
+            if len(data) != chunk_size:
+                raise ValueError(f"Блок поврежден: {chunk_id}")
+            size += chunk_size
+        return size
+
+    def report(self):
+        """Сводка дедупликации за сессию"""
+        with self._lock:
+            return {
+                "new_chunks": self.new_chunks,
+                "new_bytes": self.new_bytes,
+                "reused_chunks": self.reused_chunks,
+                "reused_bytes": self.reused_bytes,
+            }
@@ -0,0 +1,158 @@
+# chunking.py
+import hashlib
+
+# numpy ускоряет вычисление gear-хеша, без него используется чистый Python
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Параметры FastCDC по умолчанию: блоки от 256 КБ до 4 МБ, в среднем 1 МБ
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+WINDOW = 32  # gear-хеш в 32 бита зависит только от последних 32 байт
+_MASK32 = 0xFFFFFFFF
+
+# Таблица gear: 256 псевдослучайных 32-битных чисел, фиксированная для всех версий,
+# иначе границы блоков (и дедупликация) разойдутся между запусками
+GEAR = tuple(
+    int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=4).digest(), "big")
+    for i in range(256)
+)
+_GEAR_ARRAY = numpy.array(GEAR, dtype=numpy.uint32) if numpy is not None else None
+
+
+def _mask(bits):
+    """Маска из bits единиц в старших разрядах 32-битного gear-хеша"""
+    return ((1 << bits) - 1) << (32 - bits)
+
+
+def _first_hit_python(data, start, end, mask):
+    """Первая позиция i в [start, end), где gear-хеш окна data[i-31:i+1] проходит маску"""
+    gear = GEAR
+    h = 0
+    for byte in data[start - WINDOW + 1:start]:
+        h = ((h << 1) + gear[byte]) & _MASK32
+    for i, byte in enumerate(data[start:end], start):
+        h = ((h << 1) + gear[byte]) & _MASK32
+        if not h & mask:
+            return i
+    return None
+
+
+def _first_hit_numpy(data, start, end, mask):
+    """То же, что _first_hit_python, но gear-хеш всех позиций считается векторно"""
+    segment = numpy.frombuffer(data, dtype=numpy.uint8, count=end - start + WINDOW - 1,
+                               offset=start - WINDOW + 1)
+    h = _GEAR_ARRAY[segment]
+    # Удвоение окна: H_2w(i) = H_w(i) + H_w(i - w) << w, пять проходов вместо 32
+    width = 1
+    while width < WINDOW:
+        h[width:] += h[:-width] << numpy.uint32(width)
+        width *= 2
+    hits = numpy.flatnonzero((h[WINDOW - 1:] & numpy.uint32(mask)) == 0)
+    return start + int(hits[0]) if hits.size else None
+
+
+_scan = _first_hit_numpy if numpy is not None else _first_hit_python
+
+SCAN_STEP = 256 * 1024  # Участки поиска границы, чтобы не считать хеш дальше найденной границы
+
+
+def _first_hit(data, start, end, mask):
+    """Ищет первую позицию, проходящую маску, участками по SCAN_STEP"""
+    for piece_start in range(start, end, SCAN_STEP):
+        hit = _scan(data, piece_start, min(piece_start + SCAN_STEP, end), mask)
+        if hit is not None:
+            return hit
+    return None
+
+
+class FastCDC:
+    """
+    Разбиение данных на блоки по содержимому (FastCDC с нормализацией).
+    Граница блока определяется скользящим gear-хешем, поэтому вставка
+    или удаление байт сдвигает только соседние границы.
+    """
+
+    def __init__(self, min_size=MIN_CHUNK_SIZE, avg_size=AVG_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE):
+        if not WINDOW <= min_size < avg_size < max_size:
+            raise ValueError("Должно выполняться 32 <= min_size < avg_size < max_size")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+
+        bits = avg_size.bit_length() - 1
+        self.mask_s = _mask(bits + 2)  # Строже до среднего размера
+        self.mask_l = _mask(bits - 2)  # Мягче после среднего размера
+
+    def cut_point(self, data, start=0, end=None):
+        """Длина следующего блока в data[start:end]"""
+        if end is None:
+            end = len(data)
+        length = end - start
+        if length <= self.min_size:
+            return length
+        if length > self.max_size:
+            length = self.max_size
+        normal = min(self.avg_size, length)
+
+        hit = _first_hit(data, start + self.min_size, start + normal, self.mask_s)
+        if hit is None and normal < length:
+            hit = _first_hit(data, start + normal, start + length, self.mask_l)
+        return length if hit is None else hit - start + 1
+
+    def iter_chunks(self, f):
+        """
+        Читает файл и выдает блоки (bytes).
+        В памяти одновременно не более двух максимальных блоков.
+        """
+        buffer = bytearray()
+        eof = False
+        while True:
+            if not eof and len(buffer) < self.max_size:
+                data = f.read(self.max_size)
+                if data:
+                    buffer += data
+                else:
+                    eof = True
+                continue
+            if not buffer:
+                return
+
+            size = self.cut_point(buffer)
+            chunk = bytes(buffer[:size])
+            del buffer[:size]
+            yield chunk
+
+    def iter_readinto(self, f, buffer):
+        """
+        Читает файл через readinto в buffer (не меньше двух максимальных блоков) и выдает блоки -
+        срезы memoryview буфера без копирования; срез действителен до следующего шага.
+        Остаток перед дочитыванием переносится в начало буфера
+        """
+        if len(buffer) < 2 * self.max_size:
+            raise ValueError("Буфер должен вмещать два максимальных блока")
+        view = memoryview(buffer)
+        start = end = 0
+        eof = False
+        while True:
+            if not eof and end - start < self.max_size:
+                if start:
+                    view[:end - start] = view[start:end]
+                    end -= start
+                    start = 0
+                n = f.readinto(view[end:])
+                if n:
+                    end += n
+                else:
+                    eof = True
+                continue
+            if start == end:
+                return
+
+            size = self.cut_point(view, start, end)
+            yield view[start:start + size]
+            start += size
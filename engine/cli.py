@@ -0,0 +1,223 @@
+# cli.py
+"""
+Командная строка для запуска без графического интерфейса (cron, systemd):
+
+    python -m engine backup ИСТОЧНИК РЕЗЕРВНАЯ_ДИРЕКТОРИЯ
+    python -m engine restore РЕЗЕРВНАЯ_КОПИЯ ПАПКА_ВОССТАНОВЛЕНИЯ
+    python -m engine verify РЕЗЕРВНАЯ_КОПИЯ
+    python -m engine diff ИСТОЧНИК РЕЗЕРВНАЯ_ДИРЕКТОРИЯ
+    python -m engine ls РЕЗЕРВНАЯ_ДИРЕКТОРИЯ [ПАПКА]
+    python -m engine find РЕЗЕРВНАЯ_ДИРЕКТОРИЯ ШАБЛОН
+    python -m engine snapshots РЕЗЕРВНАЯ_ДИРЕКТОРИЯ
+    python -m engine forget РЕЗЕРВНАЯ_ДИРЕКТОРИЯ --keep-last N [--keep-daily N] [--keep-weekly N]
+
+Пароль шифрования берется из переменной окружения (по умолчанию BACKUP_PASSWORD),
+из файла --password-file или запрашивается в терминале.
+Ход работы печатается в stdout строками JSON, журнал приложения - в stderr.
+С --metrics-file метрики фаз (гистограммы времени, байты) пишутся в файл JSON или Prometheus (.prom)
+во время работы и по ее окончании; --profile ДИРЕКТОРИЯ сохраняет отчеты cProfile/tracemalloc.
+Коды выхода: 0 - успешно, 1 - есть ошибки по файлам (для diff - есть изменения), 2 - операция не выполнена,
+3 - операция отменена (SIGINT/SIGTERM останавливают работу на границе файла).
+"""
+import argparse
+import getpass
+import json
+import os
+import signal
+import sys
+import time
+
+from crypto.compression import AUTO, available_codecs
+from .hashing import DEFAULT_ALGORITHM, available_algorithms
+from .metrics import EXPORT_INTERVAL, Metrics, MetricsExporter, Profiler
+from .service import BackupService
+
+
+def _read_password(args):
+    """Пароль из файла, переменной окружения или терминала"""
+    if args.password_file:
+        with open(args.password_file, "r", encoding="utf-8") as f:
+            return f.readline().rstrip("\n")
+    password = os.environ.get(args.password_env)
+    if password:
+        return password
+    if sys.stdin.isatty():
+        return getpass.getpass("Пароль шифрования: ")
+    raise ValueError(f"Пароль не задан: укажите --password-file или переменную {args.password_env}")
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog="python -m engine",
+                                     description="Система резервного копирования без графического интерфейса")
+    parser.add_argument("--password-env", default="BACKUP_PASSWORD",
+                        help="переменная окружения с паролем шифрования")
+    parser.add_argument("--password-file", help="файл, первая строка которого - пароль шифрования")
+    parser.add_argument("--no-file-events", action="store_true",
+                        help="не печатать события по отдельным файлам")
+    parser.add_argument("--progress", action="store_true",
+                        help="печатать события хода работы (файлов/с, МБ/с)")
+    parser.add_argument("--metrics-file", help="файл метрик фаз (.prom - формат Prometheus, иначе JSON)")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"],
+                        help="формат файла метрик (по умолчанию - по расширению)")
+    parser.add_argument("--metrics-interval", type=float, default=EXPORT_INTERVAL,
+                        help="период записи метрик во время работы, секунд (0 - только в конце)")
+    parser.add_argument("--profile", metavar="ДИРЕКТОРИЯ", help="сохранить отчеты профилирования в директорию")
+    parser.add_argument("--profile-mode", choices=["cpu", "memory", "all"], default="all",
+                        help="cpu - cProfile, memory - tracemalloc, all - оба")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backup = commands.add_parser("backup", help="создать резервную копию")
+    backup.add_argument("source")
+    backup.add_argument("backup_dir")
+    backup.add_argument("--workers", type=int, default=None, help="потоков шифрования (по умолчанию - по числу ядер)")
+    backup.add_argument("--paranoid", action="store_true", help="перехешировать все файлы")
+    backup.add_argument("--hash", default=DEFAULT_ALGORITHM, choices=available_algorithms())
+    backup.add_argument("--no-dedup", action="store_true", help="сохранять файлы .enc вместо хранилища блоков")
+    backup.add_argument("--compression", default=AUTO, choices=[AUTO] + available_codecs())
+
+    restore = commands.add_parser("restore", help="восстановить файлы из резервной копии")
+    restore.add_argument("backup_path")
+    restore.add_argument("target")
+    restore.add_argument("--include", action="append", metavar="ШАБЛОН",
+                         help="восстановить только подходящие пути (можно указать несколько раз)")
+    restore.add_argument("--workers", type=int, default=None, help="потоков расшифровки")
+    restore.add_argument("--no-resume", action="store_true", help="не продолжать по журналу прерванного восстановления")
+    restore.add_argument("--snapshot", help="идентификатор снимка (по умолчанию последний)")
+
+    verify = commands.add_parser("verify", help="проверить целостность резервной копии")
+    verify.add_argument("backup_path")
+
+    diff = commands.add_parser("diff", help="показать файлы, измененные после последней копии")
+    diff.add_argument("source")
+    diff.add_argument("backup_dir")
+    diff.add_argument("--paranoid", action="store_true", help="перехешировать все файлы")
+    diff.add_argument("--hash", default=DEFAULT_ALGORITHM, choices=available_algorithms())
+
+    ls = commands.add_parser("ls", help="показать содержимое папки копии по каталогу")
+    ls.add_argument("backup_path")
+    ls.add_argument("directory", nargs="?", default="")
+    ls.add_argument("--snapshot", help="идентификатор снимка (по умолчанию последний)")
+
+    find = commands.add_parser("find", help="найти файлы копии по шаблону имени или пути")
+    find.add_argument("backup_path")
+    find.add_argument("pattern", help="шаблон GLOB, например *.docx или docs/*")
+    find.add_argument("--limit", type=int, default=None)
+    find.add_argument("--snapshot", help="идентификатор снимка (по умолчанию последний)")
+
+    snapshots = commands.add_parser("snapshots", help="показать снимки резервной директории")
+    snapshots.add_argument("backup_dir")
+
+    forget = commands.add_parser("forget", help="удалить снимки по политике хранения и ненужные им данные")
+    forget.add_argument("backup_dir")
+    forget.add_argument("--keep-last", type=int, default=0, metavar="N", help="оставить N последних снимков")
+    forget.add_argument("--keep-daily", type=int, default=0, metavar="N",
+                        help="оставить последний снимок каждого из N последних дней")
+    forget.add_argument("--keep-weekly", type=int, default=0, metavar="N",
+                        help="оставить последний снимок каждой из N последних недель")
+    forget.add_argument("--keep-monthly", type=int, default=0, metavar="N",
+                        help="оставить последний снимок каждого из N последних месяцев")
+    forget.add_argument("--dry-run", action="store_true", help="только показать, что будет удалено")
+
+    return parser
+
+
+def _make_printer(no_file_events, progress):
+    def emit(event):
+        if no_file_events and event["event"] in ("file", "changed"):
+            return
+        if not progress and event["event"] == "progress":
+            return
+        event = dict(event, ts=round(time.time(), 3))
+        sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+    return emit
+
+
+def _cancel_on_signal(service):
+    """SIGINT/SIGTERM отменяют операцию: текущие файлы дописываются, индекс остается согласованным"""
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: service.cancel())
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    emit = _make_printer(args.no_file_events, args.progress)
+    metrics = Metrics(labels={"command": args.command}) if args.metrics_file else None
+    service = BackupService(on_event=emit, metrics=metrics)
+
+    exporter = profiler = None
+    if metrics is not None:
+        exporter = MetricsExporter(metrics, args.metrics_file, args.metrics_format, args.metrics_interval).start()
+    if args.profile:
+        profiler = Profiler(args.profile, args.profile_mode).start()
+    try:
+        return _run_command(args, service, emit)
+    finally:
+        if profiler is not None:
+            for path in profiler.stop():
+                emit({"event": "profile", "path": path})
+        if exporter is not None:
+            exporter.stop()
+            emit({"event": "metrics", "path": args.metrics_file})
+
+
+def _run_command(args, service, emit):
+    try:
+        if args.command == "diff":
+            if not os.path.exists(args.source):
+                raise FileNotFoundError(f"Указанный путь не существует: {args.source}")
+            _cancel_on_signal(service)
+            changed = service.check_changes(args.source, args.backup_dir, paranoid=args.paranoid,
+                                            algorithm=args.hash)
+            if service.cancelled:
+                return 3
+            return 1 if changed else 0
+        if args.command == "forget":
+            if not (args.keep_last or args.keep_daily or args.keep_weekly or args.keep_monthly):
+                raise ValueError("Не задана политика хранения: укажите хотя бы одно из --keep-*")
+            service.forget(args.backup_dir, keep_last=args.keep_last, keep_daily=args.keep_daily,
+                           keep_weekly=args.keep_weekly, keep_monthly=args.keep_monthly, dry_run=args.dry_run)
+            return 0
+
+        password = _read_password(args)
+        if args.command == "ls":
+            for name, is_dir, size, mtime_ns in service.list_files(args.backup_path, password, args.directory,
+                                                                  snapshot=args.snapshot):
+                emit({"event": "entry", "name": name, "dir": is_dir, "size": size, "mtime_ns": mtime_ns})
+            return 0
+        if args.command == "find":
+            for entry in service.search(args.backup_path, password, args.pattern, args.limit,
+                                          snapshot=args.snapshot):
+                emit({"event": "entry", "path": entry.path, "size": entry.size, "mtime_ns": entry.mtime_ns,
+                      "hash": entry.hash})
+            return 0
+        if args.command == "snapshots":
+            for snapshot_id, created, source, files, size in service.list_snapshots(args.backup_dir, password):
+                emit({"event": "snapshot", "snapshot": snapshot_id, "created": created, "source": source,
+                      "files": files, "size": size})
+            return 0
+
+        _cancel_on_signal(service)
+        if args.command == "backup":
+            if not os.path.exists(args.source):
+                raise FileNotFoundError(f"Указанный путь не существует: {args.source}")
+            result = service.backup(args.source, args.backup_dir, password, workers=args.workers,
+                                    paranoid=args.paranoid, algorithm=args.hash,
+                                    use_chunk_store=not args.no_dedup, compression=args.compression)
+        elif args.command == "restore":
+            result = service.restore(args.backup_path, args.target, password, patterns=args.include,
+                                     workers=args.workers, resume=not args.no_resume, snapshot=args.snapshot)
+        else:
+            result = service.verify(args.backup_path, password)
+        if result["cancelled"]:
+            return 3
+        return 1 if result["failed"] else 0
+
+    except Exception as e:
+        service.logger.log_error(f"CLI {args.command} Error", str(e))
+        emit({"event": "error", "operation": args.command, "message": str(e)})
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
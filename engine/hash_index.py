@@ -0,0 +1,151 @@
+# hash_index.py
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from .hashing import hash_file, DEFAULT_ALGORITHM, LEGACY_ALGORITHM, ALGORITHMS
+
+INDEX_FILENAME = ".backup_index.sqlite"
+
+IndexEntry = namedtuple("IndexEntry", ["size", "mtime_ns", "inode", "hash", "algorithm"])
+
+
+class HashIndex:
+    """
+    Постоянный индекс хешей в резервной директории (SQLite).
+    Ключ - абсолютный путь исходного файла, значения - размер, mtime_ns, inode,
+    хеш и алгоритм, которым он посчитан.
+    Записи накапливаются и фиксируются пачками.
+    """
+
+    def __init__(self, backup_dir, batch_size=1000):
+        os.makedirs(backup_dir, exist_ok=True)
+        self.path = os.path.join(backup_dir, INDEX_FILENAME)
+        self.batch_size = batch_size
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        # Индекс читают потоки хеширования конвейера, поэтому соединение общее под блокировкой
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                algorithm TEXT NOT NULL DEFAULT 'md5'
+            )
+        """)
+        # Индексы старого формата не содержат алгоритма - там всегда был MD5
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(files)")]
+        if "algorithm" not in columns:
+            self.conn.execute(f"ALTER TABLE files ADD COLUMN algorithm TEXT NOT NULL DEFAULT '{LEGACY_ALGORITHM}'")
+        self.conn.commit()
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(file_path)
+
+    def get(self, file_path):
+        """Возвращает запись индекса или None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT size, mtime_ns, inode, hash, algorithm FROM files WHERE path = ?",
+                (self._key(file_path),)
+            ).fetchone()
+        return IndexEntry(*row) if row else None
+
+    def get_hash(self, file_path):
+        """Возвращает сохраненный хеш файла или None"""
+        entry = self.get(file_path)
+        return entry.hash if entry else None
+
+    def put(self, file_path, stat_result, file_hash, algorithm=DEFAULT_ALGORITHM):
+        """Сохраняет метаданные и хеш файла"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, hash, algorithm) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self._key(file_path), stat_result.st_size, stat_result.st_mtime_ns,
+                 stat_result.st_ino, file_hash, algorithm)
+            )
+            self._pending += 1
+            if self._pending >= self.batch_size:
+                self.conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        """Фиксирует накопленные записи"""
+        with self._lock:
+            self.conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class ChangeDetector:
+    """
+    Определяет изменение файла по индексу.
+    Если размер, mtime_ns и inode совпадают с записью индекса, файл считается
+    неизменным без чтения содержимого. В параноидальном режиме хеш считается всегда.
+    """
+
+    def __init__(self, index, paranoid=False, algorithm=DEFAULT_ALGORITHM, hash_func=hash_file):
+        self.index = index
+        self.paranoid = paranoid
+        self.algorithm = algorithm
+        self.hash_func = hash_func
+
+    @staticmethod
+    def stat_matches(entry, stat_result):
+        return (entry.size == stat_result.st_size
+                and entry.mtime_ns == stat_result.st_mtime_ns
+                and entry.inode == stat_result.st_ino)
+
+    def check(self, file_path, stat_result=None, defer_hash=False):
+        """
+        Возвращает (изменен ли файл, хеш файла).
+        defer_hash=True: если файл изменен заведомо (его нет в индексе или другой размер),
+        хеш не считается и возвращается None - его посчитают при сохранении за тот же проход чтения
+        """
+        if stat_result is None:
+            stat_result = os.stat(file_path)
+
+        entry = self.index.get(file_path)
+        if entry is not None and not self.paranoid and self.stat_matches(entry, stat_result):
+            return False, entry.hash
+        if defer_hash and (entry is None or entry.size != stat_result.st_size):
+            return True, None
+
+        if entry is not None and entry.algorithm != self.algorithm:
+            # Хеши разных алгоритмов не сравниваются: проверяем старым алгоритмом, если он доступен
+            if entry.algorithm not in ALGORITHMS:
+                return True, self.hash_func(file_path, self.algorithm)
+            if self.hash_func(file_path, entry.algorithm) != entry.hash:
+                return True, self.hash_func(file_path, self.algorithm)
+            if not self.stat_matches(entry, stat_result):
+                self.index.put(file_path, stat_result, entry.hash, entry.algorithm)
+            return False, entry.hash
+
+        file_hash = self.hash_func(file_path, self.algorithm)
+        if entry is None or entry.hash != file_hash:
+            return True, file_hash
+
+        # Содержимое то же, но метаданные изменились (touch, копирование) - обновляем индекс,
+        # чтобы следующая проверка снова прошла по быстрому пути
+        if not self.stat_matches(entry, stat_result):
+            self.index.put(file_path, stat_result, file_hash, self.algorithm)
+        return False, file_hash
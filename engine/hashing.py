@@ -0,0 +1,94 @@
+# hashing.py
+import os
+import time
+import hashlib
+import threading
+
+# Необязательные быстрые алгоритмы
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_ALGORITHM = "blake2b"
+LEGACY_ALGORITHM = "md5"  # Хеши, записанные до появления выбора алгоритма
+
+BUFFER_SIZE = 1024 * 1024  # 1 МБ на поток
+
+ALGORITHMS = {
+    "md5": hashlib.md5,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+}
+if blake3 is not None:
+    ALGORITHMS["blake3"] = blake3.blake3
+if xxhash is not None:
+    ALGORITHMS["xxh3"] = xxhash.xxh3_128
+
+_local = threading.local()
+
+
+def available_algorithms():
+    """Список алгоритмов, доступных в текущем окружении"""
+    return list(ALGORITHMS)
+
+
+def new_hasher(algorithm=DEFAULT_ALGORITHM):
+    """Создает объект хеширования по имени алгоритма"""
+    try:
+        return ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"Алгоритм хеширования недоступен: {algorithm}")
+
+
+def _buffer():
+    """Переиспользуемый буфер чтения текущего потока"""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray(BUFFER_SIZE)
+    return buffer
+
+
+def hash_file(file_path, algorithm=DEFAULT_ALGORITHM):
+    """
+    Вычисляет хеш файла (исключения пробрасываются вызывающему).
+    Файл читается через readinto в заранее выделенный буфер потока
+    """
+    hasher = new_hasher(algorithm)
+    buffer = _buffer()
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def benchmark(size=256 * 1024 * 1024, repeat=3):
+    """Сравнивает алгоритмы на одних и тех же данных, возвращает МБ/с для каждого"""
+    data = memoryview(os.urandom(1024 * 1024) * (size // (1024 * 1024)))
+    results = {}
+    for algorithm in available_algorithms():
+        best = None
+        for _ in range(repeat):
+            hasher = new_hasher(algorithm)
+            started = time.perf_counter()
+            for offset in range(0, len(data), BUFFER_SIZE):
+                hasher.update(data[offset:offset + BUFFER_SIZE])
+            hasher.digest()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[algorithm] = round(len(data) / best / (1024 * 1024), 1)
+    return results
+
+
+if __name__ == "__main__":
+    for name, speed in sorted(benchmark().items(), key=lambda item: -item[1]):
+        print(f"{name:10} {speed:10.1f} МБ/с")
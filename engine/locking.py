@@ -0,0 +1,91 @@
+# locking.py
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_FILENAME = ".backup.lock"
+LOCK_TIMEOUT = 10  # Ожидание занятой резервной директории, секунд
+POLL_INTERVAL = 0.1
+
+
+class RepositoryLocked(Exception):
+    """Резервная директория занята другой операцией дольше времени ожидания"""
+
+
+class RepositoryLock:
+    """
+    Исключительная блокировка резервной директории между процессами (файл .backup.lock).
+    Ее держат резервное копирование и удаление снимков со сжатием сегментов: иначе удаление
+    может освободить блок, который идущее копирование уже посчитало существующим.
+    Файл блокировки не удаляется - блокировка снимается системой и при аварийном завершении процесса
+    """
+
+    def __init__(self, backup_dir, operation="", timeout=LOCK_TIMEOUT):
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, LOCK_FILENAME)
+        self.operation = operation
+        self.timeout = timeout
+        self._file = None
+
+    @staticmethod
+    def _try_lock(f):
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def _holder(f):
+        """Кем занята директория (операция и pid, записанные владельцем блокировки)"""
+        try:
+            f.seek(0)
+            return f.read().strip()
+        except OSError:
+            return ""
+
+    def acquire(self):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        f = open(self.path, "a+", encoding="utf-8")
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock(f):
+            if time.monotonic() >= deadline:
+                holder = self._holder(f)
+                f.close()
+                raise RepositoryLocked(f"Резервная директория занята другой операцией"
+                                       f"{f' ({holder})' if holder else ''}: {self.backup_dir}")
+            time.sleep(POLL_INTERVAL)
+        f.truncate(0)
+        f.write(f"{self.operation} pid {os.getpid()}".strip())
+        f.flush()
+        self._file = f
+        return self
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+        return False
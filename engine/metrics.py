@@ -0,0 +1,273 @@
+# metrics.py
+import io
+import os
+import json
+import time
+import bisect
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Границы корзин гистограмм времени, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+EXPORT_INTERVAL = 30  # Период записи снимка метрик во время длинных операций, секунд
+PROFILE_TOP = 40      # Строк в текстовых отчетах профилировщика
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (как в Prometheus): количество, сумма, корзины"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Последняя корзина - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """[(граница, наблюдений не больше нее)], последняя граница - "+Inf\""""
+        result, total = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+    Метрики операции по фазам (обход, хеширование, вывод ключей, шифрование, запись):
+    гистограмма времени и счетчик байт на фазу, плюс произвольные счетчики.
+    Потокобезопасно: фазы наблюдаются из потоков конвейера
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, labels=None):
+        self.buckets = buckets
+        self.labels = dict(labels or {})
+        self.started = time.time()
+        self._phases = {}    # фаза -> Histogram
+        self._bytes = {}     # фаза -> байт
+        self._counters = {}  # имя -> значение
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds, size=0):
+        with self._lock:
+            histogram = self._phases.get(phase)
+            if histogram is None:
+                histogram = self._phases[phase] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if size:
+                self._bytes[phase] = self._bytes.get(phase, 0) + size
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, phase, size=0):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - started, size)
+
+    def timed(self, iterable, phase):
+        """Итератор, время получения каждого элемента которого наблюдается как phase (например, os.walk)"""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(phase, time.perf_counter() - started)
+            yield item
+
+    def snapshot(self):
+        """Состояние метрик словарем (для JSON)"""
+        with self._lock:
+            phases = {
+                phase: {
+                    "count": histogram.count,
+                    "seconds": round(histogram.sum, 6),
+                    "bytes": self._bytes.get(phase, 0),
+                    "buckets": {str(bound): count for bound, count in histogram.cumulative()},
+                }
+                for phase, histogram in self._phases.items()
+            }
+            counters = dict(self._counters)
+        return {
+            "time": round(time.time(), 3),
+            "elapsed": round(time.time() - self.started, 3),
+            "labels": self.labels,
+            "phases": phases,
+            "counters": counters,
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self, prefix="backup_engine"):
+        """Снимок в текстовом формате Prometheus (для node_exporter textfile collector)"""
+        snapshot = self.snapshot()
+
+        def labels(**extra):
+            pairs = dict(self.labels, **extra)
+            if not pairs:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                       for value in pairs.values())
+            return "{" + ",".join(f'{key}="{value}"' for key, value in zip(pairs, escaped)) + "}"
+
+        lines = [f"# HELP {prefix}_phase_seconds Время фаз операции",
+                 f"# TYPE {prefix}_phase_seconds histogram"]
+        for phase, data in snapshot["phases"].items():
+            for bound, count in data["buckets"].items():
+                lines.append(f"{prefix}_phase_seconds_bucket{labels(phase=phase, le=bound)} {count}")
+            lines.append(f"{prefix}_phase_seconds_sum{labels(phase=phase)} {data['seconds']}")
+            lines.append(f"{prefix}_phase_seconds_count{labels(phase=phase)} {data['count']}")
+        lines += [f"# HELP {prefix}_phase_bytes_total Обработано байт по фазам",
+                  f"# TYPE {prefix}_phase_bytes_total counter"]
+        for phase, data in snapshot["phases"].items():
+            lines.append(f"{prefix}_phase_bytes_total{labels(phase=phase)} {data['bytes']}")
+        for name, value in snapshot["counters"].items():
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total{labels()} {value}")
+        lines.append(f"# TYPE {prefix}_elapsed_seconds gauge")
+        lines.append(f"{prefix}_elapsed_seconds{labels()} {snapshot['elapsed']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path, fmt=None):
+        """Записывает снимок в path атомарно; fmt - "json" или "prometheus" (по умолчанию - по расширению .prom)"""
+        fmt = fmt or ("prometheus" if path.endswith(".prom") else "json")
+        payload = self.to_prometheus() if fmt == "prometheus" else self.to_json() + "\n"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.part"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """Записывает снимок метрик в файл каждые interval секунд и при остановке"""
+
+    def __init__(self, metrics, path, fmt=None, interval=EXPORT_INTERVAL):
+        self.metrics = metrics
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.metrics.write(self.path, self.fmt)
+            except OSError:
+                pass  # Промежуточный снимок не обязателен, итоговый запишется в stop()
+
+    def start(self):
+        if self.interval:
+            self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.metrics.write(self.path, self.fmt)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+
+class Profiler:
+    """
+    Режим профилирования операции: cProfile во всех потоках (mode "cpu"),
+    tracemalloc (mode "memory") или оба ("all"). Отчеты пишутся в output_dir при остановке:
+    cpu.prof (для pstats/snakeviz), cpu.txt и memory.txt
+    """
+
+    def __init__(self, output_dir, mode="all"):
+        if mode not in ("cpu", "memory", "all"):
+            raise ValueError(f"Неизвестный режим профилирования: {mode}")
+        self.output_dir = output_dir
+        self.cpu = mode in ("cpu", "all")
+        self.memory = mode in ("memory", "all")
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _thread_hook(self, frame, event, arg):
+        # Вызывается при первом событии нового потока: заводим ему собственный профилировщик
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(25)
+        if self.cpu:
+            threading.setprofile(self._thread_hook)
+            profile = cProfile.Profile()
+            self._profiles.append(profile)
+            profile.enable()
+        return self
+
+    def stop(self):
+        """Останавливает профилирование и записывает отчеты; возвращает пути отчетов"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+        if self.cpu:
+            threading.setprofile(None)
+            self._profiles[0].disable()
+            with self._lock:
+                profiles, self._profiles = self._profiles, []
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                try:
+                    stats.add(profile)
+                except TypeError:
+                    continue  # Поток не успел выполнить ни одного вызова
+            path = os.path.join(self.output_dir, "cpu.prof")
+            stats.dump_stats(path)
+            written.append(path)
+
+            text = io.StringIO()
+            stats.stream = text
+            stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+            written.append(self._write_text("cpu.txt", text.getvalue()))
+
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            lines = [f"Текущая память: {current / 1024 / 1024:.1f} МБ, пик: {peak / 1024 / 1024:.1f} МБ", ""]
+            lines += [str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+            written.append(self._write_text("memory.txt", "\n".join(lines) + "\n"))
+        return written
+
+    def _write_text(self, name, text):
+        path = os.path.join(self.output_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
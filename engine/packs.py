@@ -0,0 +1,286 @@
+# packs.py
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+
+PACKS_DIRNAME = "packs"
+PACK_INDEX_FILENAME = "packs.sqlite"
+PACK_SUFFIX = ".pack"
+PACK_MAGIC = b"BKPK\x01"
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024  # Размер, после которого начинается новый файл-сегмент
+DEFAULT_BATCH_SIZE = 8 * 1024 * 1024     # Объем буфера, который пишется на диск одной операцией
+DEFAULT_COMPACT_RATIO = 0.3              # Доля удаленных данных, при которой сегмент переписывается
+
+# Заголовок блоба в сегменте: идентификатор блока и длина зашифрованных данных.
+# Позволяет восстановить индекс просмотром сегментов
+_BLOB_HEADER = struct.Struct(">32sI")
+
+
+class PackIndex:
+    """
+    Индекс сегментов хранилища блоков (SQLite): для каждого блока - сегмент, смещение и длина.
+    Для сегментов учитывается объем живых данных, чтобы после удаления блоков
+    переписывать только сегменты с большой долей мусора
+    """
+
+    def __init__(self, store_root):
+        self.packs_dir = os.path.join(store_root, PACKS_DIRNAME)
+        self.path = os.path.join(store_root, PACK_INDEX_FILENAME)
+        os.makedirs(self.packs_dir, exist_ok=True)
+        rebuild = not os.path.exists(self.path)
+        self._lock = threading.Lock()
+
+        # Индекс читают потоки расшифровки и шифрования, соединение общее под блокировкой
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                chunk BLOB PRIMARY KEY,
+                pack TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS blobs_pack ON blobs (pack, offset);
+            CREATE TABLE IF NOT EXISTS packs (
+                name TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                live INTEGER NOT NULL
+            );
+        """)
+        self.conn.commit()
+        if rebuild:
+            self.rebuild()
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def pack_path(self, pack):
+        return os.path.join(self.packs_dir, pack + PACK_SUFFIX)
+
+    def lookup(self, chunk):
+        """(сегмент, смещение, длина) блока или None"""
+        with self._lock:
+            return self.conn.execute("SELECT pack, offset, length FROM blobs WHERE chunk = ?",
+                                     (chunk,)).fetchone()
+
+    def add(self, pack, pack_size, blobs):
+        """Регистрирует записанные в сегмент блобы [(блок, смещение, длина)]"""
+        with self._lock:
+            added = 0
+            for chunk, offset, length in blobs:
+                cursor = self.conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)",
+                                           (chunk, pack, offset, length))
+                added += length if cursor.rowcount else 0
+            self.conn.execute(
+                "INSERT INTO packs VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET size = excluded.size, live = live + excluded.live",
+                (pack, pack_size, added)
+            )
+            self.conn.commit()
+
+    def remove(self, chunks):
+        """Исключает блоки из индекса; данные остаются в сегментах до сжатия. Возвращает освобожденный объем"""
+        freed = 0
+        with self._lock:
+            for chunk in chunks:
+                row = self.conn.execute("SELECT pack, length FROM blobs WHERE chunk = ?", (chunk,)).fetchone()
+                if row is None:
+                    continue
+                self.conn.execute("DELETE FROM blobs WHERE chunk = ?", (chunk,))
+                self.conn.execute("UPDATE packs SET live = live - ? WHERE name = ?", (row[1], row[0]))
+                freed += row[1]
+            self.conn.commit()
+        return freed
+
+    def compact(self, ratio=DEFAULT_COMPACT_RATIO):
+        """
+        Переписывает сегменты, в которых удаленные данные занимают не меньше ratio:
+        живые блобы копируются в новый сегмент без расшифровки, затем старый сегмент удаляется.
+        Возвращает освобожденное место на диске
+        """
+        with self._lock:
+            candidates = [(name, size) for name, size, live in
+                          self.conn.execute("SELECT name, size, live FROM packs").fetchall()
+                          if size and (size - live) >= size * ratio]
+        reclaimed = 0
+        for pack, size in candidates:
+            with self._lock:
+                rows = self.conn.execute("SELECT chunk, offset, length FROM blobs WHERE pack = ? ORDER BY offset",
+                                         (pack,)).fetchall()
+            moved = []
+            if rows:
+                writer = PackWriter(self, segment_size=float("inf"))
+                with open(self.pack_path(pack), "rb") as source:
+                    for chunk, offset, length in rows:
+                        source.seek(offset)
+                        writer.append(chunk, source.read(length))
+                moved = writer.close()
+            with self._lock:
+                # Новый сегмент уже на диске и в индексе (INSERT OR IGNORE не заменил старые строки) -
+                # переносим строки и удаляем старый сегмент
+                lengths = {chunk: length for chunk, _, length in rows}
+                for new_pack, chunk, offset in moved:
+                    self.conn.execute("UPDATE blobs SET pack = ?, offset = ? WHERE chunk = ?",
+                                      (new_pack, offset, chunk))
+                    self.conn.execute("UPDATE packs SET live = live + ? WHERE name = ?",
+                                      (lengths[chunk], new_pack))
+                self.conn.execute("DELETE FROM packs WHERE name = ?", (pack,))
+                self.conn.commit()
+            os.remove(self.pack_path(pack))
+            reclaimed += size - sum(length for _, _, length in rows)
+        return reclaimed
+
+    def rebuild(self):
+        """Восстанавливает индекс просмотром заголовков блобов во всех сегментах"""
+        for file in sorted(os.listdir(self.packs_dir)):
+            if not file.endswith(PACK_SUFFIX):
+                continue
+            pack = file[:-len(PACK_SUFFIX)]
+            blobs = []
+            with open(os.path.join(self.packs_dir, file), "rb") as f:
+                if f.read(len(PACK_MAGIC)) != PACK_MAGIC:
+                    continue
+                offset = len(PACK_MAGIC)
+                while True:
+                    header = f.read(_BLOB_HEADER.size)
+                    if len(header) < _BLOB_HEADER.size:
+                        break  # Конец сегмента или недописанный при сбое блоб
+                    chunk, length = _BLOB_HEADER.unpack(header)
+                    offset += _BLOB_HEADER.size
+                    if len(f.read(length)) < length:
+                        break
+                    blobs.append((chunk, offset, length))
+                    offset += length
+            self.add(pack, offset, blobs)
+
+
+class PackWriter:
+    """
+    Запись блобов в сегменты: блобы копятся в буфере и уходят на диск одной записью
+    по batch_size байт, после fsync сегмента регистрируются в индексе.
+    Каждый писатель пишет в собственные сегменты, поэтому одновременные копии не мешают друг другу.
+    Блобы из буфера доступны через pending() до записи.
+    С metrics (engine.metrics.Metrics) каждая запись пачки наблюдается как фаза "write"
+    """
+
+    def __init__(self, index, segment_size=DEFAULT_SEGMENT_SIZE, batch_size=DEFAULT_BATCH_SIZE, metrics=None):
+        self.index = index
+        self.metrics = metrics
+        self.segment_size = segment_size
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered = 0
+        self._pending = {}  # блок -> данные, еще не записанные в сегмент
+        self._file = None
+        self._pack = None
+        self._size = 0
+        self._written = []  # (сегмент, блок, смещение) - для сжатия
+
+    def pending(self, chunk):
+        with self._lock:
+            return self._pending.get(chunk)
+
+    def append(self, chunk, blob):
+        with self._lock:
+            if chunk in self._pending:
+                return
+            self._pending[chunk] = blob
+            self._buffer.append((chunk, blob))
+            self._buffered += _BLOB_HEADER.size + len(blob)
+            if self._buffered >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        """Записывает буфер на диск и в индекс"""
+        with self._lock:
+            self._flush()
+
+    def _open_segment(self):
+        self._pack = uuid.uuid4().hex
+        self._file = open(self.index.pack_path(self._pack), "wb")
+        self._file.write(PACK_MAGIC)
+        self._size = len(PACK_MAGIC)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        started = time.perf_counter()
+        if self._file is None:
+            self._open_segment()
+
+        parts, blobs = [], []
+        offset = self._size
+        for chunk, blob in self._buffer:
+            parts.append(_BLOB_HEADER.pack(chunk, len(blob)))
+            parts.append(blob)
+            blobs.append((chunk, offset + _BLOB_HEADER.size, len(blob)))
+            offset += _BLOB_HEADER.size + len(blob)
+        self._file.writelines(parts)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        if self.metrics is not None:
+            self.metrics.observe("write", time.perf_counter() - started, offset - self._size)
+        self._size = offset
+
+        # Индекс обновляется только после того, как данные на диске
+        self.index.add(self._pack, self._size, blobs)
+        self._written.extend((self._pack, chunk, blob_offset) for chunk, blob_offset, _ in blobs)
+        self._buffer = []
+        self._buffered = 0
+        self._pending.clear()
+
+        if self._size >= self.segment_size:
+            self._file.close()
+            self._file = None
+
+    def close(self):
+        """Дописывает буфер и закрывает сегмент; возвращает [(сегмент, блок, смещение)] записанных блобов"""
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return self._written
+
+
+class PackReader:
+    """Чтение блобов по смещению из индекса; файлы сегментов остаются открытыми между чтениями"""
+
+    def __init__(self, index):
+        self.index = index
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def read(self, pack, offset, length):
+        with self._lock:
+            f = self._files.get(pack)
+            if f is None:
+                f = self._files[pack] = open(self.index.pack_path(pack), "rb")
+            if hasattr(os, "pread"):
+                fd = f.fileno()
+            else:
+                f.seek(offset)
+                return f.read(length)
+        # pread не меняет позицию файла, поэтому потоки читают параллельно
+        return os.pread(fd, length, offset)
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files.clear()
@@ -0,0 +1,300 @@
+# pipeline.py
+import os
+import queue
+import threading
+import time
+
+from crypto.crypto_utils import encrypt_file
+from crypto.compression import AUTO
+from .hashing import DEFAULT_ALGORITHM, new_hasher
+
+_DONE = object()  # Маркер окончания работы стадии
+
+
+def progress_snapshot(files, size, started, total=None, found=None):
+    """Событие хода работы: обработано файлов и байт, скорость с момента started"""
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+    return {
+        "files": files,
+        "total": total,
+        "found": found if found is not None else total,
+        "bytes": size,
+        "elapsed": round(elapsed, 2),
+        "files_per_sec": round(files / elapsed, 1) if elapsed else 0.0,
+        "mb_per_sec": round(size / elapsed / (1024 * 1024), 2) if elapsed else 0.0,
+    }
+
+
+class StageStats:
+    """Счетчики одной стадии конвейера: файлы, байты, время работы; с metrics - и гистограмма фазы"""
+
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics
+        self.files = 0
+        self.bytes = 0
+        self.busy_time = 0.0
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter()
+
+    def finish(self):
+        with self._lock:
+            self.finished = time.perf_counter()
+
+    def add(self, size, elapsed):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.busy_time += elapsed
+        if self.metrics is not None:
+            self.metrics.observe(self.name, elapsed, size)
+
+    def as_dict(self):
+        """Сводка по стадии: пропускная способность считается по времени работы стадии"""
+        wall = 0.0
+        if self.started is not None:
+            wall = (self.finished or time.perf_counter()) - self.started
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "wall_seconds": round(wall, 3),
+            "busy_seconds": round(self.busy_time, 3),
+            "files_per_sec": round(self.files / wall, 1) if wall else 0.0,
+            "mb_per_sec": round(self.bytes / wall / (1024 * 1024), 2) if wall else 0.0,
+        }
+
+
+class BackupPipeline:
+    """
+    Конвейер резервного копирования директории:
+    обход -> хеширование -> шифрование (пул потоков) -> фиксация результатов.
+    Стадии связаны ограниченными очередями, поэтому память не растет с размером дерева.
+    Фиксация результатов (колбэки) выполняется в вызывающем потоке.
+    С хранилищем блоков (store) файлы сохраняются блоками, иначе - файлами .enc;
+    on_backed_up получает место хранения: {"chunks": [...]} или {"location": путь .enc}.
+    Неизмененные файлы передаются в on_unchanged, если он задан.
+    Если detect_changes не вернул хеш (файл изменен заведомо), хеш алгоритмом algorithm
+    считается при шифровании - файл читается один раз.
+    Перед шифрованием файлы .enc сжимаются кодеком, выбранным по compression.
+    С version_tag файлы .enc получают имена <имя>.<version_tag>.enc и не перезаписывают прежние версии.
+    Ход работы передается в on_progress не чаще раза в progress_interval секунд.
+    С metrics (engine.metrics.Metrics) время стадий копится в гистограммах фаз;
+    обход наблюдается по каталогам (время чтения каталога), а не по файлам.
+    """
+
+    def __init__(self, session, workers=None, hash_workers=2, queue_size=None,
+                 detect_changes=None, on_backed_up=None, on_error=None, store=None, compression=AUTO,
+                 on_progress=None, progress_interval=0.25, on_unchanged=None, version_tag=None,
+                 algorithm=DEFAULT_ALGORITHM, metrics=None):
+        self.session = session
+        self.metrics = metrics
+        self.suffix = f".{version_tag}.enc" if version_tag else ".enc"
+        self.store = store
+        self.compression = compression
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.hash_workers = max(1, hash_workers)
+        self.queue_size = queue_size or self.workers * 4
+        # detect_changes(path, stat_result) -> (изменен ли файл, хеш или None); по умолчанию - всегда изменен
+        self.detect_changes = detect_changes or (lambda path, stat_result: (True, None))
+        self.algorithm = algorithm
+        self.on_backed_up = on_backed_up or (lambda path, file_hash, stat_result, stored: None)
+        self.on_unchanged = on_unchanged
+        self.on_error = on_error or (lambda path, error: None)
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+
+        self.stats = {name: StageStats(name, metrics if name != "walk" else None)
+                      for name in ("walk", "hash", "encrypt", "commit")}
+        self._stop = threading.Event()
+
+    def run(self, source_dir, backup_dir):
+        """Запускает конвейер и возвращает количество сохраненных файлов"""
+        walk_queue = queue.Queue(self.queue_size)
+        encrypt_queue = queue.Queue(self.queue_size)
+        result_queue = queue.Queue(self.queue_size)
+
+        hash_left = [self.hash_workers]
+        encrypt_left = [self.workers]
+        lock = threading.Lock()
+
+        def walk():
+            stats = self.stats["walk"]
+            stats.start()
+            walker = os.walk(source_dir)
+            if self.metrics is not None:
+                walker = self.metrics.timed(walker, "walk")
+            try:
+                for root, dirs, files in walker:
+                    rel_path = os.path.relpath(root, source_dir)
+                    backup_subdir = os.path.join(backup_dir, rel_path)
+                    for file in files:
+                        if self._stop.is_set():
+                            return
+                        started = time.perf_counter()
+                        source_file = os.path.join(root, file)
+                        encrypted_file = os.path.join(backup_subdir, file + self.suffix)
+                        stats.add(0, time.perf_counter() - started)
+                        self._put(walk_queue, (source_file, encrypted_file))
+            finally:
+                stats.finish()
+                for _ in range(self.hash_workers):
+                    self._put(walk_queue, _DONE)
+
+        def hash_stage():
+            stats = self.stats["hash"]
+            stats.start()
+            try:
+                while True:
+                    item = self._get(walk_queue)
+                    if item is _DONE:
+                        break
+                    source_file, encrypted_file = item
+                    started = time.perf_counter()
+                    try:
+                        stat_result = os.stat(source_file)
+                        changed, file_hash = self.detect_changes(source_file, stat_result)
+                    except Exception as e:
+                        # Файл с ошибкой тоже считается проверенным, иначе ход работы не дойдет до конца
+                        stats.add(0, time.perf_counter() - started)
+                        self._put(result_queue, ("error", source_file, e))
+                        continue
+                    stats.add(stat_result.st_size, time.perf_counter() - started)
+
+                    if changed:
+                        self._put(encrypt_queue, (source_file, encrypted_file, file_hash, stat_result))
+                    elif self.on_unchanged is not None:
+                        self._put(result_queue, ("same", source_file, (file_hash, stat_result)))
+            finally:
+                with lock:
+                    hash_left[0] -= 1
+                    last = hash_left[0] == 0
+                if last:
+                    stats.finish()
+                    for _ in range(self.workers):
+                        self._put(encrypt_queue, _DONE)
+
+        def encrypt_stage():
+            stats = self.stats["encrypt"]
+            stats.start()
+            try:
+                while True:
+                    item = self._get(encrypt_queue)
+                    if item is _DONE:
+                        break
+                    source_file, encrypted_file, file_hash, stat_result = item
+                    started = time.perf_counter()
+                    hasher = new_hasher(self.algorithm) if file_hash is None else None
+                    try:
+                        if self.store is not None:
+                            stored = {"chunks": self.store.store_file(source_file, hasher=hasher)["chunks"]}
+                        else:
+                            encrypt_file(source_file, encrypted_file, session=self.session,
+                                         compression=self.compression, hasher=hasher)
+                            stored = {"location": encrypted_file}
+                        if hasher is not None:
+                            file_hash = hasher.hexdigest()
+                    except Exception as e:
+                        self._put(result_queue, ("error", source_file, e))
+                        continue
+                    stats.add(stat_result.st_size, time.perf_counter() - started)
+                    self._put(result_queue, ("ok", source_file, (file_hash, stat_result, stored)))
+            finally:
+                with lock:
+                    encrypt_left[0] -= 1
+                    last = encrypt_left[0] == 0
+                if last:
+                    stats.finish()
+                    self._put(result_queue, _DONE)
+
+        threads = [threading.Thread(target=walk, daemon=True)]
+        threads += [threading.Thread(target=hash_stage, daemon=True) for _ in range(self.hash_workers)]
+        threads += [threading.Thread(target=encrypt_stage, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        backed_up_count = 0
+        commit_stats = self.stats["commit"]
+        commit_stats.start()
+        last_progress = [0.0]
+
+        def tick():
+            now = time.perf_counter()
+            if self.on_progress is not None and now - last_progress[0] >= self.progress_interval:
+                last_progress[0] = now
+                self.on_progress(self.progress())
+
+        try:
+            while True:
+                item = self._get(result_queue, tick)
+                if item is _DONE:
+                    break
+                status, source_file, payload = item
+                started = time.perf_counter()
+                if status == "ok":
+                    self.on_backed_up(source_file, *payload)
+                    backed_up_count += 1
+                elif status == "same":
+                    self.on_unchanged(source_file, *payload)
+                else:
+                    self.on_error(source_file, payload)
+                commit_stats.add(0, time.perf_counter() - started)
+                tick()
+        finally:
+            # Если фиксация прервана исключением, стадии завершаются по флагу остановки
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            commit_stats.finish()
+
+        if self.on_progress is not None:
+            self.on_progress(self.progress())
+        return backed_up_count
+
+    def stop(self):
+        """Останавливает конвейер на границе файла"""
+        self._stop.set()
+
+    def _put(self, q, item):
+        """Кладет элемент в ограниченную очередь, пока конвейер не остановлен"""
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _get(self, q, on_idle=None):
+        """Берет элемент из очереди; при остановке конвейера возвращает маркер окончания"""
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+                if on_idle is not None:
+                    on_idle()
+
+    def progress(self):
+        """
+        Ход работы: проверено файлов из найденных обходом (total известен после окончания обхода),
+        байты - объем зашифрованных данных
+        """
+        walk, checked, encrypt = self.stats["walk"], self.stats["hash"], self.stats["encrypt"]
+        return progress_snapshot(checked.files, encrypt.bytes, checked.started,
+                                 total=walk.files if walk.finished is not None else None,
+                                 found=walk.files)
+
+    def report(self):
+        """Пропускная способность по стадиям"""
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
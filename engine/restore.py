@@ -0,0 +1,301 @@
+# restore.py
+import os
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crypto.crypto_utils import decrypt_file
+from .chunk_store import ChunkStore, MANIFEST_SUFFIX, find_store_root
+from .pipeline import progress_snapshot
+
+JOURNAL_FILENAME = ".restore_journal"
+JOURNAL_VERSION = 1
+
+_DONE = object()  # Маркер окончания очереди записи
+
+
+class RestoreJournal:
+    """
+    Журнал восстановления в папке назначения: по строке JSON на каждый полностью
+    записанный файл. Прерванное восстановление той же копии пропускает файлы из журнала.
+    После восстановления без ошибок журнал удаляется.
+    """
+
+    def __init__(self, restore_path, backup_path, snapshot=None, sync_every=100):
+        self.path = os.path.join(restore_path, JOURNAL_FILENAME)
+        self.backup_path = os.path.abspath(backup_path)
+        self.snapshot = snapshot
+        self.sync_every = sync_every
+        self.done = {}
+        self._pending = 0
+        self._load()
+
+        os.makedirs(restore_path, exist_ok=True)
+        fresh = not self.done
+        self._file = open(self.path, "w" if fresh else "a", encoding="utf-8")
+        if fresh:
+            self._write({"version": JOURNAL_VERSION, "backup": self.backup_path, "snapshot": self.snapshot})
+
+    def _load(self):
+        """Читает журнал; журнал другой копии или снимка, поврежденный заголовок начинают восстановление заново"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        try:
+            header = json.loads(lines[0])
+        except (IndexError, ValueError):
+            return
+        if header.get("backup") != self.backup_path or header.get("snapshot") != self.snapshot:
+            return
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # Недописанная строка при аварийном завершении
+            self.done[entry["path"]] = entry["size"]
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def is_done(self, rel_name, restored_file):
+        """Файл уже восстановлен прошлым запуском и не изменен с тех пор"""
+        size = self.done.get(rel_name)
+        return size is not None and os.path.isfile(restored_file) and os.path.getsize(restored_file) == size
+
+    def mark_done(self, rel_name, size):
+        self.done[rel_name] = size
+        self._write({"path": rel_name, "size": size})
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self, completed=False):
+        """Закрывает журнал; при completed=True удаляет его"""
+        if self._file.closed:
+            return
+        self._file.close()
+        if completed:
+            os.remove(self.path)
+
+
+class RestoreEngine:
+    """
+    Параллельное восстановление: блоки манифестов и файлы .enc расшифровываются в пуле потоков,
+    а результаты в порядке постановки проходят через ограниченную очередь к записи
+    в вызывающем потоке. Очередь ограничивает число расшифрованных блоков в памяти.
+    Файлы собираются во временных .part и переименовываются целиком, поэтому
+    журнал восстановления фиксирует только полностью записанные файлы.
+    С metrics (engine.metrics.Metrics) время каждого файла на стороне записи
+    (от завершения предыдущего) наблюдается как фаза "restore"
+    """
+
+    def __init__(self, session, workers=None, queue_size=None, journal=None,
+                 on_restored=None, on_error=None, on_progress=None, progress_interval=0.25, metrics=None):
+        self.session = session
+        self.metrics = metrics
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.queue_size = queue_size or self.workers * 4
+        self.journal = journal
+        self.on_restored = on_restored or (lambda rel_name, restored_file, size: None)
+        self.on_error = on_error or (lambda rel_name, restored_file, error: None)
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+
+        self.stores = {}
+        self.skipped = 0
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Новые файлы не начинаются, уже поставленные в очередь дописываются"""
+        self._stop.set()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _store_at(self, store_root):
+        if store_root not in self.stores:
+            self.stores[store_root] = ChunkStore(store_root, self.session)
+        return self.stores[store_root]
+
+    def _resolve(self, entry, backup_root):
+        """
+        Откуда читать файл: (None, путь .enc) или (хранилище, блоки).
+        Блоки берутся из каталога, для копий прежнего формата - из манифеста
+        """
+        if entry.chunks is not None:
+            return self._store_at(backup_root), entry.chunks
+        backup_file = os.path.join(backup_root, entry.location)
+        if not backup_file.endswith(MANIFEST_SUFFIX):
+            return None, backup_file
+        store_root = find_store_root(backup_file)
+        if store_root is None:
+            raise FileNotFoundError(f"Хранилище блоков не найдено для {backup_file}")
+        store = self._store_at(store_root)
+        return store, store.read_manifest(backup_file)["chunks"]
+
+    def run(self, entries, backup_root, restore_path):
+        """
+        Восстанавливает записи каталога (engine.catalog.CatalogEntry) в restore_path,
+        location записей задан относительно backup_root. Возвращает (восстановлено, ошибок)
+        """
+        tasks = []
+        for entry in entries:
+            restored_file = os.path.join(restore_path, entry.path)
+            if self.journal is not None and self.journal.is_done(entry.path, restored_file):
+                self.skipped += 1
+                continue
+            tasks.append((entry, entry.path, restored_file))
+
+        write_queue = queue.Queue(self.queue_size)
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        aborted = threading.Event()  # Запись прервана исключением
+
+        def halted():
+            return self._stop.is_set() or aborted.is_set()
+
+        def put(item):
+            while not halted():
+                try:
+                    write_queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            # Очередь заполняется в порядке файлов и блоков; put блокируется, пока запись отстает
+            try:
+                for task in tasks:
+                    if halted():
+                        break
+                    entry, rel_name, restored_file = task
+                    try:
+                        store, source = self._resolve(entry, backup_root)
+                    except Exception as e:
+                        put(("error", task, e))
+                        continue
+                    if store is None:
+                        put(("file", task, pool.submit(decrypt_file, source, restored_file,
+                                                        session=self.session)))
+                        continue
+                    # Блоки файла ставятся целиком, даже если во время постановки пришла остановка
+                    if not put(("begin", task, None)):
+                        break
+                    for chunk_id, chunk_size in source:
+                        write_queue.put(("chunk", task, pool.submit(store.get_chunk, chunk_id), chunk_size))
+                    write_queue.put(("end", task, None))
+            finally:
+                write_queue.put(_DONE)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        restored = failed = 0
+        started = time.perf_counter()
+        restored_bytes = 0
+        last_done = started
+        last_progress = 0.0
+        out = None
+        error = None
+
+        try:
+            while True:
+                item = write_queue.get()
+                if item is _DONE:
+                    break
+                kind, task = item[0], item[1]
+                entry, rel_name, restored_file = task
+
+                if kind == "begin":
+                    error = None
+                    try:
+                        os.makedirs(os.path.dirname(restored_file), exist_ok=True)
+                        out = open(restored_file + ".part", "wb")
+                    except Exception as e:
+                        error = e
+                    continue
+
+                if kind == "chunk":
+                    if error is not None:
+                        item[2].cancel()
+                        continue
+                    try:
+                        data = item[2].result()
+                        if len(data) != item[3]:
+                            raise ValueError(f"Блок поврежден: размер {len(data)} вместо {item[3]}")
+                        out.write(data)
+                    except Exception as e:
+                        error = e
+                    continue
+
+                # Файл закончен: "end" для манифеста, "file" для .enc, "error" - манифест не прочитан
+                size = 0
+                if kind == "end":
+                    if out is not None:
+                        if error is None and entry.size is not None and out.tell() != entry.size:
+                            error = ValueError(f"Размер файла {out.tell()} не совпадает с каталогом ({entry.size})")
+                        out.close()
+                        out = None
+                    if error is None:
+                        os.replace(restored_file + ".part", restored_file)
+                        size = os.path.getsize(restored_file)
+                    elif os.path.exists(restored_file + ".part"):
+                        os.remove(restored_file + ".part")
+                elif kind == "file":
+                    try:
+                        item[2].result()
+                        size = os.path.getsize(restored_file)
+                    except Exception as e:
+                        error = e
+                else:
+                    error = item[2]
+
+                if self.metrics is not None:
+                    now = time.perf_counter()
+                    self.metrics.observe("restore", now - last_done, size)
+                    last_done = now
+                if error is None:
+                    restored += 1
+                    restored_bytes += size
+                    if self.journal is not None:
+                        self.journal.mark_done(rel_name, size)
+                    self.on_restored(rel_name, restored_file, size)
+                else:
+                    failed += 1
+                    self.on_error(rel_name, restored_file, error)
+                error = None
+
+                now = time.perf_counter()
+                if self.on_progress is not None and now - last_progress >= self.progress_interval:
+                    last_progress = now
+                    self.on_progress(progress_snapshot(restored + failed, restored_bytes, started,
+                                                       total=len(tasks)))
+        except BaseException:
+            aborted.set()
+            raise
+        finally:
+            # При исключении в записи производитель завершается по флагу, очередь разбирается до его выхода
+            while producer.is_alive():
+                try:
+                    write_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            producer.join()
+            if out is not None:
+                out.close()
+                if os.path.exists(out.name):
+                    os.remove(out.name)
+            pool.shutdown(wait=True, cancel_futures=True)
+            for store in self.stores.values():
+                store.close()
+            self.stores.clear()
+
+        if self.on_progress is not None:
+            self.on_progress(progress_snapshot(restored + failed, restored_bytes, started, total=len(tasks)))
+        return restored, failed
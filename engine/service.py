@@ -0,0 +1,581 @@
+# service.py
+import os
+import fnmatch
+import threading
+import time
+
+from graph.logger import get_logger
+from crypto.crypto_utils import encrypt_file, verify_file
+from crypto.key_session import KeySession
+from crypto.compression import AUTO
+from .hashing import DEFAULT_ALGORITHM, new_hasher
+from .hash_index import HashIndex, ChangeDetector
+from .pipeline import BackupPipeline, progress_snapshot
+from .restore import RestoreEngine, RestoreJournal
+from .catalog import (CatalogEntry, CATALOG_DIRNAME, find_catalog_root, list_catalogs, load_catalog,
+                      load_latest_catalog)
+from .chunk_store import ChunkStore, MANIFEST_SUFFIX, STORE_DIRNAME, find_store_root
+from .snapshots import SnapshotBuilder, SnapshotIndex, select_retained, snapshot_time
+from .locking import RepositoryLock
+
+
+def original_filename(file):
+    """Имя исходного файла для .enc или манифеста блоков, иначе None"""
+    if file.endswith('.enc'):
+        return file[:-len('.enc')]
+    if file.endswith(MANIFEST_SUFFIX):
+        return file[:-len(MANIFEST_SUFFIX)]
+    return None
+
+
+def _pattern_base(pattern):
+    """Часть шаблона до первого компонента с подстановочными символами"""
+    parts = []
+    for part in pattern.split("/"):
+        if any(char in part for char in "*?["):
+            break
+        parts.append(part)
+    return "/".join(parts)
+
+
+def matches_patterns(rel_name, patterns):
+    """
+    Совпадает ли относительный путь исходного файла с одним из шаблонов.
+    Шаблон сравнивается с путем целиком (fnmatch, разделитель "/"), шаблон-папка выбирает все ее содержимое
+    """
+    rel_name = rel_name.replace(os.sep, "/")
+    for pattern in patterns:
+        pattern = pattern.strip("/")
+        if fnmatch.fnmatchcase(rel_name, pattern) or fnmatch.fnmatchcase(rel_name, pattern + "/*"):
+            return True
+    return False
+
+
+def iter_backup_files(backup_path, patterns=None):
+    """
+    Обходит резервную копию и выдает (путь в копии, относительный путь исходного файла).
+    Служебные данные хранилища блоков пропускаются.
+    С шаблонами patterns обходятся только папки копии, с которых начинаются шаблоны,
+    поэтому выборочное восстановление не просматривает остальную копию.
+    """
+    if os.path.isfile(backup_path):
+        name = original_filename(os.path.basename(backup_path))
+        if name and (not patterns or matches_patterns(name, patterns)):
+            yield backup_path, name
+        return
+
+    roots = [backup_path]
+    if patterns:
+        bases = sorted({_pattern_base(pattern.strip("/")) for pattern in patterns})
+        # Вложенные базовые папки обходятся один раз - в составе внешней
+        roots = [os.path.join(backup_path, base) for i, base in enumerate(bases)
+                 if not any(base == outer or base.startswith(outer + "/") for outer in bases[:i] if outer)]
+        if "" in bases:
+            roots = [backup_path]
+
+    for start in roots:
+        # Шаблон без подстановок может указывать на отдельный файл
+        for suffix in ('.enc', MANIFEST_SUFFIX):
+            if start != backup_path and os.path.isfile(start + suffix):
+                yield start + suffix, os.path.normpath(os.path.relpath(start, backup_path))
+        for root, dirs, files in os.walk(start):
+            for service_dir in (STORE_DIRNAME, CATALOG_DIRNAME):
+                if service_dir in dirs:
+                    dirs.remove(service_dir)
+            rel_path = os.path.relpath(root, backup_path)
+            for file in files:
+                name = original_filename(file)
+                if not name:
+                    continue
+                rel_name = os.path.normpath(os.path.join(rel_path, name))
+                if not patterns or matches_patterns(rel_name, patterns):
+                    yield os.path.join(root, file), rel_name
+
+
+class BackupService:
+    """
+    Резервное копирование, восстановление, проверка изменений и целостности без интерфейса.
+    Используется окном BackupStorage и командной строкой (python -m engine).
+    Ход операции передается событиями-словарями в on_event; поле "message"
+    содержит текст для журнала операций.
+    """
+
+    def __init__(self, on_event=None, logger=None, progress_interval=0.25, metrics=None):
+        self.logger = logger or get_logger()
+        # engine.metrics.Metrics: гистограммы фаз (обход, хеширование, ключи, шифрование, запись)
+        self.metrics = metrics
+        self.on_event = on_event or (lambda event: None)
+        self.progress_interval = progress_interval
+        self._cancel = threading.Event()
+        self._active = None
+
+    def _emit(self, event, **fields):
+        self.on_event(dict(event=event, **fields))
+
+    # ---------- Отмена ----------
+
+    def cancel(self):
+        """Отменяет текущую операцию на границе файла (безопасно вызывать из другого потока)"""
+        self._cancel.set()
+        active = self._active
+        if active is not None:
+            active.stop()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _begin(self):
+        self._cancel.clear()
+        self._active = None
+
+    def _key_session(self, password):
+        on_derive = None
+        if self.metrics is not None:
+            on_derive = lambda seconds: self.metrics.observe("key_derivation", seconds)
+        return KeySession(password, on_derive=on_derive)
+
+    def _finish(self, operation, result):
+        """Отметка об отмене и событие завершения операции"""
+        self._active = None
+        if self.metrics is not None:
+            for name in ("files", "failed", "skipped"):
+                if result.get(name):
+                    self.metrics.count(f"{operation}_{name}", result[name])
+        result["cancelled"] = self.cancelled
+        if result["cancelled"]:
+            self._emit("message", message="Операция отменена пользователем")
+            self.logger.log_system_event(f"{operation.capitalize()} cancelled")
+        self.logger.flush_sampled()
+        self._emit("done", operation=operation, **result)
+        return result
+
+    # ---------- Резервное копирование ----------
+
+    def backup(self, source_path, backup_dir, password, workers=None, paranoid=False,
+               algorithm=DEFAULT_ALGORITHM, use_chunk_store=True, compression=AUTO):
+        """Резервное копирование файла или директории в новый снимок; возвращает сводку"""
+        self._begin()
+        self.logger.log_system_event(f"Starting backup: {source_path} -> {backup_dir}")
+        result = {"files": 0, "failed": 0}
+
+        # Один PBKDF2 на всю операцию, ключи файлов выводятся из мастер-ключа сессии.
+        # Директория заблокирована до конца: удаление снимков не освободит блоки, найденные дедупликацией
+        with RepositoryLock(backup_dir, "backup"), self._key_session(password) as session, \
+                HashIndex(backup_dir) as index:
+            detector = ChangeDetector(index, paranoid=paranoid, algorithm=algorithm)
+            store = (ChunkStore(backup_dir, session, compression=compression, metrics=self.metrics)
+                     if use_chunk_store else None)
+            snapshot = SnapshotBuilder(backup_dir, session, source_path, detector.algorithm,
+                                       salt=store.salt if store is not None else None)
+            try:
+                if os.path.isdir(source_path):
+                    self._backup_directory(source_path, backup_dir, session, index, detector, store, snapshot,
+                                           workers, compression, result)
+                else:
+                    self._backup_single_file(source_path, backup_dir, session, index, detector, store, snapshot,
+                                             compression, result)
+                # Каталог ссылается только на блоки, уже записанные в сегменты
+                if store is not None:
+                    store.flush()
+                # Удаленные исходные файлы исключаются из снимка только после полного обхода
+                result["snapshot"] = snapshot.save(complete=not self.cancelled)
+            finally:
+                snapshot.close()
+                if store is not None:
+                    store.close()
+
+            if store is not None:
+                result["store"] = store.report()
+                self.logger.log_system_event("Chunk store stats", str(result["store"]))
+                self._emit("store", **result["store"])
+
+        if result["files"] > 0:
+            self.logger.log_system_event(f"Backup completed successfully. Files: {result['files']}")
+        else:
+            self.logger.log_system_event("No new or modified files found for backup")
+        return self._finish("backup", result)
+
+    def _backup_directory(self, source_dir, backup_dir, session, index, detector, store, snapshot,
+                          workers, compression, result):
+        """Резервное копирование директории конвейером: обход, хеширование, шифрование в пуле потоков"""
+        # Создаем папку с именем файла (без расширения)
+        filename = os.path.basename(source_dir)
+        filename_without_ext = os.path.splitext(filename)[0]
+        file_backup_dir = os.path.join(backup_dir, filename_without_ext)
+        os.makedirs(file_backup_dir, exist_ok=True)
+
+        def rel_name(source_file):
+            return os.path.relpath(source_file, source_dir)
+
+        def detect_changes(source_file, stat_result):
+            changed, file_hash = detector.check(source_file, stat_result, defer_hash=True)
+            # Файл не изменился, но его копии нет (например, каталог удален) - сохраняем заново
+            if not changed and not snapshot.has_copy(rel_name(source_file)):
+                changed = True
+            return changed, file_hash
+
+        def on_backed_up(source_file, file_hash, stat_result, stored):
+            index.put(source_file, stat_result, file_hash, detector.algorithm)
+            snapshot.stored(rel_name(source_file), file_hash, stat_result, stored)
+            self._file_done("Backup", source_file, True)
+
+        def on_unchanged(source_file, file_hash, stat_result):
+            snapshot.unchanged(rel_name(source_file), file_hash, stat_result)
+
+        def on_error(source_file, error):
+            result["failed"] += 1
+            snapshot.failed(rel_name(source_file))
+            self._file_done("Backup", source_file, False, f"Ошибка шифрования {os.path.basename(source_file)}: {error}")
+
+        pipeline = BackupPipeline(
+            session,
+            workers=workers,
+            detect_changes=detect_changes,
+            on_backed_up=on_backed_up,
+            on_unchanged=on_unchanged,
+            on_error=on_error,
+            store=store,
+            compression=compression,
+            on_progress=lambda progress: self._emit("progress", operation="backup", **progress),
+            progress_interval=self.progress_interval,
+            version_tag=snapshot.snapshot_id,
+            algorithm=detector.algorithm,
+            metrics=self.metrics,
+        )
+        # Отмена могла прийти до создания конвейера
+        self._active = pipeline
+        if self.cancelled:
+            pipeline.stop()
+        result["files"] = pipeline.run(source_dir, backup_dir)
+        result["stages"] = pipeline.report()
+
+        self._emit("message",
+                   message=f"Резервное копирование директории завершено. Обработано файлов: {result['files']}")
+        self.logger.log_system_event(f"Directory backup completed. Files: {result['files']}")
+        for stage, stats in result["stages"].items():
+            self._emit("stage", stage=stage, **stats)
+
+    def _backup_single_file(self, source_file, backup_dir, session, index, detector, store, snapshot,
+                            compression, result):
+        """Резервное копирование отдельного файла с собственной папкой"""
+        started = time.perf_counter()
+        filename = os.path.basename(source_file)
+        filename_without_ext = os.path.splitext(filename)[0]
+
+        # Шифрованный файл сохраняем в папке с именем файла (без расширения), версия - в имени файла
+        rel_name = os.path.join(filename_without_ext, filename)
+        encrypted_file = os.path.join(backup_dir, f"{rel_name}.{snapshot.snapshot_id}.enc")
+
+        # Проверка изменений: сначала по метаданным из индекса, хеш - только при их отличии
+        stat_result = os.stat(source_file)
+        try:
+            changed, current_hash = detector.check(source_file, stat_result, defer_hash=True)
+        except Exception as e:
+            self._emit("message", message=f"Ошибка вычисления хеша {source_file}: {e}")
+            changed, current_hash = True, None
+        if not changed and not snapshot.has_copy(rel_name):
+            changed = True  # Файл не изменился, но его копии нет
+        if not changed:
+            snapshot.unchanged(rel_name, current_hash, stat_result)
+        if not changed or self.cancelled:
+            self._emit("progress", operation="backup", **progress_snapshot(1, 0, started, total=1))
+            return  # Файл не изменился
+
+        # Хеш, не посчитанный при проверке, считается за тот же проход чтения, что и шифрование
+        hasher = new_hasher(detector.algorithm) if current_hash is None else None
+        encrypt_started = time.perf_counter()
+        try:
+            if store is not None:
+                stored = {"chunks": store.store_file(source_file, hasher=hasher)["chunks"]}
+            else:
+                encrypt_file(source_file, encrypted_file, session=session,
+                             compression=compression, hasher=hasher)
+                stored = {"location": encrypted_file}
+            if hasher is not None:
+                current_hash = hasher.hexdigest()
+            if self.metrics is not None:
+                self.metrics.observe("encrypt", time.perf_counter() - encrypt_started, stat_result.st_size)
+
+            if current_hash is not None:
+                index.put(source_file, stat_result, current_hash, detector.algorithm)
+            snapshot.stored(rel_name, current_hash, stat_result, stored)
+            result["files"] = 1
+            self._file_done("Backup", source_file, True,
+                            f"Файл зашифрован и сохранен в папке: {filename_without_ext}")
+        except Exception as e:
+            result["failed"] = 1
+            snapshot.failed(rel_name)
+            self._file_done("Backup", source_file, False, f"Ошибка шифрования {filename}: {e}")
+        self._emit("progress", operation="backup", **progress_snapshot(1, stat_result.st_size, started, total=1))
+
+    def _file_done(self, operation, path, success, message=None):
+        self.logger.log_file_operation("System", operation, os.path.basename(path), success)
+        fields = {"operation": operation.lower(), "path": path, "status": "ok" if success else "failed"}
+        if message:
+            fields["message"] = message
+        self._emit("file", **fields)
+
+    # ---------- Проверка изменений ----------
+
+    def check_changes(self, source_path, backup_dir, paranoid=False, algorithm=DEFAULT_ALGORITHM):
+        """Возвращает список измененных или новых файлов относительно индекса резервной директории"""
+        self._begin()
+        self.logger.log_system_event(f"Checking for changes in: {source_path}")
+        changed_files = []
+        progress = _Progress(self, "diff")
+
+        with HashIndex(backup_dir) as index:
+            detector = ChangeDetector(index, paranoid=paranoid, algorithm=algorithm)
+            if os.path.isdir(source_path):
+                for root, dirs, files in os.walk(source_path):
+                    # Отмена прекращает и обход дерева, а не только проверку файлов текущей папки
+                    if self.cancelled:
+                        break
+                    for file in files:
+                        if self.cancelled:
+                            break
+                        self._check_file_changes(detector, os.path.join(root, file), changed_files)
+                        progress.add()
+            else:
+                self._check_file_changes(detector, source_path, changed_files)
+                progress.add()
+        progress.flush()
+
+        if changed_files:
+            self.logger.log_system_event(f"Changes detected in {len(changed_files)} files")
+        else:
+            self.logger.log_system_event("No changes detected")
+        self._finish("diff", {"changed": len(changed_files)})
+        return changed_files
+
+    def _check_file_changes(self, detector, file_path, changed_files):
+        """Проверяет изменения в отдельном файле"""
+        try:
+            changed, _ = detector.check(file_path)
+        except Exception as e:
+            self._emit("message", message=f"Ошибка вычисления хеша {file_path}: {e}")
+            changed = True
+
+        if changed:
+            changed_files.append(file_path)
+            self._emit("changed", path=file_path)
+
+    # ---------- Восстановление и проверка целостности ----------
+
+    def _open_catalog(self, backup_path, session, snapshot=None):
+        """Корень копии и каталог снимка snapshot (по умолчанию последнего); (None, None) для копий без каталога"""
+        if os.path.isfile(backup_path):
+            return None, None
+        root = find_catalog_root(backup_path)
+        if root is None:
+            if snapshot is not None:
+                raise FileNotFoundError(f"Снимок не найден: {snapshot}")
+            return None, None
+        if snapshot is not None:
+            return root, load_catalog(root, snapshot, session)
+        return root, load_latest_catalog(root, session)
+
+    def _backup_entries(self, backup_path, session, patterns=None, snapshot=None):
+        """
+        Файлы копии как записи каталога и корень, относительно которого заданы их location.
+        Пути записей - относительно backup_path. Копии без каталога обходятся по файлам .enc и манифестам
+        """
+        root, catalog = self._open_catalog(backup_path, session, snapshot)
+        if catalog is None:
+            entries = [CatalogEntry(rel_name, None, None, None, None, os.path.abspath(backup_file), None, None)
+                       for backup_file, rel_name in iter_backup_files(backup_path, patterns)]
+            return backup_path, entries
+
+        # Копия выбрана не с корня - восстанавливается только ее часть каталога
+        prefix = os.path.relpath(os.path.abspath(backup_path), root).replace(os.sep, "/")
+        prefix = "" if prefix == "." else prefix + "/"
+        if prefix:
+            patterns = [prefix + pattern.strip("/") for pattern in patterns] if patterns else [prefix]
+        with catalog:
+            entries = [entry._replace(path=entry.path[len(prefix):])
+                       for entry in catalog.iter_entries(patterns)]
+        return root, entries
+
+    def _verify_one(self, entry, root, session, stores):
+        """Проверяет один файл копии (блоки, манифест или .enc); возвращает размер данных"""
+        if entry.chunks is not None:
+            if root not in stores:
+                stores[root] = ChunkStore(root, session)
+            size = stores[root].verify_chunks(entry.chunks)
+            if size != entry.size:
+                raise ValueError(f"Размер файла не совпадает с каталогом: {entry.path}")
+            return size
+
+        backup_file = os.path.join(root, entry.location)
+        if not backup_file.endswith(MANIFEST_SUFFIX):
+            return verify_file(backup_file, session=session)
+
+        store_root = find_store_root(backup_file)
+        if store_root is None:
+            raise FileNotFoundError(f"Хранилище блоков не найдено для {backup_file}")
+        if store_root not in stores:
+            stores[store_root] = ChunkStore(store_root, session)
+        return stores[store_root].verify_file(backup_file)
+
+    def restore(self, backup_path, restore_path, password, patterns=None, workers=None, resume=True,
+                snapshot=None):
+        """
+        Расшифровывает файлы из резервной копии в restore_path; возвращает сводку.
+        patterns - шаблоны относительных путей для выборочного восстановления,
+        resume - продолжить прерванное восстановление по журналу в restore_path,
+        snapshot - идентификатор снимка (по умолчанию последний).
+        Список файлов берется из каталога копии, файлы данных читаются только для выбранных файлов
+        """
+        self._begin()
+        self.logger.log_system_event(f"Starting restore: {backup_path} -> {restore_path}")
+        result = {"files": 0, "failed": 0, "skipped": 0}
+
+        def on_restored(rel_name, restored_file, size):
+            self._file_done("Restore", restored_file, True, f"Восстановлен: {os.path.basename(rel_name)}")
+
+        def on_error(rel_name, restored_file, error):
+            self._file_done("Restore", restored_file, False, f"Ошибка восстановления {rel_name}: {error}")
+
+        journal = None
+        try:
+            with self._key_session(password) as session:
+                # Список файлов собирается заранее, чтобы ход работы показывал общее количество
+                root, entries = self._backup_entries(backup_path, session, patterns, snapshot)
+                if resume and entries:
+                    journal = RestoreJournal(restore_path, backup_path, snapshot)
+                engine = RestoreEngine(
+                    session,
+                    workers=workers,
+                    journal=journal,
+                    on_restored=on_restored,
+                    on_error=on_error,
+                    on_progress=lambda progress: self._emit("progress", operation="restore", **progress),
+                    progress_interval=self.progress_interval,
+                    metrics=self.metrics,
+                )
+                self._active = engine
+                if self.cancelled:
+                    engine.stop()
+                result["files"], result["failed"] = engine.run(entries, root, restore_path)
+                result["skipped"] = engine.skipped
+        finally:
+            if journal is not None:
+                journal.close(completed=not result["failed"] and not self.cancelled)
+
+        if result["skipped"]:
+            self._emit("message", message=f"Пропущено ранее восстановленных файлов: {result['skipped']}")
+        if result["files"] > 0:
+            self._emit("message", message=f"Восстановление завершено. Файлов: {result['files']}")
+            self.logger.log_system_event(f"Restore completed. Files restored: {result['files']}")
+        elif not entries:
+            self._emit("message", message="Не найдено зашифрованных файлов для восстановления")
+            self.logger.log_system_event("No encrypted files found for restore")
+        return self._finish("restore", result)
+
+    def verify(self, backup_path, password):
+        """Проверяет целостность и подлинность всех файлов копии без записи на диск"""
+        self._begin()
+        self.logger.log_system_event(f"Starting verify: {backup_path}")
+        result = {"files": 0, "failed": 0}
+        stores = {}
+
+        with self._key_session(password) as session:
+            root, entries = self._backup_entries(backup_path, session)
+            progress = _Progress(self, "verify", total=len(entries))
+            for entry in entries:
+                if self.cancelled:
+                    break
+                size = 0
+                try:
+                    size = self._verify_one(entry, root, session, stores)
+                    result["files"] += 1
+                    self._emit("file", operation="verify", path=entry.path, status="ok")
+                except Exception as e:
+                    result["failed"] += 1
+                    self._emit("file", operation="verify", path=entry.path, status="failed",
+                               message=f"Ошибка проверки {entry.path}: {e}")
+                progress.add(size)
+            progress.flush()
+            for store in stores.values():
+                store.close()
+
+        self.logger.log_system_event(f"Verify completed. OK: {result['files']}, failed: {result['failed']}")
+        return self._finish("verify", result)
+
+    # ---------- Каталог ----------
+
+    def list_files(self, backup_path, password, directory="", snapshot=None):
+        """Содержимое папки копии по каталогу: [(имя, это папка, размер, mtime_ns)]"""
+        with KeySession(password) as session:
+            root, catalog = self._open_catalog(backup_path, session, snapshot)
+            if catalog is None:
+                raise FileNotFoundError(f"Каталог резервной копии не найден: {backup_path}")
+            with catalog:
+                return catalog.list_dir(directory)
+
+    def search(self, backup_path, password, pattern, limit=None, snapshot=None):
+        """Поиск файлов копии по шаблону имени или пути (GLOB) без обращения к файлам данных"""
+        with KeySession(password) as session:
+            root, catalog = self._open_catalog(backup_path, session, snapshot)
+            if catalog is None:
+                raise FileNotFoundError(f"Каталог резервной копии не найден: {backup_path}")
+            with catalog:
+                return catalog.search(pattern, limit)
+
+    # ---------- Снимки ----------
+
+    def list_snapshots(self, backup_dir, password):
+        """Снимки резервной директории: [(идентификатор, время, источник, файлов, байт)] от старых к новым"""
+        snapshots = []
+        with KeySession(password) as session:
+            for snapshot_id in list_catalogs(backup_dir):
+                with load_catalog(backup_dir, snapshot_id, session) as catalog:
+                    snapshots.append((snapshot_id, catalog.get_meta("created"), catalog.get_meta("source"),
+                                      len(catalog), catalog.total_size()))
+        return snapshots
+
+    def forget(self, backup_dir, keep_last=0, keep_daily=0, keep_weekly=0, keep_monthly=0, dry_run=False):
+        """
+        Удаляет снимки, не попавшие под политику хранения, и данные, не нужные оставшимся снимкам.
+        Пароль не нужен: каталоги удаляются целиком, учет данных ведется в индексе снимков.
+        Возвращает сводку с оставленными и удаленными снимками
+        """
+        with RepositoryLock(backup_dir, "forget"):
+            snapshot_ids = list_catalogs(backup_dir)
+            keep = select_retained(snapshot_ids, keep_last, keep_daily, keep_weekly, keep_monthly)
+            delete = sorted(set(snapshot_ids) - keep)
+            self.logger.log_system_event(f"Forget snapshots in {backup_dir}: keep {len(keep)}, delete {len(delete)}")
+            with SnapshotIndex(backup_dir) as index:
+                result = index.prune(delete, dry_run=dry_run)
+        result.update(kept=sorted(keep), deleted=delete, dry_run=dry_run)
+        for snapshot_id in delete:
+            self._emit("snapshot", snapshot=snapshot_id, time=snapshot_time(snapshot_id).isoformat(),
+                       status="would delete" if dry_run else "deleted")
+        self._emit("done", operation="forget", **result)
+        return result
+
+
+class _Progress:
+    """Счетчик хода последовательной операции; события progress не чаще progress_interval"""
+
+    def __init__(self, service, operation, total=None):
+        self.service = service
+        self.operation = operation
+        self.total = total
+        self.files = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.last_emit = 0.0
+
+    def add(self, size=0):
+        self.files += 1
+        self.bytes += size
+        now = time.perf_counter()
+        if now - self.last_emit >= self.service.progress_interval:
+            self.flush(now)
+
+    def flush(self, now=None):
+        self.last_emit = now or time.perf_counter()
+        self.service._emit("progress", operation=self.operation,
+                           **progress_snapshot(self.files, self.bytes, self.started, total=self.total))
@@ -0,0 +1,347 @@
+# snapshots.py
+import os
+import bisect
+import sqlite3
+import threading
+from datetime import datetime
+
+from .catalog import (Catalog, catalog_path, list_catalogs, load_latest_catalog, new_snapshot_id,
+                      pack_chunks, unpack_chunks)
+from .chunk_store import ChunkStore, MANIFEST_SUFFIX, delete_chunks, find_store_root
+
+SNAPSHOT_INDEX_FILENAME = ".snapshots.sqlite"
+
+
+def snapshot_time(snapshot_id):
+    """Время создания снимка по его идентификатору"""
+    return datetime.strptime(snapshot_id[:15], "%Y%m%dT%H%M%S")
+
+
+def select_retained(snapshot_ids, keep_last=0, keep_daily=0, keep_weekly=0, keep_monthly=0):
+    """
+    Снимки, которые оставляет политика хранения: keep_last последних и самый поздний снимок
+    в каждом из keep_daily последних дней, keep_weekly недель и keep_monthly месяцев, когда были снимки.
+    Без правил сохраняются все снимки. Порядок создания - порядок идентификаторов (engine.catalog.new_snapshot_id)
+    """
+    ordered = sorted(snapshot_ids, reverse=True)
+    if not (keep_last or keep_daily or keep_weekly or keep_monthly):
+        return set(ordered)
+
+    keep = set(ordered[:keep_last])
+    rules = (
+        (keep_daily, lambda moment: moment.date()),
+        (keep_weekly, lambda moment: moment.isocalendar()[:2]),
+        (keep_monthly, lambda moment: (moment.year, moment.month)),
+    )
+    for count, period in rules:
+        periods = set()
+        for snapshot_id in ordered:
+            if len(periods) >= count:
+                break
+            key = period(snapshot_time(snapshot_id))
+            if key not in periods:
+                periods.add(key)
+                keep.add(snapshot_id)
+    return keep
+
+
+class SnapshotIndex:
+    """
+    Индекс версий данных для снимков (SQLite в резервной директории).
+    Версия - данные файла (блоки хранилища или файл .enc), которые входят в снимки
+    с born по died (не включая died). Неизмененный файл продолжает версию, поэтому снимки
+    разделяют данные без копирования. Счетчики ссылок блоков считают живые версии,
+    и удаление снимков просматривает только версии, появившиеся в удаляемых снимках.
+    Путей исходных файлов индекс не содержит - они есть только в зашифрованных каталогах.
+    """
+
+    def __init__(self, backup_dir):
+        os.makedirs(backup_dir, exist_ok=True)
+        self.backup_dir = backup_dir
+        self.path = os.path.join(backup_dir, SNAPSHOT_INDEX_FILENAME)
+        self._lock = threading.Lock()
+
+        # Версии добавляются из потока фиксации конвейера, соединение общее под блокировкой
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id TEXT PRIMARY KEY,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS versions (
+                id INTEGER PRIMARY KEY,
+                born TEXT NOT NULL,
+                died TEXT,
+                location TEXT,
+                chunks BLOB
+            );
+            CREATE INDEX IF NOT EXISTS versions_born ON versions (born);
+            CREATE INDEX IF NOT EXISTS versions_location ON versions (location);
+            CREATE TABLE IF NOT EXISTS refs (
+                chunk BLOB PRIMARY KEY,
+                count INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS unfinished (
+                id TEXT PRIMARY KEY
+            );
+        """)
+        if "versions" in tables and "unfinished" not in tables:
+            # Индекс без таблицы незавершенных проходов: находим их один раз полным просмотром
+            self.conn.execute("INSERT INTO unfinished SELECT DISTINCT born FROM versions "
+                              "WHERE born NOT IN (SELECT id FROM snapshots)")
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    # ---------- Запись снимка ----------
+
+    def begin_snapshot(self, snapshot_id):
+        """
+        Отмечает начатый проход: если каталог снимка так и не будет записан (сбой),
+        версии прохода освободит следующее удаление снимков
+        """
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO unfinished (id) VALUES (?)", (snapshot_id,))
+            self.conn.commit()
+
+    def add_version(self, born, location=None, chunks=None):
+        """Новая версия данных, появившаяся в снимке born; возвращает ее номер"""
+        blob = pack_chunks(chunks) if chunks is not None else None
+        with self._lock:
+            cursor = self.conn.execute("INSERT INTO versions (born, location, chunks) VALUES (?, ?, ?)",
+                                       (born, location, blob))
+            if chunks:
+                self.conn.executemany(
+                    "INSERT INTO refs VALUES (?, 1) ON CONFLICT (chunk) DO UPDATE SET count = count + 1",
+                    [(chunk_id,) for chunk_id in {bytes.fromhex(chunk_id) for chunk_id, _ in chunks}]
+                )
+            return cursor.lastrowid
+
+    def commit_snapshot(self, snapshot_id, retired):
+        """
+        Регистрирует сохраненный снимок и закрывает версии, которых в нем больше нет.
+        Вызывается после записи каталога: при сбое раньше версии остаются открытыми
+        """
+        with self._lock:
+            self.conn.execute("INSERT OR IGNORE INTO snapshots (id) VALUES (?)", (snapshot_id,))
+            self.conn.execute("DELETE FROM unfinished WHERE id = ?", (snapshot_id,))
+            self.conn.executemany("UPDATE versions SET died = ? WHERE id = ? AND died IS NULL",
+                                  [(snapshot_id, version) for version in retired])
+            self.conn.commit()
+
+    # ---------- Удаление снимков ----------
+
+    def _tracked(self):
+        return {row[0]: row[1] for row in self.conn.execute("SELECT id, deleted FROM snapshots")}
+
+    def prune(self, delete_ids, dry_run=False):
+        """
+        Удаляет каталоги снимков delete_ids и данные, которые больше не нужны ни одному снимку.
+        Возвращает сводку: удалено снимков, версий, блоков, файлов .enc и освобождено байт
+        """
+        existing = list_catalogs(self.backup_dir)
+        delete = set(delete_ids) & set(existing)
+        # Идентификаторы возрастают в порядке создания: по ним ищется первый оставшийся снимок версии
+        retained = sorted(set(existing) - delete)
+        report = {"snapshots": len(delete), "versions": 0, "chunks": 0, "files": 0, "bytes": 0}
+
+        with self._lock:
+            tracked = self._tracked()
+            # Каталоги, созданные до индекса версий, ссылаются на неучтенные данные - их данные не удаляются
+            keep_data = any(snapshot_id not in tracked for snapshot_id in retained)
+
+            # Кандидаты - версии, впервые вошедшие в удаляемые снимки, и версии незавершенных проходов.
+            # Идущее копирование держит блокировку директории (engine.locking), поэтому проход
+            # без снимка здесь - только прерванный
+            unfinished = {row[0] for row in self.conn.execute("SELECT id FROM unfinished")}
+            candidates_born = sorted(delete | unfinished)
+
+            freed_versions, rebased = [], []
+            for born in candidates_born:
+                rows = self.conn.execute("SELECT id, died, location, chunks FROM versions WHERE born = ?",
+                                         (born,)).fetchall()
+                for version, died, location, blob in rows:
+                    needed_in = None
+                    if born not in unfinished:
+                        position = bisect.bisect_left(retained, born)
+                        if position < len(retained) and (died is None or retained[position] < died):
+                            needed_in = retained[position]
+                    if needed_in is not None:
+                        # Версия остается: теперь она впервые входит в первый оставшийся снимок
+                        rebased.append((needed_in, version))
+                    else:
+                        freed_versions.append((version, location, blob))
+
+            report["versions"] = len(freed_versions)
+            if dry_run:
+                return report
+
+            for snapshot_id in delete:
+                os.remove(catalog_path(self.backup_dir, snapshot_id))
+            self.conn.executemany("INSERT OR REPLACE INTO snapshots (id, deleted) VALUES (?, 1)",
+                                  [(snapshot_id,) for snapshot_id in delete])
+            self.conn.executemany("UPDATE versions SET born = ? WHERE id = ?", rebased)
+            self.conn.executemany("DELETE FROM unfinished WHERE id = ?", [(born,) for born in unfinished])
+
+            released = []
+            for version, location, blob in freed_versions:
+                self.conn.execute("DELETE FROM versions WHERE id = ?", (version,))
+                if location is not None:
+                    still_used = self.conn.execute("SELECT 1 FROM versions WHERE location = ? LIMIT 1",
+                                                   (location,)).fetchone()
+                    if not still_used and not keep_data:
+                        report["bytes"] += self._remove(os.path.join(self.backup_dir, location))
+                        report["files"] += 1
+                if blob is not None:
+                    for chunk_id in {chunk_id for chunk_id, _ in unpack_chunks(blob)}:
+                        if self._release_chunk(bytes.fromhex(chunk_id)):
+                            released.append(chunk_id)
+            self.conn.commit()
+
+        if released and not keep_data:
+            report["chunks"], freed = delete_chunks(self.backup_dir, released)
+            report["bytes"] += freed
+        return report
+
+    def _release_chunk(self, chunk):
+        """Уменьшает счетчик ссылок блока; True, если ссылок не осталось"""
+        row = self.conn.execute("SELECT count FROM refs WHERE chunk = ?", (chunk,)).fetchone()
+        if row is None:
+            return False
+        if row[0] > 1:
+            self.conn.execute("UPDATE refs SET count = count - 1 WHERE chunk = ?", (chunk,))
+            return False
+        self.conn.execute("DELETE FROM refs WHERE chunk = ?", (chunk,))
+        return True
+
+    @staticmethod
+    def _remove(path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except FileNotFoundError:
+            return 0
+
+
+class SnapshotBuilder:
+    """
+    Сборка каталога нового снимка во время резервного копирования.
+    Каталог начинается с последнего снимка: файлы других источников переносятся как есть,
+    файлы текущего источника обновляются, а не встреченные при обходе (удаленные) исключаются.
+    Все методы записи вызываются из одного потока (фиксация результатов конвейера)
+    """
+
+    def __init__(self, backup_dir, session, source_path, algorithm, salt=None):
+        self.backup_dir = backup_dir
+        self.session = session
+        self.algorithm = algorithm
+        self.salt = salt
+        # Строится под блокировкой директории: идентификатор больше всех сохраненных каталогов
+        self.snapshot_id = new_snapshot_id(backup_dir)
+        self.index = SnapshotIndex(backup_dir)
+        self.index.begin_snapshot(self.snapshot_id)
+        self.catalog = load_latest_catalog(backup_dir, session) or Catalog()
+        self.source = self.catalog.source_id(os.path.abspath(source_path))
+        self.source_path = source_path
+        self.retired = []
+        self._stores = {}
+
+    def has_copy(self, rel_name):
+        """
+        Есть ли копия файла: запись каталога или файл копии прежнего формата (.enc, манифест).
+        Вызывается из потоков хеширования - только чтение
+        """
+        if self.catalog.get(rel_name) is not None:
+            return True
+        return self._legacy_location(rel_name) is not None
+
+    def _legacy_location(self, rel_name):
+        for suffix in ('.enc', MANIFEST_SUFFIX):
+            if os.path.isfile(os.path.join(self.backup_dir, rel_name + suffix)):
+                return rel_name + suffix
+        return None
+
+    def stored(self, rel_name, file_hash, stat_result, stored):
+        """Файл сохранен заново: новая версия, прежняя закрывается этим снимком"""
+        previous = self.catalog.get(rel_name)
+        if previous is not None and previous.version is not None:
+            self.retired.append(previous.version)
+
+        location = stored.get("location")
+        if location is not None:
+            location = os.path.relpath(location, self.backup_dir).replace(os.sep, "/")
+        chunks = stored.get("chunks")
+        version = self.index.add_version(self.snapshot_id, location, chunks)
+        self.catalog.add(rel_name, stat_result.st_size, stat_result.st_mtime_ns, file_hash, self.algorithm,
+                         location=location, chunks=chunks, source=self.source, version=version)
+        self.catalog.mark_seen(rel_name)
+
+    def unchanged(self, rel_name, file_hash, stat_result):
+        """Файл не изменился: версия продолжается; записи без версии (прежний формат) ее получают"""
+        entry = self.catalog.get(rel_name)
+        if entry is None:
+            location = self._legacy_location(rel_name)
+            if location is None:
+                return
+            chunks = None
+            if location.endswith(MANIFEST_SUFFIX):
+                # Блоки манифеста переносятся в каталог, чтобы учитываться в счетчиках ссылок
+                chunks = self._store_for(location).read_manifest(os.path.join(self.backup_dir, location))["chunks"]
+                location = None
+            version = self.index.add_version(self.snapshot_id, location, chunks)
+            self.catalog.add(rel_name, stat_result.st_size, stat_result.st_mtime_ns, file_hash, self.algorithm,
+                             location=location, chunks=chunks, source=self.source, version=version)
+        else:
+            version = entry.version
+            if version is None:
+                version = self.index.add_version(self.snapshot_id, entry.location, entry.chunks)
+            if (entry.size, entry.mtime_ns) != (stat_result.st_size, stat_result.st_mtime_ns):
+                self.catalog.update_stat(rel_name, stat_result.st_size, stat_result.st_mtime_ns)
+            self.catalog.update_entry(rel_name, source=self.source, version=version)
+        self.catalog.mark_seen(rel_name)
+
+    def failed(self, rel_name):
+        """Файл не сохранен: в снимке остается прежняя версия"""
+        self.catalog.mark_seen(rel_name)
+
+    def _store_for(self, location):
+        store_root = find_store_root(os.path.join(self.backup_dir, location))
+        if store_root is None:
+            raise FileNotFoundError(f"Хранилище блоков не найдено для {location}")
+        if store_root not in self._stores:
+            self._stores[store_root] = ChunkStore(store_root, self.session)
+        return self._stores[store_root]
+
+    def save(self, complete=True):
+        """
+        Записывает каталог снимка и регистрирует его в индексе версий.
+        complete=False (отмена) - не встреченные файлы остаются в снимке
+        """
+        if complete:
+            self.retired += self.catalog.remove_unseen(self.source)
+        self.catalog.set_meta("snapshot", self.snapshot_id)
+        self.catalog.set_meta("source", os.path.abspath(self.source_path))
+        self.catalog.set_meta("created", datetime.now().isoformat(timespec="seconds"))
+        self.catalog.save(catalog_path(self.backup_dir, self.snapshot_id), self.session, salt=self.salt)
+        self.index.commit_snapshot(self.snapshot_id, self.retired)
+        return self.snapshot_id
+
+    def close(self):
+        self.catalog.close()
+        self.index.close()
+        for store in self._stores.values():
+            store.close()
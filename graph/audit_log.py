@@ -0,0 +1,184 @@
+# audit_log.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+AUDIT_FILENAME = "audit.sqlite"
+MAX_PENDING_ROWS = 5000  # Событий, ожидающих записи при недоступной базе; более старые отбрасываются
+
+# Поля события аудита в порядке кортежа, который log_* передают в extra={"audit": ...}
+AUDIT_FIELDS = ("event", "user", "status", "operation", "target", "details", "ip")
+
+
+def _to_seconds(value):
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+
+class AuditLog:
+    """
+    Структурированный журнал событий (SQLite) рядом с текстовым: тип события, пользователь,
+    статус и время проиндексированы, поэтому выборки вроде "неудачные восстановления за сутки"
+    отвечают по индексу, не просматривая историю
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+
+        # Пишет поток журнала, читают потоки интерфейса - соединение общее под блокировкой
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY,
+                ts REAL NOT NULL,
+                level TEXT NOT NULL,
+                event TEXT NOT NULL,
+                user TEXT,
+                status TEXT,
+                operation TEXT,
+                target TEXT,
+                details TEXT,
+                ip TEXT
+            );
+            CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+            CREATE INDEX IF NOT EXISTS events_event ON events (event, ts);
+            CREATE INDEX IF NOT EXISTS events_user ON events (user, ts);
+            CREATE INDEX IF NOT EXISTS events_status ON events (status, event, ts);
+        """)
+        self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.commit()
+            self.conn.close()
+
+    def add_many(self, rows):
+        """Записывает события [(ts, level, event, user, status, operation, target, details, ip)] одной транзакцией"""
+        with self._lock:
+            try:
+                self.conn.executemany("INSERT INTO events (ts, level, " + ", ".join(AUDIT_FIELDS) + ") "
+                                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self.conn.commit()
+            except sqlite3.Error:
+                self.conn.rollback()  # Пачка повторяется целиком, частично вставленные строки не остаются
+                raise
+
+    @staticmethod
+    def _where(event=None, user=None, status=None, operation=None, since=None, until=None):
+        conditions, params = [], []
+        for field, value in (("event", event), ("user", user), ("status", status), ("operation", operation)):
+            if value is not None:
+                conditions.append(f"{field} = ?")
+                params.append(value)
+        since, until = _to_seconds(since), _to_seconds(until)
+        if since is not None:
+            conditions.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("ts < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+
+    def query(self, event=None, user=None, status=None, operation=None, since=None, until=None, limit=None):
+        """
+        События по условиям (все необязательны; since/until - datetime или секунды), новые первыми.
+        Возвращает список словарей с полями ts, level и AUDIT_FIELDS
+        """
+        where, params = self._where(event, user, status, operation, since, until)
+        sql = "SELECT ts, level, " + ", ".join(AUDIT_FIELDS) + " FROM events" + where + " ORDER BY ts DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        columns = ("ts", "level") + AUDIT_FIELDS
+        return [dict(zip(columns, row)) for row in rows]
+
+    def count(self, event=None, user=None, status=None, operation=None, since=None, until=None, group_by=None):
+        """Число событий по условиям; с group_by ("event", "user", "status", "operation") - {значение: число}"""
+        where, params = self._where(event, user, status, operation, since, until)
+        if group_by is None:
+            with self._lock:
+                return self.conn.execute("SELECT COUNT(*) FROM events" + where, params).fetchone()[0]
+        if group_by not in AUDIT_FIELDS:
+            raise ValueError(f"Неизвестное поле группировки: {group_by}")
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {group_by}, COUNT(*) FROM events{where} GROUP BY {group_by}",
+                                     params).fetchall()
+        return dict(rows)
+
+    def failed(self, event=None, operation=None, hours=24):
+        """Неудачные события за последние hours часов, например failed("FILE_OPERATION", "Restore")"""
+        return self.query(event=event, status="FAILED", operation=operation, since=time.time() - hours * 3600)
+
+    def prune(self, before):
+        """Удаляет события старше before; возвращает число удаленных"""
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM events WHERE ts < ?", (_to_seconds(before),))
+            self.conn.commit()
+            return cursor.rowcount
+
+
+class AuditHandler(logging.Handler):
+    """Обработчик для потока журнала: копит события из extra={"audit": ...} и пишет их пачкой"""
+
+    def __init__(self, audit_log, batch_size=256, max_pending=MAX_PENDING_ROWS):
+        super().__init__()
+        self.audit_log = audit_log
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._rows = []
+        self._flush_at = batch_size  # После неудачной записи повтор - через batch_size новых событий
+        self._dropped = 0  # Отброшено событий с последней успешной записи
+
+    def emit(self, record):
+        fields = getattr(record, "audit", None)
+        if fields is None:
+            return
+        try:
+            self._rows.append((record.created, record.levelname) + tuple(fields))
+            if len(self._rows) >= self._flush_at:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            if self._rows:
+                rows, self._rows = self._rows, []
+                try:
+                    self.audit_log.add_many(rows)
+                except Exception:
+                    # База занята (database is locked) - события запишутся при следующем сбросе,
+                    # но не больше max_pending: при долгой недоступности старые отбрасываются
+                    self._rows[:0] = rows
+                    overflow = len(self._rows) - self.max_pending
+                    if overflow > 0:
+                        del self._rows[:overflow]
+                        if not self._dropped:
+                            logging.getLogger("AppLogger").warning(
+                                "Audit log unavailable, dropping oldest events beyond %d pending", self.max_pending)
+                        self._dropped += overflow
+                    self._flush_at = len(self._rows) + self.batch_size
+                    raise
+                self._flush_at = self.batch_size
+                if self._dropped:
+                    logging.getLogger("AppLogger").warning(
+                        "Audit log recovered, %d events were dropped", self._dropped)
+                    self._dropped = 0
+        finally:
+            self.release()
+
+    def close(self):
+        self.flush()
+        super().close()
@@ -2,10 +2,14 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import shutil
-import hashlib
 from datetime import datetime
 from .logger import get_logger  # Подключаем логгер
-from crypto.crypto_utils import encrypt_file, decrypt_file
+from crypto.compression import AUTO, available_codecs
+from engine.hashing import available_algorithms, DEFAULT_ALGORITHM
+from engine.service import BackupService
+from .job_runner import JobRunner
+
+MAX_LOG_LINES = 5000  # Строк в журнале окна; старые строки удаляются, чтобы вставка не замедлялась
 
 
 class BackupStorage:
@@ -23,9 +27,22 @@ class BackupStorage:
         self.backup_path = tk.StringVar()
         self.encryption_key = tk.StringVar()
         self.is_directory = tk.BooleanVar(value=True)  # True - папка, False - файл
-
-        # Словарь для отслеживания хешей файлов
-        self.file_hashes = {}
+        self.workers = tk.IntVar(value=os.cpu_count() or 1)  # Потоки шифрования
+        self.paranoid_mode = tk.BooleanVar(value=False)  # Перехешировать файлы, даже если stat не изменился
+        self.hash_algorithm = tk.StringVar(value=DEFAULT_ALGORITHM)
+        self.use_chunk_store = tk.BooleanVar(value=True)  # Дедупликация блоков вместо файлов .enc
+        self.compression = tk.StringVar(value=AUTO)  # Кодек сжатия перед шифрованием
+        self.restore_filter = tk.StringVar()  # Шаблоны путей для выборочного восстановления
+
+        # Логика резервного копирования без интерфейса (общая с командной строкой).
+        # Операции выполняются в фоновом потоке, события передаются в окно через очередь
+        self.jobs = JobRunner(self.root, self._on_service_event)
+        self.service = BackupService(on_event=self.jobs.post, logger=self.logger)
+        self.progress_text = tk.StringVar(value="")
+        self._pending_progress = None
+        self._log_buffer = []
+        self._log_flush_id = None
+        self._quit_after_job = False
 
         self.setup_ui()
 
@@ -71,18 +88,56 @@ class BackupStorage:
         ttk.Label(path_frame, text="Пароль шифрования*:").grid(row=2, column=0, sticky="w", pady=5)
         ttk.Entry(path_frame, textvariable=self.encryption_key, width=50, show="*").grid(row=2, column=1, padx=5)
 
+        # Количество потоков шифрования
+        ttk.Label(path_frame, text="Потоков шифрования:").grid(row=3, column=0, sticky="w", pady=5)
+        ttk.Spinbox(path_frame, from_=1, to=256, textvariable=self.workers, width=6).grid(row=3, column=1,
+                                                                                        padx=5, sticky="w")
+
+        # Полная проверка содержимого вместо сравнения размера и времени изменения
+        ttk.Checkbutton(path_frame, text="Полная проверка (перехешировать все файлы)",
+                        variable=self.paranoid_mode).grid(row=4, column=1, padx=5, sticky="w")
+
+        # Алгоритм хеширования для отслеживания изменений
+        ttk.Label(path_frame, text="Алгоритм хеша:").grid(row=5, column=0, sticky="w", pady=5)
+        ttk.Combobox(path_frame, textvariable=self.hash_algorithm, values=available_algorithms(),
+                     state="readonly", width=10).grid(row=5, column=1, padx=5, sticky="w")
+
+        # Хранилище блоков: повторяющиеся и неизмененные части файлов сохраняются один раз
+        ttk.Checkbutton(path_frame, text="Дедупликация (хранилище блоков)",
+                        variable=self.use_chunk_store).grid(row=6, column=1, padx=5, sticky="w")
+
+        # Сжатие перед шифрованием (уже сжатые форматы пропускаются автоматически)
+        ttk.Label(path_frame, text="Сжатие:").grid(row=7, column=0, sticky="w", pady=5)
+        ttk.Combobox(path_frame, textvariable=self.compression, values=[AUTO] + available_codecs(),
+                     state="readonly", width=10).grid(row=7, column=1, padx=5, sticky="w")
+
+        # Выборочное восстановление: шаблоны путей через запятую (например, docs/*, *.txt)
+        ttk.Label(path_frame, text="Восстановить только:").grid(row=8, column=0, sticky="w", pady=5)
+        ttk.Entry(path_frame, textvariable=self.restore_filter, width=50).grid(row=8, column=1, padx=5)
+
         # Фрейм для кнопок действий
         action_frame = tk.Frame(self.root, bg="#1e1e1e")
         action_frame.pack(pady=20)
 
-        ttk.Button(action_frame, text="Создать резервную копию",
-                   command=self.create_backup).pack(side=tk.LEFT, padx=10)
-        ttk.Button(action_frame, text="Проверить изменения",
-                   command=self.check_changes).pack(side=tk.LEFT, padx=10)
-        ttk.Button(action_frame, text="Восстановить из резервной копии",
-                   command=self.restore_backup).pack(side=tk.LEFT, padx=10)
-        ttk.Button(action_frame, text="Сбросить настройки",
-                   command=self.reset_settings).pack(side=tk.LEFT, padx=10)
+        # Кнопки операций блокируются на время фоновой задачи
+        self.action_buttons = []
+        for text, command in (("Создать резервную копию", self.create_backup),
+                              ("Проверить изменения", self.check_changes),
+                              ("Восстановить из резервной копии", self.restore_backup),
+                              ("Сбросить настройки", self.reset_settings)):
+            button = ttk.Button(action_frame, text=text, command=command)
+            button.pack(side=tk.LEFT, padx=10)
+            self.action_buttons.append(button)
+
+        # Фрейм хода выполнения: прогресс, скорость и отмена
+        progress_frame = tk.Frame(self.root, bg="#1e1e1e")
+        progress_frame.pack(padx=20, fill=tk.X)
+
+        self.progress_bar = ttk.Progressbar(progress_frame, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(progress_frame, text="Отмена", command=self.cancel_job, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT, padx=10)
+        tk.Label(self.root, textvariable=self.progress_text, bg="#1e1e1e", fg="white").pack(padx=20, anchor="w")
 
         # Фрейм для лога операций
         log_frame = tk.Frame(self.root, bg="#2d2d2d")
@@ -96,7 +151,8 @@ class BackupStorage:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
         # Кнопка выхода
-        ttk.Button(self.root, text="Выход", command=self.root.quit).pack(pady=10)
+        ttk.Button(self.root, text="Выход", command=self.close).pack(pady=10)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def update_source_browse(self):
         """Обновляет текст метки в зависимости от выбранного типа"""
@@ -123,47 +179,110 @@ class BackupStorage:
             self.backup_path.set(path)
             self.log_operation(f"Выбрана резервная директория: {path}")
 
-    def calculate_file_hash(self, file_path):
-        """Вычисляет хеш файла для отслеживания изменений"""
-        hasher = hashlib.md5()
-        try:
-            with open(file_path, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        except Exception as e:
-            self.log_operation(f"Ошибка вычисления хеша {file_path}: {e}")
-            return None
-
     def log_operation(self, message):
-        """Добавляет запись в лог операций"""
+        """Добавляет запись в лог операций (в окно - пачкой при следующем простое)"""
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
-        self.log_text.insert(tk.END, log_message)
-        self.log_text.see(tk.END)
+        self._log_buffer.append(f"[{timestamp}] {message}\n")
+        if self._log_flush_id is None:
+            self._log_flush_id = self.root.after_idle(self._flush_log)
 
         # Логируем через логгер
         self.logger.log_system_event(message)
 
+    def _flush_log(self):
+        """Одна вставка в текстовое поле на пачку сообщений"""
+        self._log_flush_id = None
+        if not self._log_buffer:
+            return
+        self.log_text.insert(tk.END, "".join(self._log_buffer))
+        self._log_buffer.clear()
+
+        lines = int(self.log_text.index("end-1c").split(".")[0])
+        if lines > MAX_LOG_LINES:
+            self.log_text.delete("1.0", f"{lines - MAX_LOG_LINES + 1}.0")
+        self.log_text.see(tk.END)
+
+    # ---------- Фоновые задачи ----------
+
+    def _start_job(self, func, *args, on_done, on_error, **kwargs):
+        """Запускает операцию сервиса в фоновом потоке и блокирует кнопки до ее завершения"""
+        for button in self.action_buttons:
+            button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate", value=0, maximum=1)
+        self.progress_text.set("")
+        self._pending_progress = None
+
+        def finished(handler):
+            def callback(payload):
+                self._job_finished()
+                handler(payload)
+                if self._quit_after_job:
+                    self.root.quit()
+            return callback
+
+        self.jobs.start(func, *args, on_done=finished(on_done), on_error=finished(on_error),
+                        on_batch=self._apply_progress, **kwargs)
+
+    def _job_finished(self):
+        for button in self.action_buttons:
+            button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.progress_bar.stop()
+        self._flush_log()
+
+    def cancel_job(self):
+        """Отмена текущей операции: обрабатываемые файлы дописываются, новые не начинаются"""
+        if not self.jobs.busy:
+            return
+        self.service.cancel()
+        self.cancel_button.configure(state=tk.DISABLED)
+        self.log_operation("Отмена операции...")
+
+    def _apply_progress(self):
+        """Обновляет индикатор по последнему событию хода работы из пачки"""
+        progress = self._pending_progress
+        if progress is None:
+            return
+        self._pending_progress = None
+
+        total = progress["total"] or progress["found"]
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate", maximum=total, value=progress["files"])
+        elif str(self.progress_bar["mode"]) != "indeterminate":
+            # Общее количество файлов неизвестно (проверка изменений) - бегущий индикатор
+            self.progress_bar.configure(mode="indeterminate")
+            self.progress_bar.start(50)
+
+        of_total = f" из {progress['total']}" if progress["total"] else ""
+        self.progress_text.set(f"Файлов: {progress['files']}{of_total}   "
+                               f"{progress['files_per_sec']} файл/с   {progress['mb_per_sec']} МБ/с")
+
+    def close(self):
+        """Закрытие окна; выполняющаяся операция сначала отменяется на границе файла"""
+        if self.jobs.busy:
+            if not messagebox.askyesno("Выход", "Операция еще выполняется. Отменить ее и выйти?"):
+                return
+            self._quit_after_job = True
+            self.cancel_job()
+            return
+        self.jobs.shutdown()
+        self.root.quit()
+
     def create_backup(self):
         """Оптимизированное создание резервной копии"""
         # Валидация входных данных
         if not self._validate_backup_inputs():
             return
 
-        try:
-            source_path = self.source_path.get()
-            backup_dir = self.backup_path.get()
-            key = self.encryption_key.get()
-
-            # Выполняем резервное копирование
-            backed_up_count = self._execute_backup(source_path, backup_dir, key)
-
-            # Показываем результат
-            self._show_backup_result(backed_up_count)
+        source_path = self.source_path.get()
+        backup_dir = self.backup_path.get()
+        key = self.encryption_key.get()
 
-        except Exception as e:
-            self._handle_backup_error(e)
+        # Выполняем резервное копирование в фоне, результат покажет _on_backup_done
+        self._execute_backup(source_path, backup_dir, key)
 
     def _validate_backup_inputs(self):
         """Проверка корректности входных данных"""
@@ -197,94 +316,52 @@ class BackupStorage:
         return True
 
     def _execute_backup(self, source_path, backup_dir, key):
-        """Выполнение резервного копирования"""
-        self.logger.log_system_event(f"Starting backup: {source_path} -> {backup_dir}")
-
-        if self.is_directory.get():
-            return self._backup_directory(source_path, backup_dir, key)
+        """Запуск резервного копирования в фоновом потоке"""
+        self._start_job(
+            self.service.backup, source_path, backup_dir, key,
+            workers=self._get_workers(),
+            paranoid=self.paranoid_mode.get(),
+            algorithm=self.hash_algorithm.get(),
+            use_chunk_store=self.use_chunk_store.get(),
+            compression=self.compression.get(),
+            on_done=self._on_backup_done,
+            on_error=self._handle_backup_error,
+        )
+
+    def _on_backup_done(self, result):
+        if result["cancelled"]:
+            messagebox.showinfo("Отмена", f"Резервное копирование отменено. Обработано файлов: {result['files']}")
         else:
-            return self._backup_single_file(source_path, backup_dir, key)
-
-    def _backup_directory(self, source_dir, backup_dir, key):
-        """Оптимизированное резервное копирование директории"""
-        backed_up_count = 0
-        # Создаем папку с именем файла (без расширения)
-        filename = os.path.basename(source_dir)
-        filename_without_ext = os.path.splitext(filename)[0]
-        file_backup_dir = os.path.join(backup_dir, filename_without_ext)
-        os.makedirs(file_backup_dir, exist_ok=True)
-
-        for root, dirs, files in os.walk(source_dir):
-            rel_path = os.path.relpath(root, source_dir)
-            backup_subdir = os.path.join(backup_dir, rel_path)
-            os.makedirs(backup_subdir, exist_ok=True)
-
-            for file in files:
-                source_file = os.path.join(root, file)
-                encrypted_file = os.path.join(backup_subdir, file + '.enc')
-
-                if self._process_file_backup(source_file, encrypted_file, key):
-                    backed_up_count += 1
-
-        self.log_operation(f"Резервное копирование директории завершено. Обработано файлов: {backed_up_count}")
-        self.logger.log_system_event(f"Directory backup completed. Files: {backed_up_count}")
-
-        return backed_up_count
-
-    def _backup_single_file(self, source_file, backup_dir, key):
-        """Оптимизированное резервное копирование отдельного файла с собственной папкой"""
-        filename = os.path.basename(source_file)
-        filename_without_ext = os.path.splitext(filename)[0]
-
-        # Создаем папку с именем файла (без расширения)
-        file_backup_dir = os.path.join(backup_dir, filename_without_ext)
-        os.makedirs(file_backup_dir, exist_ok=True)
-
-        # Шифрованный файл сохраняем в папке с именем файла
-        encrypted_file = os.path.join(file_backup_dir, filename + '.enc')
-
-        success = self._process_file_backup(source_file, encrypted_file, key)
-
-        if success:
-            self.log_operation(f"Файл зашифрован и сохранен в папке: {filename_without_ext}")
-            return 1
-        return 0
-
-    def _process_file_backup(self, source_file, encrypted_file, key):
-        """
-        Универсальная обработка файла для резервного копирования
-        Возвращает True если файл был обработан успешно
-        """
-        # Проверка изменений через хеш
-        current_hash = self.calculate_file_hash(source_file)
-        if source_file in self.file_hashes and self.file_hashes[source_file] == current_hash:
-            return False  # Файл не изменился
+            self._show_backup_result(result["files"])
 
+    def _get_workers(self):
+        """Количество потоков шифрования из настроек"""
         try:
-            # Шифрование файла
-            encrypt_file(source_file, encrypted_file, key)
-
-            # Обновление хеша и логирование
-            self.file_hashes[source_file] = current_hash
-            filename = os.path.basename(source_file)
-
-            self.logger.log_file_operation("System", "Backup", filename, True)
-            return True
-
-        except Exception as e:
-            error_msg = f"Ошибка шифрования {os.path.basename(source_file)}: {e}"
-            self.log_operation(error_msg)
-            self.logger.log_file_operation("System", "Backup", os.path.basename(source_file), False)
-            return False
+            return max(1, int(self.workers.get()))
+        except (tk.TclError, ValueError):
+            return os.cpu_count() or 1
+
+    def _on_service_event(self, event):
+        """Обработка событий BackupService в главном потоке: журнал операций и ход работы"""
+        if event["event"] == "progress":
+            self._pending_progress = event
+        elif event["event"] == "stage":
+            self.log_operation(f"Стадия {event['stage']}: файлов {event['files']}, "
+                               f"{event['files_per_sec']} файл/с, {event['mb_per_sec']} МБ/с")
+        elif event["event"] == "store":
+            mb = 1024 * 1024
+            self.log_operation(f"Новых блоков: {event['new_chunks']} ({event['new_bytes'] / mb:.1f} МБ), "
+                               f"повторно использовано: {event['reused_chunks']} "
+                               f"({event['reused_bytes'] / mb:.1f} МБ)")
+        elif "message" in event:
+            self.log_operation(event["message"])
 
     def _show_backup_result(self, backed_up_count):
         """Отображение результата резервного копирования"""
         if backed_up_count > 0:
             messagebox.showinfo("Успех", f"Резервное копирование завершено! Обработано файлов: {backed_up_count}")
-            self.logger.log_system_event(f"Backup completed successfully. Files: {backed_up_count}")
         else:
             messagebox.showinfo("Инфо", "Не найдено новых или измененных файлов для резервного копирования")
-            self.logger.log_system_event("No new or modified files found for backup")
 
     def _handle_backup_error(self, error):
         """Обработка ошибок резервного копирования"""
@@ -300,50 +377,43 @@ class BackupStorage:
             self.logger.log_error("Check Changes Error", "Source path not selected")
             return
 
-        changed_files = []
-        try:
-            self.logger.log_system_event(f"Checking for changes in: {source}")
-
-            if self.is_directory.get():
-                if not os.path.isdir(source):
-                    messagebox.showerror("Ошибка", "Указанный путь не является папкой!")
-                    self.logger.log_error("Check Changes Error", f"Path is not a directory: {source}")
-                    return
-                for root, dirs, files in os.walk(source):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        self._check_file_changes(file_path, changed_files)
-            else:
-                if not os.path.isfile(source):
-                    messagebox.showerror("Ошибка", "Указанный путь не является файлом!")
-                    self.logger.log_error("Check Changes Error", f"Path is not a file: {source}")
-                    return
-                self._check_file_changes(source, changed_files)
-
-            if changed_files:
-                self.log_operation(f"Обнаружены изменения в файлах: {', '.join(changed_files)}")
-                messagebox.showinfo("Проверка изменений", f"Обнаружены изменения в {len(changed_files)} файлах")
-                self.logger.log_system_event(f"Changes detected in {len(changed_files)} files")
-            else:
-                self.log_operation("Изменений не обнаружено")
-                messagebox.showinfo("Проверка изменений", "Изменений не обнаружено")
-                self.logger.log_system_event("No changes detected")
-
-        except Exception as e:
-            error_msg = f"Ошибка при проверке изменений: {e}"
-            messagebox.showerror("Ошибка", error_msg)
-            self.logger.log_error("Check Changes Error", str(e))
+        # Сравнение идет с индексом хешей, сохраненным в резервной директории
+        backup_dir = self.backup_path.get()
+        if not backup_dir:
+            messagebox.showerror("Ошибка", "Укажите резервную директорию!")
+            self.logger.log_error("Check Changes Error", "Backup directory not specified")
+            return
 
-    def _check_file_changes(self, file_path, changed_files):
-        """Проверяет изменения в отдельном файле"""
-        current_hash = self.calculate_file_hash(file_path)
-        filename = os.path.basename(file_path)
+        if self.is_directory.get() and not os.path.isdir(source):
+            messagebox.showerror("Ошибка", "Указанный путь не является папкой!")
+            self.logger.log_error("Check Changes Error", f"Path is not a directory: {source}")
+            return
+        if not self.is_directory.get() and not os.path.isfile(source):
+            messagebox.showerror("Ошибка", "Указанный путь не является файлом!")
+            self.logger.log_error("Check Changes Error", f"Path is not a file: {source}")
+            return
 
-        if file_path in self.file_hashes:
-            if self.file_hashes[file_path] != current_hash:
-                changed_files.append(filename)
+        self._start_job(self.service.check_changes, source, backup_dir,
+                        paranoid=self.paranoid_mode.get(),
+                        algorithm=self.hash_algorithm.get(),
+                        on_done=self._on_changes_checked,
+                        on_error=self._handle_check_error)
+
+    def _on_changes_checked(self, changed_files):
+        if self.service.cancelled:
+            messagebox.showinfo("Проверка изменений", "Проверка изменений отменена")
+        elif changed_files:
+            names = ", ".join(os.path.basename(path) for path in changed_files)
+            self.log_operation(f"Обнаружены изменения в файлах: {names}")
+            messagebox.showinfo("Проверка изменений", f"Обнаружены изменения в {len(changed_files)} файлах")
         else:
-            changed_files.append(filename)
+            self.log_operation("Изменений не обнаружено")
+            messagebox.showinfo("Проверка изменений", "Изменений не обнаружено")
+
+    def _handle_check_error(self, error):
+        error_msg = f"Ошибка при проверке изменений: {error}"
+        messagebox.showerror("Ошибка", error_msg)
+        self.logger.log_error("Check Changes Error", str(error))
 
     def restore_backup(self):
         """Расшифровывает файлы из резервной копии и восстанавливает в указанное место"""
@@ -364,66 +434,36 @@ class BackupStorage:
             self.logger.log_error("Restore Error", "Encryption key not provided")
             return
 
-        try:
-            restored_count = 0
-            self.logger.log_system_event(f"Starting restore: {backup_dir} -> {restore_path}")
-
-            # Восстанавливаем всю резервную директорию
-            if os.path.isdir(backup_dir):
-                for root, dirs, files in os.walk(backup_dir):
-                    rel_path = os.path.relpath(root, backup_dir)
-                    restore_subdir = os.path.join(restore_path, rel_path)
-                    os.makedirs(restore_subdir, exist_ok=True)
-
-                    for file in files:
-                        if file.endswith('.enc'):
-                            encrypted_file = os.path.join(root, file)
-                            original_filename = file[:-4]  # Убираем .enc
-                            restored_file = os.path.join(restore_subdir, original_filename)
-
-                            try:
-                                decrypt_file(encrypted_file, restored_file, key)
-                                restored_count += 1
-                                self.log_operation(f"Восстановлен: {original_filename}")
-                                self.logger.log_file_operation("System", "Restore", original_filename, True)
-                            except Exception as e:
-                                error_msg = f"Ошибка восстановления {file}: {e}"
-                                self.log_operation(error_msg)
-                                self.logger.log_file_operation("System", "Restore", original_filename, False)
-                                continue
-
-            # Восстанавливаем отдельный зашифрованный файл
-            elif os.path.isfile(backup_dir) and backup_dir.endswith('.enc'):
-                original_filename = os.path.basename(backup_dir)[:-4]
-                restored_file = os.path.join(restore_path, original_filename)
-
-                decrypt_file(backup_dir, restored_file, key)
-                restored_count = 1
-                self.log_operation(f"Восстановлен: {original_filename}")
-                self.logger.log_file_operation("System", "Restore", original_filename, True)
-
-            if restored_count > 0:
-                messagebox.showinfo("Успех", f"Восстановление завершено! Восстановлено файлов: {restored_count}")
-                self.log_operation(f"Восстановление завершено. Файлов: {restored_count}")
-                self.logger.log_system_event(f"Restore completed. Files restored: {restored_count}")
-            else:
-                messagebox.showinfo("Инфо", "Не найдено файлов для восстановления")
-                self.log_operation("Не найдено зашифрованных файлов для восстановления")
-                self.logger.log_system_event("No encrypted files found for restore")
-
-        except Exception as e:
-            error_msg = f"Ошибка при восстановлении: {e}"
-            messagebox.showerror("Ошибка", error_msg)
-            self.log_operation(error_msg)
-            self.logger.log_error("Restore Error", str(e))
+        patterns = [pattern.strip() for pattern in self.restore_filter.get().split(",") if pattern.strip()]
+        self._start_job(self.service.restore, backup_dir, restore_path, key,
+                        patterns=patterns or None, workers=self._get_workers(),
+                        on_done=self._on_restore_done, on_error=self._handle_restore_error)
+
+    def _on_restore_done(self, result):
+        if result["cancelled"]:
+            messagebox.showinfo("Отмена", f"Восстановление отменено. Восстановлено файлов: {result['files']}")
+        elif result["files"] > 0 or result["skipped"]:
+            skipped = f", пропущено ранее восстановленных: {result['skipped']}" if result["skipped"] else ""
+            messagebox.showinfo("Успех", f"Восстановление завершено! Восстановлено файлов: {result['files']}{skipped}")
+        else:
+            messagebox.showinfo("Инфо", "Не найдено файлов для восстановления")
+
+    def _handle_restore_error(self, error):
+        error_msg = f"Ошибка при восстановлении: {error}"
+        messagebox.showerror("Ошибка", error_msg)
+        self.log_operation(error_msg)
+        self.logger.log_error("Restore Error", str(error))
 
     def reset_settings(self):
         """Сброс всех настроек и полей"""
         self.source_path.set("")
         self.backup_path.set("")
         self.encryption_key.set("")
-        self.file_hashes.clear()
+        self.restore_filter.set("")
+        self._log_buffer.clear()
         self.log_text.delete(1.0, tk.END)
+        self.progress_bar.configure(value=0)
+        self.progress_text.set("")
         self.log_operation("Настройки сброшены")
         messagebox.showinfo("Сброс", "Все настройки успешно сброшены!")
         self.logger.log_system_event("Settings reset")
@@ -0,0 +1,89 @@
+# job_runner.py
+import queue
+import threading
+
+_RESULT = "__result__"  # Служебные события завершения задачи
+_ERROR = "__error__"
+
+
+class JobRunner:
+    """
+    Выполняет длительную операцию в фоновом потоке, не блокируя окно Tk.
+    События операции (post) попадают в потокобезопасную очередь, которую главный поток
+    разбирает по таймеру root.after пачками не больше max_batch.
+    Обработчики on_event, on_done и on_error вызываются только в главном потоке.
+    """
+
+    def __init__(self, root, on_event, poll_ms=100, max_batch=500):
+        self.root = root
+        self.on_event = on_event
+        self.poll_ms = poll_ms
+        self.max_batch = max_batch
+        self._events = queue.Queue()
+        self._thread = None
+        self._after_id = None
+        self._on_done = None
+        self._on_error = None
+        self._on_batch = None
+
+    @property
+    def busy(self):
+        return self._thread is not None
+
+    def post(self, event):
+        """Передает событие в главный поток (вызывается из любого потока)"""
+        self._events.put(event)
+
+    def start(self, func, *args, on_done=None, on_error=None, on_batch=None, **kwargs):
+        """Запускает func(*args, **kwargs) в фоновом потоке; одновременно выполняется одна задача"""
+        if self.busy:
+            raise RuntimeError("Операция уже выполняется")
+        self._on_done = on_done
+        self._on_error = on_error
+        self._on_batch = on_batch
+
+        def target():
+            try:
+                self._events.put((_RESULT, func(*args, **kwargs)))
+            except Exception as e:
+                self._events.put((_ERROR, e))
+
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        self._after_id = self.root.after(self.poll_ms, self._drain)
+
+    def _drain(self):
+        """Разбирает накопившиеся события; повторно планируется, пока задача не завершится"""
+        self._after_id = None
+        finished = None
+        for _ in range(self.max_batch):
+            try:
+                event = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, tuple) and event[0] in (_RESULT, _ERROR):
+                finished = event
+                break
+            self.on_event(event)
+
+        if self._on_batch is not None:
+            self._on_batch()
+
+        if finished is None:
+            self._after_id = self.root.after(self.poll_ms, self._drain)
+            return
+
+        # Результат кладется в очередь последним, поэтому все события задачи уже обработаны
+        self._thread.join()
+        self._thread = None
+        kind, payload = finished
+        if kind == _RESULT and self._on_done is not None:
+            self._on_done(payload)
+        elif kind == _ERROR and self._on_error is not None:
+            self._on_error(payload)
+
+    def shutdown(self):
+        """Останавливает разбор событий (при закрытии окна)"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
@@ -0,0 +1,309 @@
+# log_reader.py
+import os
+import re
+import gzip
+import time
+import struct
+import threading
+from collections import deque
+
+TAIL_BLOCK_SIZE = 64 * 1024
+INDEX_READ_RECORDS = 4096  # Записей индекса, читаемых за раз при просмотре
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"LGIX\x01"
+
+# Типы событий журнала (graph.logger) и их коды в индексе; 0 - прочие строки
+EVENT_TYPES = ("AUTH_ATTEMPT", "USER_LOGIN", "USER_LOGOUT", "REGISTRATION", "ADMIN_ACTION",
+               "USER_ACTION", "FILE_OPERATION", "ERROR", "SYSTEM_EVENT")
+EVENT_CODES = {event: code for code, event in enumerate(EVENT_TYPES, 1)}
+
+# Заголовок индекса: магия, размер проиндексированной части журнала, первые байты журнала
+# (по ним видно, что журнал очищен или заменен). Запись: смещение строки, время (секунды), код события
+_HEAD_SIZE = 32
+_INDEX_HEADER = struct.Struct(f">5sQ{_HEAD_SIZE}s")
+_RECORD = struct.Struct(">QIB")
+
+_TIMESTAMP_LENGTH = len("2025-01-01 00:00:00")
+
+# Ротированные сегменты журнала: <журнал>.<время ротации>[-n][.gz]
+SEGMENT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+
+def tail_lines(path, lines=50, block_size=TAIL_BLOCK_SIZE):
+    """
+    Последние lines строк файла: файл читается блоками от конца,
+    поэтому память и время не зависят от размера журнала
+    """
+    if lines <= 0:
+        return []
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        while position > 0 and newlines <= lines:
+            size = min(block_size, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    data = b"".join(reversed(blocks))
+    result = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    if position > 0:
+        result = result[1:]  # Первая строка блока может быть неполной
+    return result[-lines:]
+
+
+def parse_timestamp(line):
+    """Время строки журнала ('%Y-%m-%d %H:%M:%S' в начале) в секундах; None для строк продолжения"""
+    if len(line) < _TIMESTAMP_LENGTH or line[4:5] != b"-" or line[13:14] != b":":
+        return None
+    try:
+        return int(time.mktime((int(line[0:4]), int(line[5:7]), int(line[8:10]),
+                                int(line[11:13]), int(line[14:16]), int(line[17:19]), 0, 0, -1)))
+    except ValueError:
+        return None
+
+
+def parse_event(line):
+    """Код типа события строки: '... - LEVEL - EVENT_TYPE - ...'"""
+    parts = line.split(b" - ", 3)
+    if len(parts) < 3:
+        return 0
+    return EVENT_CODES.get(parts[2].decode("ascii", errors="replace").split(" ", 1)[0], 0)
+
+
+def segment_path(log_file, rotated_at):
+    """Имя сегмента для журнала, ротированного в rotated_at; при совпадении секунды - с номером после последнего"""
+    stamp = time.strftime(SEGMENT_TIME_FORMAT, time.localtime(rotated_at))
+    taken = [n for existing, n in _segment_keys(log_file) if existing == stamp]
+    if not taken:
+        return f"{log_file}.{stamp}"
+    return f"{log_file}.{stamp}-{max(taken) + 1}"
+
+
+def _segment_keys(log_file):
+    """{(время ротации строкой, номер): путь} ротированных сегментов"""
+    directory = os.path.dirname(log_file) or "."
+    pattern = re.compile(re.escape(os.path.basename(log_file)) + r"\.(\d{8}-\d{6})(-\d+)?(\.gz)?$")
+    segments = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return segments
+    for name in names:
+        match = pattern.match(name)
+        if match is None:
+            continue
+        stamp, suffix, compressed = match.groups()
+        key = (stamp, int(suffix[1:]) if suffix else 0)
+        if key in segments and compressed:
+            continue
+        segments[key] = os.path.join(directory, name)
+    return segments
+
+
+def list_segments(log_file):
+    """
+    Ротированные сегменты журнала от старых к новым: [(время ротации, путь)].
+    Сегмент, который сейчас сжимается, берется в несжатом виде
+    """
+    segments = _segment_keys(log_file)
+    return [(time.mktime(time.strptime(stamp, SEGMENT_TIME_FORMAT)), segments[(stamp, n)])
+            for stamp, n in sorted(segments)]
+
+
+def iter_records(path):
+    """Записи сегмента (сжатого или нет) в порядке записи: строка с временем и ее строки продолжения"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        record = []
+        for line in f:
+            if parse_timestamp(line) is not None and record:
+                yield b"".join(record)
+                record = []
+            record.append(line)
+        if record:
+            yield b"".join(record)
+
+
+def search_segments(log_file, since=None, until=None, event=None, limit=None):
+    """
+    Записи ротированных сегментов за [since, until) с типом event; при limit - последние limit.
+    Сегменты вне периода пропускаются без чтения (период сегмента - между соседними ротациями),
+    подходящие читаются потоково, память ограничена limit
+    """
+    since, until = _to_seconds(since), _to_seconds(until)
+    code = EVENT_CODES.get(event, -1) if event is not None else None
+    if code == -1 or limit == 0:
+        return []
+
+    segments = list_segments(log_file)
+    bounds = [(segments[i - 1][0] if i else None, rotated_at, path)
+              for i, (rotated_at, path) in enumerate(segments)]
+    bounds = [(start, end, path) for start, end, path in bounds
+              if (since is None or end >= since) and (until is None or start is None or start < until)]
+
+    result = deque()
+    # С limit нужны последние записи: сегменты просматриваются от новых к старым
+    for _, _, path in reversed(bounds):
+        found = deque(maxlen=None if limit is None else limit - len(result))
+        try:
+            for record in iter_records(path):
+                timestamp = parse_timestamp(record)
+                if timestamp is None and (since is not None or until is not None):
+                    continue
+                if since is not None and timestamp < since or until is not None and timestamp >= until:
+                    continue
+                if code is not None and parse_event(record) != code:
+                    continue
+                found.append(record.decode("utf-8", errors="replace"))
+        except FileNotFoundError:
+            continue  # Сегмент удален политикой хранения во время чтения
+        result.extendleft(reversed(found))
+        if limit is not None and len(result) >= limit:
+            break
+    return list(result)
+
+
+def tail_segments(log_file, lines):
+    """Последние lines строк ротированных сегментов (для продолжения tail_lines текущего журнала)"""
+    result = deque()
+    for _, path in reversed(list_segments(log_file)):
+        if len(result) >= lines:
+            break
+        found = deque(maxlen=lines - len(result))
+        try:
+            opener = gzip.open if path.endswith(".gz") else open
+            with opener(path, "rb") as f:
+                for line in f:
+                    found.append(line.decode("utf-8", errors="replace"))
+        except FileNotFoundError:
+            continue
+        result.extendleft(reversed(found))
+    return list(result)
+
+
+def _to_seconds(value):
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return int(value.timestamp())
+    return int(value)
+
+
+class LogIndex:
+    """
+    Разреженный индекс журнала рядом с ним (<журнал>.idx): для каждой записи - смещение,
+    время и тип события фиксированными записями. Поиск по времени - двоичный по файлу индекса,
+    по типу - просмотр 13-байтовых записей вместо разбора текста; строки журнала читаются по смещениям.
+    Индекс дописывается по мере роста журнала и перестраивается, если журнал очищен или заменен
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.path = log_file + INDEX_SUFFIX
+        self._lock = threading.Lock()
+
+    def _read_header(self, f):
+        header = f.read(_INDEX_HEADER.size)
+        if len(header) < _INDEX_HEADER.size:
+            return None
+        magic, covered, head = _INDEX_HEADER.unpack(header)
+        return (covered, head) if magic == INDEX_MAGIC else None
+
+    def update(self):
+        """Дописывает в индекс записи, появившиеся в журнале; возвращает число записей индекса"""
+        with self._lock:
+            with open(self.log_file, "rb") as log:
+                head = log.read(_HEAD_SIZE).ljust(_HEAD_SIZE, b"\0")
+                log_size = os.fstat(log.fileno()).st_size
+
+                covered = 0
+                mode = "r+b" if os.path.exists(self.path) else "w+b"
+                with open(self.path, mode) as index:
+                    state = self._read_header(index)
+                    if state is not None:
+                        covered, indexed_head = state
+                        # Журнал очищен или начат заново - старые смещения недействительны
+                        compared = min(covered, _HEAD_SIZE)
+                        if covered > log_size or indexed_head[:compared] != head[:compared]:
+                            covered = 0
+                    if covered == 0:
+                        index.truncate(0)
+                    index.seek(0, os.SEEK_END)
+                    if index.tell() < _INDEX_HEADER.size:
+                        index.seek(_INDEX_HEADER.size)
+                    # Обрезаем возможную недописанную запись
+                    records_size = index.tell() - _INDEX_HEADER.size
+                    index.truncate(_INDEX_HEADER.size + records_size - records_size % _RECORD.size)
+                    index.seek(0, os.SEEK_END)
+
+                    log.seek(covered)
+                    offset = covered
+                    batch = []
+                    for line in log:
+                        if not line.endswith(b"\n"):
+                            break  # Недописанная строка - проиндексируем в следующий раз
+                        timestamp = parse_timestamp(line)
+                        if timestamp is not None:
+                            batch.append(_RECORD.pack(offset, timestamp, parse_event(line)))
+                        offset += len(line)
+                    index.write(b"".join(batch))
+
+                    index.seek(0)
+                    index.write(_INDEX_HEADER.pack(INDEX_MAGIC, offset, head))
+                    return (index.seek(0, os.SEEK_END) - _INDEX_HEADER.size) // _RECORD.size
+
+    def _record(self, index, position):
+        index.seek(_INDEX_HEADER.size + position * _RECORD.size)
+        return _RECORD.unpack(index.read(_RECORD.size))
+
+    def _first_at_or_after(self, index, count, timestamp):
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(index, middle)[1] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, since=None, until=None, event=None, limit=None):
+        """
+        Строки журнала за [since, until) (datetime или секунды) с типом event;
+        при limit - последние limit подходящих строк
+        """
+        count = self.update()
+        since, until = _to_seconds(since), _to_seconds(until)
+        code = EVENT_CODES.get(event, -1) if event is not None else None
+        if code == -1:
+            return []
+
+        with open(self.path, "rb") as index:
+            covered, _ = self._read_header(index)
+            start = self._first_at_or_after(index, count, since) if since is not None else 0
+            end = self._first_at_or_after(index, count, until) if until is not None else count
+            # Запись заканчивается там, где начинается следующая (строки продолжения входят в нее)
+            next_offset = self._record(index, end)[0] if end < count else covered
+
+            # Записи просматриваются с конца блоками, чтобы limit давал последние строки
+            matches = []
+            while end > start and (limit is None or len(matches) < limit):
+                block_start = max(start, end - INDEX_READ_RECORDS)
+                index.seek(_INDEX_HEADER.size + block_start * _RECORD.size)
+                records = list(_RECORD.iter_unpack(index.read((end - block_start) * _RECORD.size)))
+                for offset, _, record_code in reversed(records):
+                    if code is None or record_code == code:
+                        matches.append((offset, next_offset - offset))
+                        if limit is not None and len(matches) >= limit:
+                            break
+                    next_offset = offset
+                end = block_start
+
+        lines = []
+        with open(self.log_file, "rb") as log:
+            for offset, length in reversed(matches):
+                log.seek(offset)
+                lines.append(log.read(length).decode("utf-8", errors="replace"))
+        return lines
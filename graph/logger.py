@@ -1,14 +1,260 @@
+import atexit
+import gzip
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
 from typing import Optional
 
+from .audit_log import AuditLog, AuditHandler, AUDIT_FILENAME
+from .log_reader import (LogIndex, tail_lines, tail_segments, search_segments, list_segments,
+                         segment_path, parse_timestamp)
+
+BATCH_SIZE = 256          # Записей, которые пишутся в файл одной операцией
+FLUSH_INTERVAL = 0.5      # Не дольше стольких секунд запись остается в буфере
+
+MAX_LOG_BYTES = 10 * 1024 * 1024  # Размер, после которого журнал ротируется
+ROTATE_INTERVAL = 24 * 3600       # Возраст журнала (секунд от первой записи), после которого он ротируется
+BACKUP_COUNT = 30                 # Сколько ротированных сегментов хранить
+MAX_AGE_DAYS = 90                 # Сегменты старше удаляются
+
+# Выборка по типам событий: N - в журнал попадает каждое N-е успешное событие, 0 - ни одного.
+# Неудачные операции пишутся всегда, пропущенные события сводятся в итоговую запись (flush_sampled)
+DEFAULT_SAMPLING = {}
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """Ставит запись в очередь без форматирования: сообщение собирается в потоке записи"""
+    
+    def prepare(self, record):
+        return record
+
+
+class _BatchFileHandler(logging.FileHandler):
+    """Файловый обработчик, который копит строки и пишет их пачкой"""
+    
+    def __init__(self, filename, batch_size=BATCH_SIZE, encoding='utf-8'):
+        super().__init__(filename, encoding=encoding)
+        self.batch_size = batch_size
+        self._batch = []
+    
+    def emit(self, record):
+        try:
+            self._batch.append(self.format(record) + self.terminator)
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self):
+        self.acquire()
+        try:
+            self._write_batch()
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+    
+    def _write_batch(self):
+        if self._batch:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write("".join(self._batch))
+            self._batch.clear()
+
+
+class _SegmentCompressor:
+    """Фоновый поток: сжимает ротированные сегменты gzip и удаляет лишние по политике хранения"""
+    
+    def __init__(self, log_file, backup_count=BACKUP_COUNT, max_age_days=MAX_AGE_DAYS):
+        self.log_file = log_file
+        self.backup_count = backup_count
+        self.max_age_days = max_age_days
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="log-compressor", daemon=True)
+        self._thread.start()
+    
+    def submit(self, path):
+        self._queue.put(path)
+    
+    def close(self):
+        """Дожидается сжатия поставленных сегментов"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+    
+    def _run(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                if path:
+                    self._compress(path)
+                self._apply_retention()
+            except OSError:
+                pass  # Сегмент останется несжатым и будет подхвачен при следующем запуске
+    
+    @staticmethod
+    def _compress(path):
+        if not os.path.exists(path):
+            return
+        tmp_path = path + ".gz.part"
+        with open(path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(tmp_path, path + ".gz")
+        os.remove(path)
+    
+    def _apply_retention(self):
+        segments = list_segments(self.log_file)
+        expired = len(segments) - self.backup_count if self.backup_count else 0
+        oldest_allowed = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        for position, (rotated_at, path) in enumerate(segments):
+            if position < expired or oldest_allowed is not None and rotated_at < oldest_allowed:
+                os.remove(path)
+
+
+class _RotatingBatchFileHandler(_BatchFileHandler):
+    """
+    Пакетная запись с ротацией по размеру и возрасту журнала: журнал переименовывается
+    в сегмент <журнал>.<время>, сжатие и удаление старых сегментов выполняются в фоне
+    """
+    
+    def __init__(self, filename, max_bytes=MAX_LOG_BYTES, interval=ROTATE_INTERVAL,
+                 backup_count=BACKUP_COUNT, max_age_days=MAX_AGE_DAYS, batch_size=BATCH_SIZE):
+        super().__init__(filename, batch_size=batch_size)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.compressor = _SegmentCompressor(self.baseFilename, backup_count, max_age_days)
+        self._started = self._segment_start()
+        # Сегменты, оставшиеся несжатыми после прошлого запуска
+        for _, path in list_segments(self.baseFilename):
+            if not path.endswith(".gz"):
+                self.compressor.submit(path)
+        self.compressor.submit("")  # Проверка политики хранения при запуске
+    
+    def _segment_start(self):
+        """Время первой записи текущего журнала (для ротации по возрасту)"""
+        try:
+            with open(self.baseFilename, "rb") as f:
+                timestamp = parse_timestamp(f.readline())
+            return timestamp if timestamp is not None else os.path.getmtime(self.baseFilename)
+        except OSError:
+            return time.time()
+    
+    def _should_rotate(self):
+        if self.stream is None:
+            return False
+        size = os.fstat(self.stream.fileno()).st_size
+        if not size:
+            return False
+        return (self.max_bytes and size >= self.max_bytes
+                or self.interval and time.time() - self._started >= self.interval)
+    
+    def _write_batch(self):
+        if self._batch and self._should_rotate():
+            self._rotate()
+        super()._write_batch()
+    
+    def _rotate(self):
+        self.stream.close()
+        self.stream = None
+        if os.path.exists(self.baseFilename):
+            rotated = segment_path(self.baseFilename, time.time())
+            os.replace(self.baseFilename, rotated)
+            self.compressor.submit(rotated)
+        self._started = time.time()
+    
+    def rotate(self):
+        """Принудительная ротация: буфер дописывается в текущий журнал, следующая запись - в новый"""
+        self.acquire()
+        try:
+            super()._write_batch()
+            if self.stream is None:
+                self.stream = self._open()
+            self._rotate()
+        finally:
+            self.release()
+    
+    def close(self):
+        super().close()
+        self.compressor.close()
+
+
+class _BatchQueueListener(logging.handlers.QueueListener):
+    """Поток записи журнала: сбрасывает буферы обработчиков, когда очередь опустела"""
+    
+    def __init__(self, log_queue, *handlers, flush_interval=FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+    
+    def dequeue(self, block):
+        while True:
+            try:
+                return self.queue.get(block, self.flush_interval)
+            except queue.Empty:
+                self.flush()
+    
+    def handle(self, record):
+        # Метка flush: все записи перед ней уже переданы обработчикам
+        if isinstance(record, threading.Event):
+            self.flush()
+            record.set()
+            return
+        super().handle(record)
+    
+    def flush(self):
+        # Ошибка сброса одного обработчика (база событий занята, нет места на диске) не должна
+        # останавливать поток записи: записи остаются в буфере обработчика до следующего сброса
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                handler.handleError(logging.makeLogRecord(
+                    {"name": "AppLogger", "msg": "Flush failed: %s", "args": (type(handler).__name__,)}))
+    
+    def stop(self):
+        super().stop()
+        self.flush()
+
+
+def _audit(event, user=None, status=None, operation=None, target=None, details=None, ip=None):
+    """Поля записи для журнала событий (AuditHandler)"""
+    return {"audit": (event, user, status, operation, target, details, ip)}
+
+
 class AppLogger:
-    """Класс для ведения журнала приложения"""
+    """
+    Класс для ведения журнала приложения.
+    Вызовы log_* только ставят запись в очередь: форматирование и запись в файл
+    пачками выполняет отдельный поток (QueueListener)
+    """
     
-    def __init__(self, log_file: str = "logs/app.log"):
+    def __init__(self, log_file: str = "logs/app.log", sampling: Optional[dict] = None,
+                 batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                 max_bytes: int = MAX_LOG_BYTES, rotate_interval: float = ROTATE_INTERVAL,
+                 backup_count: int = BACKUP_COUNT, max_age_days: int = MAX_AGE_DAYS,
+                 audit_file: Optional[str] = None, console: bool = True):
         self.log_file = log_file
+        self.console = console
+        # Структурированный журнал событий рядом с текстовым (graph.audit_log)
+        self.audit_file = audit_file or os.path.join(os.path.dirname(log_file), AUDIT_FILENAME)
+        self.audit = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rotation = {"max_bytes": max_bytes, "interval": rotate_interval,
+                         "backup_count": backup_count, "max_age_days": max_age_days}
+        self.sampling = dict(DEFAULT_SAMPLING if sampling is None else sampling)
+        self._sampled = {}  # тип события -> [всего, записано]
+        self._sampling_lock = threading.Lock()
+        self.listener = None
+        self.index = LogIndex(log_file)
         self.setup_logger()
+        atexit.register(self.close)
     
     def setup_logger(self):
         """Настройка логгера"""
@@ -20,6 +266,12 @@ class AppLogger:
         self.logger.setLevel(logging.INFO)
         
         # Очищаем существующие обработчики
+        if self.listener is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+        for handler in self.logger.handlers:
+            handler.close()
         self.logger.handlers.clear()
         
         # Создаем форматтер
@@ -28,76 +280,180 @@ class AppLogger:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         
-        # Обработчик для файла
-        file_handler = logging.FileHandler(self.log_file, encoding='utf-8')
+        # Обработчик для файла (с ротацией и сжатием старых сегментов)
+        file_handler = _RotatingBatchFileHandler(self.log_file, batch_size=self.batch_size, **self.rotation)
         file_handler.setLevel(logging.INFO)
         file_handler.setFormatter(formatter)
+        self.file_handler = file_handler
         
         # Обработчик для консоли
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel(logging.INFO)
-        console_handler.setFormatter(formatter)
+        handlers = [file_handler]
+        if self.console:
+            console_handler = logging.StreamHandler()
+            console_handler.setLevel(logging.INFO)
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
         
-        # Добавляем обработчики
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Обработчик для журнала событий
+        if self.audit is None:
+            self.audit = AuditLog(self.audit_file)
+        handlers.append(AuditHandler(self.audit, batch_size=self.batch_size))
+        
+        # Логгер пишет только в очередь, обработчики работают в потоке слушателя
+        self.queue = queue.SimpleQueue()
+        self.logger.addHandler(_LazyQueueHandler(self.queue))
+        self.listener = _BatchQueueListener(self.queue, *handlers, flush_interval=self.flush_interval)
+        self.listener.start()
+    
+    def flush(self, timeout: float = 5.0):
+        """Дожидается записи на диск всех поставленных в очередь записей"""
+        if self.listener is not None and self.listener._thread is not None:
+            written = threading.Event()
+            self.queue.put(written)
+            written.wait(timeout)
+    
+    def close(self):
+        """Сводка выборки, запись очереди на диск и остановка потока записи"""
+        self.flush_sampled()
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.audit.close()
+    
+    # ---------- Выборка событий ----------
+    
+    def set_sampling(self, event: str, every: int):
+        """Писать каждое every-е успешное событие типа event (1 - все, 0 - ни одного)"""
+        with self._sampling_lock:
+            self.sampling[event] = every
+    
+    def _sample(self, event: str, success: bool = True) -> bool:
+        """Нужно ли писать событие; неудачные пишутся всегда"""
+        every = self.sampling.get(event)
+        if every is None or every == 1 or not success:
+            return True
+        with self._sampling_lock:
+            counts = self._sampled.setdefault(event, [0, 0])
+            counts[0] += 1
+            if every and counts[0] % every == 1:
+                counts[1] += 1
+                return True
+            return False
+    
+    def flush_sampled(self):
+        """Итоговая запись по событиям, попавшим под выборку, со счетчиками сбрасывается"""
+        with self._sampling_lock:
+            sampled, self._sampled = self._sampled, {}
+        for event, (total, logged) in sampled.items():
+            if total > logged:
+                self.logger.info("SYSTEM_EVENT - Event: Sampled %s, Details: logged %d of %d, IP: localhost",
+                                 event, logged, total,
+                                 extra=_audit("SYSTEM_EVENT", "SYSTEM", operation=f"Sampled {event}",
+                                              details=f"logged {logged} of {total}", ip="localhost"))
     
     def log_auth_attempt(self, username: str, success: bool, ip: str = "localhost"):
         """Логирование попытки авторизации"""
         status = "SUCCESS" if success else "FAILED"
-        self.logger.info(f"AUTH_ATTEMPT - User: {username}, Status: {status}, IP: {ip}")
+        self.logger.info("AUTH_ATTEMPT - User: %s, Status: %s, IP: %s", username, status, ip,
+                         extra=_audit("AUTH_ATTEMPT", username, status, ip=ip))
     
     def log_user_login(self, username: str, user_type: str, ip: str = "localhost"):
         """Логирование успешного входа пользователя"""
-        self.logger.info(f"USER_LOGIN - User: {username}, Type: {user_type}, IP: {ip}")
+        self.logger.info("USER_LOGIN - User: %s, Type: %s, IP: %s", username, user_type, ip,
+                         extra=_audit("USER_LOGIN", username, "SUCCESS", details=user_type, ip=ip))
     
     def log_user_logout(self, username: str, user_type: str, ip: str = "localhost"):
         """Логирование выхода пользователя"""
-        self.logger.info(f"USER_LOGOUT - User: {username}, Type: {user_type}, IP: {ip}")
+        self.logger.info("USER_LOGOUT - User: %s, Type: %s, IP: %s", username, user_type, ip,
+                         extra=_audit("USER_LOGOUT", username, details=user_type, ip=ip))
     
     def log_registration(self, username: str, success: bool, ip: str = "localhost"):
         """Логирование регистрации пользователя"""
         status = "SUCCESS" if success else "FAILED"
-        self.logger.info(f"REGISTRATION - User: {username}, Status: {status}, IP: {ip}")
+        self.logger.info("REGISTRATION - User: %s, Status: %s, IP: %s", username, status, ip,
+                         extra=_audit("REGISTRATION", username, status, ip=ip))
     
     def log_admin_action(self, admin_username: str, action: str, details: str = "", ip: str = "localhost"):
         """Логирование действий администратора"""
-        self.logger.info(f"ADMIN_ACTION - Admin: {admin_username}, Action: {action}, Details: {details}, IP: {ip}")
+        self.logger.info("ADMIN_ACTION - Admin: %s, Action: %s, Details: %s, IP: %s", admin_username, action, details, ip,
+                         extra=_audit("ADMIN_ACTION", admin_username, operation=action, details=details, ip=ip))
     
     def log_user_action(self, username: str, action: str, details: str = "", ip: str = "localhost"):
         """Логирование действий пользователя"""
-        self.logger.info(f"USER_ACTION - User: {username}, Action: {action}, Details: {details}, IP: {ip}")
+        self.logger.info("USER_ACTION - User: %s, Action: %s, Details: %s, IP: %s", username, action, details, ip,
+                         extra=_audit("USER_ACTION", username, operation=action, details=details, ip=ip))
     
     def log_file_operation(self, username: str, operation: str, filename: str, success: bool, ip: str = "localhost"):
         """Логирование операций с файлами"""
+        if not self._sample("FILE_OPERATION", success):
+            return
         status = "SUCCESS" if success else "FAILED"
-        self.logger.info(f"FILE_OPERATION - User: {username}, Operation: {operation}, File: {filename}, Status: {status}, IP: {ip}")
+        self.logger.info("FILE_OPERATION - User: %s, Operation: %s, File: %s, Status: %s, IP: %s",
+                         username, operation, filename, status, ip,
+                         extra=_audit("FILE_OPERATION", username, status, operation, filename, ip=ip))
     
     def log_error(self, error_type: str, error_message: str, username: str = "SYSTEM", ip: str = "localhost"):
         """Логирование ошибок"""
-        self.logger.error(f"ERROR - Type: {error_type}, Message: {error_message}, User: {username}, IP: {ip}")
+        self.logger.error("ERROR - Type: %s, Message: %s, User: %s, IP: %s", error_type, error_message, username, ip,
+                          extra=_audit("ERROR", username, "FAILED", error_type, details=error_message, ip=ip))
     
     def log_system_event(self, event: str, details: str = "", ip: str = "localhost"):
         """Логирование системных событий"""
-        self.logger.info(f"SYSTEM_EVENT - Event: {event}, Details: {details}, IP: {ip}")
+        if not self._sample("SYSTEM_EVENT"):
+            return
+        self.logger.info("SYSTEM_EVENT - Event: %s, Details: %s, IP: %s", event, details, ip,
+                         extra=_audit("SYSTEM_EVENT", "SYSTEM", operation=event, details=details, ip=ip))
     
     def get_recent_logs(self, lines: int = 50) -> list:
-        """Получение последних записей лога"""
+        """Получение последних записей лога (чтение блоками с конца файла, при нехватке - из сегментов)"""
+        self.flush()
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                return all_lines[-lines:] if len(all_lines) > lines else all_lines
-        except FileNotFoundError:
-            return ["Лог файл не найден"]
+            try:
+                recent = tail_lines(self.log_file, lines)
+            except FileNotFoundError:
+                recent = []
+            if len(recent) < lines:
+                recent = tail_segments(self.log_file, lines - len(recent)) + recent
+            return recent or ["Лог файл не найден"]
         except Exception as e:
             return [f"Ошибка чтения лога: {str(e)}"]
     
+    def query_logs(self, since=None, until=None, event: Optional[str] = None, limit: Optional[int] = None) -> list:
+        """
+        Записи лога за период [since, until) с типом события event (FILE_OPERATION, ERROR, ...):
+        текущий журнал - по индексу, затем ротированные сегменты
+        """
+        self.flush()
+        try:
+            try:
+                found = self.index.query(since, until, event, limit)
+            except FileNotFoundError:
+                found = []
+            if limit is None or len(found) < limit:
+                remaining = None if limit is None else limit - len(found)
+                found = search_segments(self.log_file, since, until, event, remaining) + found
+            return found
+        except Exception as e:
+            return [f"Ошибка чтения лога: {str(e)}"]
+    
+    def query_events(self, event: Optional[str] = None, user: Optional[str] = None, status: Optional[str] = None,
+                     operation: Optional[str] = None, since=None, until=None, limit: Optional[int] = None) -> list:
+        """
+        События из структурированного журнала по индексу, новые первыми, например
+        неудачные восстановления за сутки: query_events("FILE_OPERATION", status="FAILED",
+        operation="Restore", since=datetime.now() - timedelta(days=1))
+        """
+        self.flush()
+        return self.audit.query(event, user, status, operation, since, until, limit)
+    
     def clear_logs(self):
-        """Очистка логов"""
+        """Очистка логов: текущий журнал уходит в сжатый сегмент, история остается доступной поиску"""
         try:
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                f.write("")
-            self.logger.info("SYSTEM_EVENT - Logs cleared")
+            self.flush()
+            self.file_handler.rotate()
+            self.logger.info("SYSTEM_EVENT - Logs cleared",
+                             extra=_audit("SYSTEM_EVENT", "SYSTEM", operation="Logs cleared"))
         except Exception as e:
             self.logger.error(f"ERROR - Failed to clear logs: {str(e)}")
 